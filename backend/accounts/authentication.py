@@ -0,0 +1,202 @@
+"""
+Token authentication with the Token/User lookup cached between requests.
+
+Tokens are kept in the ``CACHES`` alias ``AUTH_TOKEN_CACHE['ALIAS']``, or
+in the ``default`` cache when that one is shared between processes (any
+backend but locmem and dummy), for ``TIMEOUT`` seconds. Entries are evicted
+when the token is deleted (logout) or its user is saved (e.g. deactivated);
+see ``accounts.signals``. Without a shared cache each process keeps its own
+bounded LRU, which those evictions only reach in the process that made the
+change, so its entries live for ``LOCAL_TIMEOUT`` seconds: that is how long
+other workers may keep accepting a revoked token.
+
+Tokens expire after ``AUTH_TOKEN_TTL`` without use. Use is recorded in
+``TokenActivity`` at most once per ``AUTH_TOKEN_TOUCH_INTERVAL``, with a
+conditional UPDATE, so concurrent requests and workers do not repeat the
+write. Expired tokens are removed by ``manage.py prune_tokens``.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import TokenActivity
+
+DEFAULTS = {'SIZE': 1024, 'TIMEOUT': 60, 'LOCAL_TIMEOUT': 5, 'ALIAS': None}
+
+# Backends whose entries live in one process, so an eviction would not reach the other workers.
+LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+def token_ttl():
+    return getattr(settings, 'AUTH_TOKEN_TTL', timedelta(days=30))
+
+
+def touch_interval():
+    return getattr(settings, 'AUTH_TOKEN_TOUCH_INTERVAL', timedelta(hours=1))
+
+
+def last_used(token):
+    activity = getattr(token, 'activity', None)
+    return activity.last_used_at if activity else token.created
+
+
+def is_expired(token, now=None):
+    return last_used(token) < (now or timezone.now()) - token_ttl()
+
+
+def issue_token(user):
+    """Return the user's live token, replacing an expired one, and mark it used."""
+    with transaction.atomic():
+        token = Token.objects.select_related('activity').filter(user=user).first()
+        if token is not None and is_expired(token):
+            token.delete()
+            token = None
+        if token is None:
+            token = Token.objects.create(user=user)
+        TokenActivity.objects.update_or_create(token=token, defaults={'last_used_at': timezone.now()})
+    return token
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'AUTH_TOKEN_CACHE', {})}
+
+
+def cache_alias():
+    """The shared ``CACHES`` alias tokens are kept in, or ``None`` for the in-process LRU."""
+    alias = cache_settings()['ALIAS']
+    if alias:
+        return alias
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    return 'default' if backend and backend not in LOCAL_BACKENDS else None
+
+
+class LRUCache:
+    """A small thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = LRUCache(cache_settings()['SIZE'])
+
+
+def cache_key(key):
+    return f'auth-token:{key}'
+
+
+def get_cached_token(key):
+    alias = cache_alias()
+    if alias:
+        return caches[alias].get(cache_key(key))
+    token = local_tokens.get(key)
+    if token is None:
+        return None
+    # Hand out copies so one request mutating request.user cannot leak into another.
+    token = copy.copy(token)
+    token.user = copy.copy(token.user)
+    return token
+
+
+def cache_token(token):
+    options = cache_settings()
+    alias = cache_alias()
+    if alias:
+        caches[alias].set(cache_key(token.key), token, options['TIMEOUT'])
+    else:
+        local_tokens.set(token.key, token, options['LOCAL_TIMEOUT'])
+
+
+def evict_token(key):
+    alias = cache_alias()
+    if alias:
+        caches[alias].delete(cache_key(key))
+    local_tokens.delete(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` that skips the Token/User query on a cache hit."""
+
+    def authenticate_credentials(self, key):
+        now = timezone.now()
+        token = get_cached_token(key)
+        if token is None or is_expired(token, now):
+            # A cached copy may predate a touch made by another worker; confirm with the database.
+            token = self.load_token(key)
+            if is_expired(token, now):
+                raise exceptions.AuthenticationFailed('Token has expired.')
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        if last_used(token) < now - touch_interval():
+            self.touch(token, now)
+        return (token.user, token)
+
+    async def aauthenticate_credentials(self, key):
+        """``authenticate_credentials`` for async views; a fresh cached token needs no database."""
+        now = timezone.now()
+        token = get_cached_token(key)
+        if (
+            token is None or is_expired(token, now) or not token.user.is_active
+            or last_used(token) < now - touch_interval()
+        ):
+            return await sync_to_async(self.authenticate_credentials)(key)
+        return (token.user, token)
+
+    def load_token(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user', 'activity').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        cache_token(token)
+        return token
+
+    def touch(self, token, now):
+        touched = TokenActivity.objects.filter(
+            token=token, last_used_at__lt=now - touch_interval()
+        ).update(last_used_at=now)
+        if not touched and getattr(token, 'activity', None) is None:
+            TokenActivity.objects.get_or_create(token=token, defaults={'last_used_at': now})
+        token.activity = TokenActivity(token=token, last_used_at=now)
+        cache_token(token)
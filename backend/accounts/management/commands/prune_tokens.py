@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from accounts.authentication import token_ttl
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete auth tokens unused for AUTH_TOKEN_TTL, in small batches so each "
+        "delete holds its locks only briefly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Count expired tokens without deleting.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - token_ttl()
+        # Tokens that predate TokenActivity fall back to their creation time.
+        expired = Token.objects.filter(
+            Q(activity__last_used_at__lt=cutoff) | Q(activity__isnull=True, created__lt=cutoff)
+        )
+        if options['dry_run']:
+            self.stdout.write(f'Would delete {expired.count()} tokens unused since {cutoff:%Y-%m-%d %H:%M}.')
+            return
+
+        total = 0
+        while True:
+            keys = list(expired.values_list('key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            with transaction.atomic():
+                # Re-check the cutoff so a token touched since the read survives.
+                deleted = expired.filter(key__in=keys).delete()[1].get(Token._meta.label, 0)
+            total += deleted
+        self.stdout.write(f'Deleted {total} tokens unused since {cutoff:%Y-%m-%d %H:%M}.')
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def start_existing_tokens(apps, schema_editor):
+    # Existing tokens get a full lifetime from now rather than expiring on deploy.
+    Token = apps.get_model('authtoken', 'Token')
+    TokenActivity = apps.get_model('accounts', 'TokenActivity')
+    TokenActivity.objects.bulk_create(
+        (TokenActivity(token_id=key) for key in Token.objects.values_list('key', flat=True).iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_customuser_date_joined'),
+        ('authtoken', '0004_alter_tokenproxy_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenActivity',
+            fields=[
+                ('token', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity', serialize=False, to='authtoken.token')),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(start_existing_tokens, migrations.RunPython.noop),
+    ]
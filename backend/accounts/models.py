@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
+from rest_framework.authtoken.models import Token
 from django.utils import timezone
 
 class CustomUserManager(BaseUserManager):
@@ -30,3 +31,15 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return self.email
+
+class TokenActivity(models.Model):
+    """
+    When a Token was last used, for sliding expiry.
+
+    Written at most once per AUTH_TOKEN_TOUCH_INTERVAL per token, not on every request.
+    """
+    token = models.OneToOneField(Token, on_delete=models.CASCADE, primary_key=True, related_name="activity")
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.token_id}@{self.last_used_at:%Y-%m-%d %H:%M}"
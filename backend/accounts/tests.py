@@ -1,3 +1,139 @@
-from django.test import TestCase
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .authentication import get_cached_token, local_tokens
+from .models import TokenActivity
+
+User = get_user_model()
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        local_tokens.clear()
+        self.user = User.objects.create_user(email='auth@example.com', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def queries_for(self, path='/api/folders/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_cache_hit_saves_the_token_query(self):
+        self.queries_for()  # creates the user's change version row
+        local_tokens.clear()
+        # A miss costs the same single Token+User query as TokenAuthentication.
+        uncached = self.queries_for()
+        cached = self.queries_for()
+        self.assertEqual(cached, uncached - 1)
+
+    def test_logout_revokes_cached_token(self):
+        self.queries_for()
+        self.assertEqual(self.client.post('/api/accounts/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/folders/').status_code, 401)
+
+    def test_deactivation_revokes_cached_token(self):
+        self.queries_for()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/folders/').status_code, 401)
+
+    def test_cached_user_is_not_shared_between_requests(self):
+        self.queries_for()
+        get_cached_token(self.token.key).user.email = 'mutated@example.com'
+        self.assertEqual(self.client.get('/api/accounts/profile/').data['email'], 'auth@example.com')
+
+    def test_expired_token_is_rejected_then_reissued_on_login(self):
+        later = timezone.now() + timedelta(days=31)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            response = self.client.get('/api/folders/')
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.data['detail'], 'Token has expired.')
+
+            response = APIClient().post('/api/accounts/login/', {'email': 'auth@example.com', 'password': 'pass'})
+        self.assertNotEqual(response.data['token'], self.token.key)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+
+    def test_use_is_recorded_once_per_interval(self):
+        start = timezone.now() + timedelta(days=20)
+        with mock.patch('django.utils.timezone.now', return_value=start):
+            self.queries_for()
+            touched = self.queries_for()
+        self.assertEqual(TokenActivity.objects.get(token=self.token).last_used_at, start)
+
+        # Within the interval a request writes nothing.
+        with mock.patch('django.utils.timezone.now', return_value=start + timedelta(minutes=30)):
+            self.assertEqual(self.queries_for(), touched)
+        self.assertEqual(TokenActivity.objects.get(token=self.token).last_used_at, start)
+
+        # Sliding: 20 days after the last touch the token is still valid.
+        with mock.patch('django.utils.timezone.now', return_value=start + timedelta(days=20)):
+            self.queries_for()
+
+    def test_prune_tokens_deletes_only_expired(self):
+        stale_user = User.objects.create_user(email='stale@example.com', password='pass')
+        stale = Token.objects.create(user=stale_user)
+        TokenActivity.objects.create(token=stale, last_used_at=timezone.now() - timedelta(days=40))
+        legacy_user = User.objects.create_user(email='legacy@example.com', password='pass')
+        legacy = Token.objects.create(user=legacy_user)
+        Token.objects.filter(key=legacy.key).update(created=timezone.now() - timedelta(days=40))
+        self.queries_for()
+
+        out = StringIO()
+        call_command('prune_tokens', '--batch-size', '1', stdout=out)
+        self.assertIn('Deleted 2 tokens', out.getvalue())
+        self.assertEqual(list(Token.objects.values_list('key', flat=True)), [self.token.key])
+        self.assertEqual(self.client.get('/api/folders/').status_code, 200)
+
+    @override_settings(
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        },
+        AUTH_TOKEN_CACHE={'ALIAS': 'shared'},
+    )
+    def test_shared_cache_alias(self):
+        self.queries_for()
+        self.assertIsNotNone(caches['shared'].get(f'auth-token:{self.token.key}'))
+        self.assertIsNone(local_tokens.get(self.token.key))
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/folders/').status_code, 401)
+
+    def test_revocation_in_another_worker_reaches_a_shared_default_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+            with override_settings(CACHES={'default': shared}, AUTH_TOKEN_CACHE={}):
+                key = self.token.key
+                self.queries_for()
+                self.assertIsNone(local_tokens.get(key))
+                # Another worker logs the token out: only its own cache instance sees the eviction.
+                with mock.patch('accounts.signals.evict_token'):
+                    self.token.delete()
+                self.assertEqual(self.client.get('/api/folders/').status_code, 200)
+                other_worker = caches.create_connection('default')
+                self.assertIsNot(other_worker, caches['default'])
+                other_worker.delete(f'auth-token:{key}')
+                self.assertEqual(self.client.get('/api/folders/').status_code, 401)
+
+    def test_process_local_entries_are_short_lived(self):
+        self.queries_for()
+        with mock.patch('accounts.signals.evict_token'):
+            self.token.delete()
+        self.assertEqual(self.client.get('/api/folders/').status_code, 200)
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 6):
+            self.assertEqual(self.client.get('/api/folders/').status_code, 401)
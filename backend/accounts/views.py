@@ -1,9 +1,9 @@
 from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework import status, generics, permissions
 from rest_framework.views import APIView
 from django.contrib.auth import logout
+from .authentication import issue_token
 from .serializers import UserSerializer, UserRegistrationSerializer, CustomAuthTokenSerializer
 from django.contrib.auth import get_user_model
 
@@ -17,7 +17,7 @@ class CustomAuthToken(ObtainAuthToken):
                                          context={'request': request})
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
-        token, created = Token.objects.get_or_create(user=user)
+        token = issue_token(user)
         return Response({
             'token': token.key,
             'user_id': user.pk,
@@ -33,7 +33,7 @@ class UserRegistrationView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        token, created = Token.objects.get_or_create(user=user)
+        token = issue_token(user)
         return Response({
             'token': token.key,
             'user_id': user.id,
@@ -0,0 +1,87 @@
+"""
+Calendar/agenda reads: tasks bucketed per local day, and dashboard counts.
+
+Both work in the caller's timezone and never build the block tree.
+``task_stats`` is one aggregate query whatever the number of blocks.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .filters import day_start
+from .models import Block
+
+TASK_TYPES = ('task', 'task-done')
+DONE = Q(type='task-done') | Q(is_done=True)
+AGENDA_FIELDS = ('id', 'list_id', 'parent_block_id', 'type', 'order', 'due_date', 'is_done', 'is_pinned')
+
+
+def is_done(block):
+    return block.type == 'task-done' or block.is_done
+
+
+def agenda(user, start, end, tzinfo, include_html=False):
+    """
+    Tasks due between the ``start`` and ``end`` dates (inclusive) in
+    ``tzinfo``, as ``(counts, [(date, counts, tasks), ...])`` with one entry
+    per day that has tasks. Counts are ``{'done', 'pending', 'overdue'}``.
+    """
+    now = timezone.now()
+    tasks = Block.objects.filter(
+        user=user, type__in=TASK_TYPES,
+        due_date__gte=day_start(start, tzinfo), due_date__lt=day_start(end + timedelta(days=1), tzinfo),
+    ).order_by('due_date', 'order', 'id')
+    tasks = tasks.only(*AGENDA_FIELDS, *(('html',) if include_html else ()))
+
+    totals = {'done': 0, 'pending': 0, 'overdue': 0}
+    days = {}
+    for task in tasks:
+        day = task.due_date.astimezone(tzinfo).date()
+        if day not in days:
+            days[day] = ({'done': 0, 'pending': 0, 'overdue': 0}, [])
+        counts, day_tasks = days[day]
+        if is_done(task):
+            status = 'done'
+        else:
+            status = 'overdue' if task.due_date < now else 'pending'
+        for bucket in (counts, totals):
+            bucket[status] += 1
+        day_tasks.append(task)
+    return totals, [(day, counts, day_tasks) for day, (counts, day_tasks) in days.items()]
+
+
+def task_counters(tzinfo):
+    """The aggregate expressions behind ``task_stats``."""
+    now = timezone.now()
+    today = now.astimezone(tzinfo).date()
+    today_start = day_start(today, tzinfo)
+    tomorrow_start = day_start(today + timedelta(days=1), tzinfo)
+    week_start = day_start(today - timedelta(days=today.weekday()), tzinfo)
+    week_end = day_start(today - timedelta(days=today.weekday()) + timedelta(days=7), tzinfo)
+
+    task = Q(type__in=TASK_TYPES)
+    pending = task & ~DONE
+    return {
+        'notes': Count('id', filter=Q(type='note')),
+        'pinned': Count('id', filter=Q(is_pinned=True)),
+        'tasks': Count('id', filter=task),
+        'completed': Count('id', filter=task & DONE),
+        'pending': Count('id', filter=pending),
+        'overdue': Count('id', filter=pending & Q(due_date__lt=now)),
+        'upcoming': Count('id', filter=pending & Q(due_date__gte=now)),
+        'due_today': Count('id', filter=task & Q(due_date__gte=today_start, due_date__lt=tomorrow_start)),
+        'due_tomorrow': Count('id', filter=task & Q(
+            due_date__gte=tomorrow_start, due_date__lt=day_start(today + timedelta(days=2), tzinfo))),
+        'due_this_week': Count('id', filter=task & Q(due_date__gte=week_start, due_date__lt=week_end)),
+    }
+
+
+def task_stats(user, tzinfo):
+    """Dashboard counters for ``user``, computed in a single aggregate query."""
+    return Block.objects.filter(user=user).aggregate(**task_counters(tzinfo))
+
+
+async def atask_stats(user, tzinfo):
+    return await Block.objects.filter(user=user).aaggregate(**task_counters(tzinfo))
@@ -0,0 +1,199 @@
+"""
+Archive tier for finished blocks.
+
+Done blocks (``is_done`` or ``type="task-done"``) that nobody has touched
+for ``BLOCK_ARCHIVE_AFTER_DAYS`` are moved out of ``api_block`` into
+``ArchivedBlock``, with their whole subtree and their tag ids, so the hot
+table (and the indexes every read goes through) only grows with the work
+that is still open. A subtree only goes when all of it is due: an open
+task, a pinned block or a recent edit anywhere below a done block keeps
+the whole branch in ``api_block`` (its done descendants may still go on
+their own).
+
+Archiving a subtree is a few range statements (see ``api.tree``): the rows
+are copied, then deleted with tombstones and a change event, so clients
+drop them like deleted blocks. ``restore_block`` puts an archived block
+back under the same id, parent, list and order, with its archived
+descendants and any archived ancestors, and records it as created.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.functions import Substr
+from django.utils import timezone
+
+from .changes import record_change
+from .models import ArchivedBlock, Block, Tag, Tombstone
+from .search import index_blocks
+from .tree import (
+    ID_BATCH, PATH_WIDTH, delete_subtrees, depth, fill_paths, in_subtree, path_segment, subtree_roots, subtrees_q,
+)
+
+# Subtrees moved per transaction.
+BATCH_SIZE = 100
+
+FIELDS = (
+    'id', 'user_id', 'list_id', 'parent_block_id', 'html', 'type', 'order', 'due_date', 'is_done', 'is_pinned',
+    'path', 'created_at', 'updated_at',
+)
+
+
+def archive_after():
+    return timedelta(days=getattr(settings, 'BLOCK_ARCHIVE_AFTER_DAYS', 90))
+
+
+def archive_cutoff(older_than=None):
+    return timezone.now() - (older_than if older_than is not None else archive_after())
+
+
+def archivable_q(cutoff):
+    """Done, not pinned, and not updated since ``cutoff``."""
+    return (Q(is_done=True) | Q(type='task-done')) & Q(updated_at__lt=cutoff, is_pinned=False)
+
+
+def archivable(older_than=None):
+    """
+    Blocks due for the archive: done, not pinned, and not updated for
+    ``older_than``. Blocks without a path (created by ``bulk_create`` without
+    ``fill_paths``) cannot be moved by range and are left alone.
+    """
+    return Block.objects.filter(archivable_q(archive_cutoff(older_than))).exclude(path='')
+
+
+def archive_blocks(older_than=None, user=None, batch_size=BATCH_SIZE):
+    """
+    Archive the blocks of ``archivable(older_than)`` (of ``user`` only, if
+    given) whose subtrees are all due too, ``batch_size`` candidates per
+    transaction, oldest first. Returns ``(subtrees, blocks)`` archived.
+    """
+    cutoff = archive_cutoff(older_than)
+    candidates = Block.objects.filter(archivable_q(cutoff)).exclude(path='').order_by('updated_at', 'id')
+    if user is not None:
+        candidates = candidates.filter(user=user)
+
+    subtrees = blocks = 0
+    last = None
+    while True:
+        # Keyset over the candidates: the ones a batch keeps must not come back in the next.
+        batch = candidates
+        if last is not None:
+            batch = batch.filter(Q(updated_at__gt=last[0]) | Q(updated_at=last[0], id__gt=last[1]))
+        rows = list(batch.values_list('updated_at', 'id', 'user_id', 'path')[:batch_size])
+        if not rows:
+            break
+        last = rows[-1][:2]
+        paths = defaultdict(list)
+        for _, _, user_id, path in rows:
+            paths[user_id].append(path)
+        for user_id, user_paths in paths.items():
+            roots, rows = archive_due_subtrees(user_id, user_paths, cutoff)
+            subtrees += len(roots)
+            blocks += len(rows)
+    return subtrees, blocks
+
+
+def archive_due_subtrees(user_id, paths, cutoff):
+    """
+    Archive the subtrees at ``paths`` (blocks of ``archivable_q(cutoff)``)
+    whose descendants all match ``archivable_q(cutoff)`` as well, in one
+    transaction. Returns the archived ``(roots, rows)``.
+    """
+    with transaction.atomic():
+        kept = sorted(
+            Block.objects.filter(subtrees_q(user_id, subtree_roots(paths), include_self=False))
+            .exclude(archivable_q(cutoff)).values_list('path', flat=True)
+        )
+
+        def due(path):
+            # The paths below ``path`` sort right after it, so the first one not before it decides.
+            index = bisect_left(kept, path)
+            return index == len(kept) or not in_subtree(kept[index], path)
+
+        roots = subtree_roots(path for path in paths if due(path))
+        return roots, archive_subtrees(user_id, roots)
+
+
+def archive_subtrees(user_id, paths):
+    """
+    Move the subtrees at ``paths`` (see ``subtree_roots``) to the archive in
+    one transaction; returns their ``ArchivedBlock`` rows, in path order.
+    """
+    if not paths:
+        return []
+    rows = Block.objects.filter(subtrees_q(user_id, paths)).order_by('path')
+    with transaction.atomic():
+        archived = [ArchivedBlock(**row) for row in rows.values(*FIELDS)]
+        tag_ids = defaultdict(list)
+        links = Block.tags.through.objects.filter(block__in=rows.values('id'))
+        for block_id, tag_id in links.values_list('block_id', 'tag_id'):
+            tag_ids[block_id].append(tag_id)
+        for block in archived:
+            block.tag_ids = tag_ids[block.id]
+        ArchivedBlock.objects.bulk_create(archived, batch_size=ID_BATCH)
+        delete_subtrees(user_id, paths, archived=False)
+    return archived
+
+
+def restore_block(user, block_id):
+    """
+    Move the archived block ``block_id`` of ``user`` back to ``api_block``
+    with its archived descendants, and the archived ancestors it needs to
+    hang from, and return it as a ``Block``. Links to tags deleted in the
+    meantime are dropped; a block whose parent is gone altogether comes back
+    without one. Raises ``ArchivedBlock.DoesNotExist`` for an unknown id.
+    """
+    target = ArchivedBlock.objects.get(user=user, id=block_id)
+    ancestor_ids = [
+        int(target.path[start:start + PATH_WIDTH]) for start in range(0, len(target.path) - PATH_WIDTH, PATH_WIDTH)
+    ]
+    archived = ArchivedBlock.objects.filter(Q(id__in=ancestor_ids) | subtrees_q(user.pk, [target.path]), user=user)
+
+    with transaction.atomic():
+        rows = sorted(archived, key=lambda row: len(row.path))
+        ids = {row.id for row in rows}
+        parent_ids = {row.parent_block_id for row in rows} - ids - {None}
+        parent_ids &= set(Block.objects.filter(user=user, id__in=parent_ids).values_list('id', flat=True))
+
+        # Parents first, one tree level at a time, so fill_paths finds theirs.
+        levels = defaultdict(list)
+        for row in rows:
+            parent = row.parent_block_id if row.parent_block_id in ids or row.parent_block_id in parent_ids else None
+            levels[depth(row.path)].append(Block(
+                id=row.id, user=user, list_id=row.list_id, parent_block_id=parent, html=row.html, type=row.type,
+                order=row.order, due_date=row.due_date, is_done=row.is_done, is_pinned=row.is_pinned,
+            ))
+        blocks = []
+        for level in sorted(levels):
+            fill_paths(Block.objects.bulk_create(levels[level]))
+            blocks += levels[level]
+
+        id_list = sorted(ids)
+        created_at = Subquery(ArchivedBlock.objects.filter(id=OuterRef('id')).values('created_at')[:1])
+        tag_ids = {tag_id for row in rows for tag_id in row.tag_ids}
+        tag_ids &= set(Tag.objects.filter(user=user, id__in=tag_ids).values_list('id', flat=True))
+        through = Block.tags.through
+        through.objects.bulk_create([
+            through(block_id=row.id, tag_id=tag_id) for row in rows for tag_id in row.tag_ids if tag_id in tag_ids
+        ], batch_size=ID_BATCH)
+        for start in range(0, len(id_list), ID_BATCH):
+            chunk = id_list[start:start + ID_BATCH]
+            Block.objects.filter(id__in=chunk).update(created_at=created_at)
+            # A client that missed the archiving must not see it after the restore.
+            Tombstone.objects.filter(user=user, kind='block', object_id__in=chunk).delete()
+        archived.delete()
+        index_blocks(blocks)
+        record_change(user.pk, 'block', 'create', id_list)
+    return Block.objects.get(id=target.id)
+
+
+def delete_archived_under(user_id, root_ids):
+    """Delete the archived blocks whose top-level ancestor is one of ``root_ids``."""
+    archived = ArchivedBlock.objects.filter(user_id=user_id).annotate(root=Substr('path', 1, PATH_WIDTH))
+    root_ids = list(root_ids)
+    for start in range(0, len(root_ids), ID_BATCH):
+        archived.filter(root__in=[path_segment(pk) for pk in root_ids[start:start + ID_BATCH]]).delete()
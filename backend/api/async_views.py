@@ -0,0 +1,154 @@
+"""
+Async versions of the hottest read endpoints, routed in front of the DRF
+views when the app runs under ASGI (``API_ASYNC_READS``, see config/asgi.py).
+
+Under ASGI a synchronous view occupies a thread for the whole request, so a
+worker serves only as many requests at once as it has threads. These views
+answer token checks, ETag revalidation (304) and the cached sidebar payloads
+on the event loop, and read through Django's async ORM, so waiting requests
+cost a coroutine rather than a thread. Everything they do not handle
+(writes, other query parameters, authentication and validation errors) is
+passed to the DRF view for the same URL, so responses match either way.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.urls import path
+from django.utils.cache import get_conditional_response
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.request import Request
+
+from accounts.authentication import CachedTokenAuthentication
+
+from .agenda import atask_stats
+from .changes import aget_version
+from .filters import resolve_timezone
+from .payload_cache import cached_payload, get_payload
+from .renderers import FastJSONRenderer
+from .views import (
+    AgendaStatsView, BlockViewSet, FolderViewSet, ListViewSet, TagViewSet, tag_response, version_etag,
+)
+
+
+async def authenticate(request):
+    """The user of the request's token, or ``None`` to let the DRF view answer with its error."""
+    auth = get_authorization_header(request).split()
+    if len(auth) != 2 or auth[0].lower() != b'token':
+        return None
+    try:
+        user, _ = await CachedTokenAuthentication().aauthenticate_credentials(auth[1].decode())
+    except (AuthenticationFailed, UnicodeError):
+        return None
+    return user
+
+
+def json_response(data):
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json')
+
+
+def drf_view(viewset_class, request, user):
+    """A ``list`` viewset instance for ``request``, to reuse its queryset, filters and serializer."""
+    drf_request = Request(request)
+    drf_request.user = user
+    return viewset_class(request=drf_request, action='list', format_kwarg=None, args=(), kwargs={})
+
+
+class AsyncReadView(View):
+    """
+    Answers supported GETs with ``await self.read(request, user)``, which
+    subclasses define; any other request goes to ``fallback``, the
+    synchronous DRF view for the same URL.
+    """
+
+    fallback = None
+    allowed_params = frozenset()
+
+    def supports(self, request):
+        return request.method == 'GET' and set(request.GET) <= self.allowed_params
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.supports(request):
+            return self.delegate(request, *args, **kwargs)
+        return self.get(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        user = await authenticate(request)
+        if user is None:
+            return await self.delegate(request, *args, **kwargs)
+        request.user = user
+        try:
+            return await self.read(request, user)
+        except ValidationError:
+            return await self.delegate(request, *args, **kwargs)
+
+    async def delegate(self, request, *args, **kwargs):
+        return await sync_to_async(self.fallback)(request, *args, **kwargs)
+
+
+class AsyncPayloadListView(AsyncReadView):
+    """The cached ``lists``/``folders`` payload of ``viewset_class`` (see ``CachedPayloadMixin``)."""
+
+    viewset_class = None
+
+    async def read(self, request, user):
+        name = self.viewset_class.payload_name
+        entry = cached_payload(user.pk, name)
+        if entry is None:
+            view = drf_view(self.viewset_class, request, user)
+            entry = await sync_to_async(get_payload)(
+                user.pk, name, lambda: view.get_serializer(view.get_queryset(), many=True).data)
+        response = get_conditional_response(request, etag=entry['etag']) or json_response(entry['data'])
+        return tag_response(response, entry['etag'])
+
+
+class AsyncVersionedListView(AsyncReadView):
+    """The ``list`` action of ``viewset_class`` behind the user's change-version ETag."""
+
+    viewset_class = None
+
+    async def read(self, request, user):
+        etag = version_etag(user.pk, await aget_version(user.pk))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            view = drf_view(self.viewset_class, request, user)
+            rows = [row async for row in view.filter_queryset(view.get_queryset())]
+            response = json_response(view.get_serializer(rows, many=True).data)
+        return tag_response(response, etag)
+
+
+class AsyncBlockListView(AsyncVersionedListView):
+    """Flat block reads (``depth=0``) with the simple filters the frontend uses."""
+
+    viewset_class = BlockViewSet
+    allowed_params = frozenset({'depth', 'fields', 'list_id', 'type', 'type__in', 'is_pinned', 'is_done'})
+
+    def supports(self, request):
+        return super().supports(request) and request.GET.get('depth') == '0'
+
+
+class AsyncAgendaStatsView(AsyncReadView):
+    allowed_params = frozenset({'tz'})
+
+    async def read(self, request, user):
+        return json_response(await atask_stats(user, resolve_timezone(request.GET.get('tz'))))
+
+
+def list_routes(viewset_class):
+    return viewset_class.as_view({'get': 'list', 'post': 'create'})
+
+
+# Placed before the router URLs by api/urls.py when API_ASYNC_READS is on.
+async_read_urls = [
+    path('lists/', csrf_exempt(AsyncPayloadListView.as_view(
+        viewset_class=ListViewSet, fallback=list_routes(ListViewSet))), name='list-list'),
+    path('folders/', csrf_exempt(AsyncPayloadListView.as_view(
+        viewset_class=FolderViewSet, fallback=list_routes(FolderViewSet))), name='folder-list'),
+    path('tags/', csrf_exempt(AsyncVersionedListView.as_view(
+        viewset_class=TagViewSet, fallback=list_routes(TagViewSet))), name='tag-list'),
+    path('blocks/', csrf_exempt(AsyncBlockListView.as_view(fallback=list_routes(BlockViewSet))), name='block-list'),
+    path('agenda/stats/', csrf_exempt(AsyncAgendaStatsView.as_view(fallback=AgendaStatsView.as_view())),
+         name='agenda-stats'),
+]
@@ -0,0 +1,42 @@
+"""
+Per-user change tracking.
+
+Every write to a user's Folders, Lists, Blocks or Tags goes through
+``record_change``. It bumps the user's ``ChangeVersion``, which read
+endpoints turn into ETags (see ``ConditionalReadMixin``). It also queues a
+compact event for the realtime broker, which is published once the
+surrounding transaction commits.
+"""
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import ChangeVersion
+
+
+def get_version(user_id):
+    version = ChangeVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first()
+    if version is None:
+        version = ChangeVersion.objects.get_or_create(user_id=user_id)[0].version
+    return version
+
+
+async def aget_version(user_id):
+    version = await ChangeVersion.objects.filter(user_id=user_id).values_list('version', flat=True).afirst()
+    if version is None:
+        version = (await ChangeVersion.objects.aget_or_create(user_id=user_id))[0].version
+    return version
+
+
+def bump_version(user_id):
+    # No row yet means no ETag has been handed out, so there is nothing to invalidate.
+    ChangeVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+
+
+def record_change(user_id, kind, op, ids):
+    """Bump the user's version and publish ``{type, op, ids}`` after commit."""
+    from .realtime import get_broker
+
+    bump_version(user_id)
+    event = {'type': kind, 'op': op, 'ids': list(ids)}
+    transaction.on_commit(lambda: get_broker().publish(user_id, event))
@@ -0,0 +1,141 @@
+"""
+Negotiated compression of API responses.
+
+``CompressionMiddleware`` compresses JSON and NDJSON responses with brotli
+(when the optional ``brotli`` package is installed) or gzip, whichever the
+request's ``Accept-Encoding`` ranks higher, once the body is at least
+``API_COMPRESSION_MIN_SIZE`` bytes; smaller bodies gain less than the
+headers and CPU cost. Streaming responses (the workspace export) are
+compressed chunk by chunk and flushed after each one, so clients still
+receive rows as they are produced, under WSGI and ASGI alike.
+
+Only these payload types are compressed: HTML pages that embed a CSRF
+token stay as they are, out of reach of compression side channels (BREACH).
+"""
+
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson')
+GZIP_LEVEL = 6
+# Brotli's middle qualities compress JSON better than gzip at similar speed; 11 is for static files.
+BROTLI_QUALITY = 5
+
+
+class GzipStream:
+    def __init__(self):
+        # wbits=31 writes the gzip container (header and trailer) around the deflate stream.
+        self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        """Compressed ``data``, flushed so the client can decode everything sent so far."""
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b''):
+        return self.compressor.compress(data) + self.compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self, data=b''):
+        return self.compressor.process(data) + self.compressor.finish()
+
+
+STREAMS = {'br': BrotliStream, 'gzip': GzipStream}
+
+
+def accepted_codings(header):
+    """``{coding: q}`` of an ``Accept-Encoding`` header."""
+    codings = {}
+    for item in header.split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        codings[coding] = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    codings[coding] = float(value)
+                except ValueError:
+                    codings[coding] = 0.0
+    return codings
+
+
+def negotiate(header):
+    """The coding to respond with (``'br'``, ``'gzip'``) for an ``Accept-Encoding`` header, or ``None``."""
+    codings = accepted_codings(header)
+    best, best_q = None, 0.0
+    for coding in ('br', 'gzip') if brotli is not None else ('gzip',):
+        q = codings.get(coding, codings.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def min_size():
+    return getattr(settings, 'API_COMPRESSION_MIN_SIZE', 1024)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES or response.has_header('Content-Encoding'):
+            return response
+        if response.status_code == 206:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate(request.headers.get('Accept-Encoding', ''))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            stream = STREAMS[coding]()
+            if response.is_async:
+                response.streaming_content = compress_async(stream, response.streaming_content)
+            else:
+                response.streaming_content = compress_sequence(stream, response.streaming_content)
+            del response['Content-Length']
+        else:
+            if len(response.content) < min_size():
+                return response
+            compressed = STREAMS[coding]().finish(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed body is a different representation, so only a weak ETag still applies.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
+
+
+def compress_sequence(stream, chunks):
+    for chunk in chunks:
+        if chunk:
+            yield stream.compress(chunk)
+    yield stream.finish()
+
+
+async def compress_async(stream, chunks):
+    async for chunk in chunks:
+        if chunk:
+            yield stream.compress(chunk)
+    yield stream.finish()
@@ -0,0 +1,137 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import django_filters
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import ArchivedBlock, Block
+
+
+def resolve_timezone(name):
+    """Return the tzinfo for an IANA zone name, falling back to the server timezone."""
+    if not name:
+        return timezone.get_current_timezone()
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValidationError({'tz': f'Unknown timezone: {name}'})
+
+
+def day_start(day, tzinfo):
+    return datetime.combine(day, time.min, tzinfo=tzinfo)
+
+
+def relative_due_day(params):
+    """
+    The caller's local date when ``params`` filter on a ``due`` window that
+    moves with the clock (``today``, ``tomorrow``, ``week``, ``overdue``),
+    otherwise ``None``. The same rows answer differently after midnight, so
+    conditional reads fold this date into their ETag.
+    """
+    if params.get('due') not in ('overdue', 'today', 'tomorrow', 'week'):
+        return None
+    return timezone.now().astimezone(resolve_timezone(params.get('tz'))).date()
+
+
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    pass
+
+
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
+class BlockFilter(django_filters.FilterSet):
+    """
+    Query parameters understood by ``BlockViewSet``.
+
+    Date windows (``due``, ``due_from``, ``due_to``) are evaluated in the
+    caller's ``tz`` (an IANA name such as ``Asia/Tokyo``); ``due_from`` and
+    ``due_to`` are inclusive calendar dates.
+    """
+
+    DUE_CHOICES = (
+        ('overdue', 'overdue'),
+        ('today', 'today'),
+        ('tomorrow', 'tomorrow'),
+        ('week', 'week'),
+        ('none', 'none'),
+    )
+
+    type = django_filters.CharFilter(field_name='type')
+    type__in = CharInFilter(field_name='type', lookup_expr='in')
+    is_pinned = django_filters.BooleanFilter()
+    is_done = django_filters.BooleanFilter()
+    list_id = django_filters.CharFilter(method='filter_list_id')
+    parent_block = django_filters.CharFilter(method='filter_parent_block')
+    due = django_filters.ChoiceFilter(choices=DUE_CHOICES, method='filter_due')
+    due_from = django_filters.DateFilter(method='filter_due_from')
+    due_to = django_filters.DateFilter(method='filter_due_to')
+    tz = django_filters.CharFilter(method='filter_tz')
+    tags = NumberInFilter(field_name='tags__id', lookup_expr='in', distinct=True)
+    tag = django_filters.CharFilter(field_name='tags__name', distinct=True)
+
+    class Meta:
+        model = Block
+        fields = []
+
+    @property
+    def tzinfo(self):
+        return resolve_timezone(self.form.cleaned_data.get('tz'))
+
+    def filter_tz(self, queryset, name, value):
+        # Only consulted by the date filters.
+        return queryset
+
+    def filter_list_id(self, queryset, name, value):
+        if value == 'none':
+            return queryset.filter(list__isnull=True)
+        try:
+            return queryset.filter(list_id=int(value))
+        except (ValueError, TypeError):
+            return queryset
+
+    def filter_parent_block(self, queryset, name, value):
+        if value == 'none':
+            return queryset.filter(parent_block__isnull=True)
+        try:
+            return queryset.filter(parent_block=int(value))
+        except ValueError:
+            raise ValidationError({'parent_block': 'Expected a block id or "none".'})
+
+    def filter_due(self, queryset, name, value):
+        if value == 'none':
+            return queryset.filter(due_date__isnull=True)
+
+        tzinfo = self.tzinfo
+        today = timezone.now().astimezone(tzinfo).date()
+        if value == 'overdue':
+            return queryset.filter(due_date__lt=day_start(today, tzinfo))
+        if value == 'today':
+            start, end = today, today + timedelta(days=1)
+        elif value == 'tomorrow':
+            start, end = today + timedelta(days=1), today + timedelta(days=2)
+        else:
+            start = today - timedelta(days=today.weekday())
+            end = start + timedelta(days=7)
+        return queryset.filter(
+            due_date__gte=day_start(start, tzinfo), due_date__lt=day_start(end, tzinfo)
+        )
+
+    def filter_due_from(self, queryset, name, value):
+        return queryset.filter(due_date__gte=day_start(value, self.tzinfo))
+
+    def filter_due_to(self, queryset, name, value):
+        return queryset.filter(due_date__lt=day_start(value + timedelta(days=1), self.tzinfo))
+
+
+class ArchivedBlockFilter(django_filters.FilterSet):
+    """Query parameters understood by ``ArchivedBlockViewSet``: where the blocks were archived from."""
+
+    list_id = django_filters.NumberFilter(field_name='list_id')
+    parent_block = django_filters.NumberFilter(field_name='parent_block_id')
+
+    class Meta:
+        model = ArchivedBlock
+        fields = []
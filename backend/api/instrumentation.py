@@ -0,0 +1,264 @@
+"""
+Per-request latency and query instrumentation.
+
+``RequestMetricsMiddleware`` measures each request's wall time, its SQL
+queries (count, total time, and statements repeated within the request,
+which is what an N+1 loop looks like), and the response size. The numbers
+go to:
+
+- a ``Server-Timing`` header, which browser devtools show per request
+  (only with ``DEBUG`` or ``REQUEST_METRICS['SERVER_TIMING']``, as it tells
+  any client how much database work each request costs);
+- the ``api.requests`` logger, one JSON object per request: INFO for every
+  request, WARNING for slow ones or ones with repeated statements;
+- an in-process registry rendered in the Prometheus text format by
+  ``metrics_view`` (``/api/metrics/``, off unless ``REQUEST_METRICS['ENDPOINT']``
+  and ``REQUEST_METRICS['TOKEN']`` are both set).
+
+Queries are observed through an execute wrapper installed on every database
+connection, which reports to the recorder of the current request (a context
+variable, so it follows the request into ``sync_to_async`` threads under
+ASGI). Nothing depends on ``DEBUG``, and the per-query cost is a couple of
+function calls.
+The registry is per process: with several workers each one reports its own
+counters, which Prometheus sums when scraped per instance.
+"""
+
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+
+logger = logging.getLogger('api.requests')
+
+DEFAULTS = {
+    # Server-Timing is always sent when DEBUG is on.
+    'SERVER_TIMING': False,
+    # The same statement this many times in one request is reported as duplicated.
+    'DUPLICATE_THRESHOLD': 5,
+    'SLOW_MS': 500,
+    'ENDPOINT': False,
+    # /api/metrics/ requires "Authorization: Bearer <TOKEN>", and stays off without one.
+    'TOKEN': None,
+}
+
+# Upper bounds of the latency histogram, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {})}
+
+
+class QueryRecorder:
+    """Execute wrapper counting queries, their time, and repeats of each statement."""
+
+    __slots__ = ('count', 'duration', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            # Parameters are passed separately, so the SQL is the same for every row of a loop.
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+
+    def duplicates(self, threshold):
+        """``(extra executions, most repeated statement)`` for statements run ``threshold`` times or more."""
+        repeated = {sql: n for sql, n in self.statements.items() if n >= threshold}
+        if not repeated:
+            return 0, None
+        return sum(n - 1 for n in repeated.values()), max(repeated, key=repeated.get)
+
+
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Registry:
+    """Counters and a latency histogram per (view, method, status class)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, record):
+        key = (record['view'], record['method'], f'{record["status"] // 100}xx')
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {
+                    'count': 0, 'seconds': 0.0, 'buckets': [0] * len(BUCKETS),
+                    'queries': 0, 'db_seconds': 0.0, 'duplicates': 0, 'bytes': 0,
+                }
+            seconds = record['duration_ms'] / 1000
+            series['count'] += 1
+            series['seconds'] += seconds
+            index = bisect_left(BUCKETS, seconds)
+            if index < len(BUCKETS):
+                series['buckets'][index] += 1
+            series['queries'] += record['queries']
+            series['db_seconds'] += record['db_ms'] / 1000
+            series['duplicates'] += record['duplicate_queries']
+            series['bytes'] += record['response_bytes'] or 0
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+    def render(self):
+        with self.lock:
+            series = {key: {**value, 'buckets': list(value['buckets'])} for key, value in self.series.items()}
+        lines = []
+
+        def metric(name, kind, help_text, values):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(values)
+
+        def labels(key, **extra):
+            view, method, status = key
+            pairs = {'view': view, 'method': method, 'status': status, **extra}
+            return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs.items()) + '}'
+
+        histogram = []
+        for key, value in series.items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS, value['buckets']):
+                cumulative += count
+                histogram.append(f'http_request_duration_seconds_bucket{labels(key, le=str(bound))} {cumulative}')
+            histogram.append(f'http_request_duration_seconds_bucket{labels(key, le="+Inf")} {value["count"]}')
+            histogram.append(f'http_request_duration_seconds_sum{labels(key)} {value["seconds"]:.6f}')
+            histogram.append(f'http_request_duration_seconds_count{labels(key)} {value["count"]}')
+        metric('http_request_duration_seconds', 'histogram', 'Request wall time.', histogram)
+        for name, field, help_text in (
+            ('http_request_db_queries_total', 'queries', 'SQL queries issued.'),
+            ('http_request_db_seconds_total', 'db_seconds', 'Time spent in SQL queries.'),
+            ('http_request_duplicate_queries_total', 'duplicates', 'Repeated executions of the same statement.'),
+            ('http_response_bytes_total', 'bytes', 'Response body bytes.'),
+        ):
+            metric(name, 'counter', help_text, [f'{name}{labels(key)} {value[field]:g}' for key, value in series.items()])
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match.route
+
+
+def response_size(response):
+    if response.streaming:
+        return None
+    return len(response.content)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    def finish(self, request, response, recorder, duration):
+        config = metrics_settings()
+        duplicates, statement = recorder.duplicates(config['DUPLICATE_THRESHOLD'])
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view_label(request),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration * 1000, 2),
+            'duplicate_queries': duplicates,
+            'response_bytes': response_size(response),
+        }
+        registry.observe(record)
+
+        if config['SERVER_TIMING'] or settings.DEBUG:
+            timing = [
+                f'app;dur={record["duration_ms"]}',
+                f'db;dur={record["db_ms"]};desc="{recorder.count} queries"',
+            ]
+            if duplicates:
+                timing.append(f'dup;desc="{duplicates} duplicated queries"')
+            response['Server-Timing'] = ', '.join(timing)
+
+        if duplicates or record['duration_ms'] >= config['SLOW_MS']:
+            if statement:
+                record['duplicated_statement'] = statement[:500]
+            logger.warning(json.dumps(record))
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(record))
+        return response
+
+
+def metrics_view(request):
+    config = metrics_settings()
+    if not config['ENDPOINT'] or not config['TOKEN']:
+        return HttpResponseNotFound()
+    if request.headers.get('Authorization') != f'Bearer {config["TOKEN"]}':
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
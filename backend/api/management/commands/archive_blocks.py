@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from api.archive import BATCH_SIZE, archivable, archive_after, archive_blocks
+
+
+class Command(BaseCommand):
+    help = (
+        "Move done blocks not updated for BLOCK_ARCHIVE_AFTER_DAYS (with their "
+        "subtrees, when those are all done too) to the archive table, a batch "
+        "per transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive blocks done for this many days instead.')
+        parser.add_argument('--user', type=int, help='Only archive blocks of this user id.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Candidate blocks per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Count the blocks due without moving them.')
+
+    def handle(self, *args, **options):
+        older_than = timedelta(days=options['days']) if options['days'] is not None else archive_after()
+
+        if options['dry_run']:
+            candidates = archivable(older_than)
+            if options['user']:
+                candidates = candidates.filter(user_id=options['user'])
+            self.stdout.write(
+                f'{candidates.count()} blocks are done for over {older_than.days} days; those without open, '
+                f'pinned or recently updated blocks below them would be archived with their subtrees.')
+            return
+
+        subtrees, blocks = archive_blocks(older_than, options['user'], options['batch_size'])
+        self.stdout.write(f'Archived {blocks} blocks ({subtrees} subtrees) done for over {older_than.days} days.')
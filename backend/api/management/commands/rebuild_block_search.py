@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from api.search import index_blocks, rebuild_index, stale_blocks
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the block search index from Block.html. With --stale, only "
+        "index blocks edited since their document was written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Only index blocks of this user id.')
+        parser.add_argument('--stale', action='store_true',
+                            help='Incremental: index missing or outdated documents only.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not options['stale']:
+            total = rebuild_index(options['user'], options['chunk_size'])
+            self.stdout.write(f'Rebuilt search documents for {total} blocks.')
+            return
+
+        total = 0
+        blocks = stale_blocks(options['user']).order_by('pk').only('pk', 'user_id', 'html')
+        chunk = []
+        for block in blocks.iterator(chunk_size=options['chunk_size']):
+            chunk.append(block)
+            if len(chunk) == options['chunk_size']:
+                total += index_blocks(chunk)
+                chunk = []
+        total += index_blocks(chunk)
+        self.stdout.write(f'Reindexed {total} stale blocks.')
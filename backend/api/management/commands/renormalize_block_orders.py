@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Block
+from api.ordering import needs_rebalance, rebalance, sibling_blocks
+
+
+class Command(BaseCommand):
+    help = (
+        "Renumber Block.order to evenly spaced values, one sibling group "
+        "(user, list, parent_block) per transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Only renormalize blocks of this user id.')
+        parser.add_argument('--all', action='store_true',
+                            help='Rewrite every group, not only groups with collisions or exhausted gaps.')
+        parser.add_argument('--dry-run', action='store_true', help='Report groups without writing.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of sibling groups read per batch.')
+
+    def handle(self, *args, **options):
+        groups = Block.objects.order_by().values_list('user_id', 'list_id', 'parent_block_id').distinct()
+        if options['user']:
+            groups = groups.filter(user_id=options['user'])
+
+        checked = renumbered = rows = 0
+        for user_id, list_id, parent_block_id in groups.iterator(chunk_size=options['chunk_size']):
+            checked += 1
+            siblings = sibling_blocks(user_id, list_id, parent_block_id)
+            if not options['all']:
+                orders = list(siblings.order_by('order', 'id').values_list('order', flat=True))
+                if not needs_rebalance(orders):
+                    continue
+            renumbered += 1
+            if options['dry_run']:
+                continue
+            with transaction.atomic():
+                rows += rebalance(siblings)
+
+        verb = 'Would renumber' if options['dry_run'] else 'Renumbered'
+        self.stdout.write(f'{verb} {renumbered} of {checked} sibling groups ({rows} rows updated).')
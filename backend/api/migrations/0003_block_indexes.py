@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_add_is_pinned'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='block',
+            index=models.Index(fields=['user', 'parent_block', 'order'], name='block_user_parent_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='block',
+            index=models.Index(fields=['user', 'list', 'order'], name='block_user_list_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='block',
+            index=models.Index(fields=['user', 'type', 'due_date'], name='block_user_type_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='block',
+            index=models.Index(condition=models.Q(('is_pinned', True)), fields=['user', 'order'], name='block_user_pinned_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE api_blocksearch_fts USING fts5("
+    "text, content='api_blocksearchdocument', content_rowid='block_id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER api_blocksearch_ai AFTER INSERT ON api_blocksearchdocument BEGIN "
+    "INSERT INTO api_blocksearch_fts(rowid, text) VALUES (new.block_id, new.text); END",
+    "CREATE TRIGGER api_blocksearch_ad AFTER DELETE ON api_blocksearchdocument BEGIN "
+    "INSERT INTO api_blocksearch_fts(api_blocksearch_fts, rowid, text) VALUES ('delete', old.block_id, old.text); END",
+    "CREATE TRIGGER api_blocksearch_au AFTER UPDATE ON api_blocksearchdocument BEGIN "
+    "INSERT INTO api_blocksearch_fts(api_blocksearch_fts, rowid, text) VALUES ('delete', old.block_id, old.text); "
+    "INSERT INTO api_blocksearch_fts(rowid, text) VALUES (new.block_id, new.text); END",
+]
+
+DROP_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS api_blocksearch_ai",
+    "DROP TRIGGER IF EXISTS api_blocksearch_ad",
+    "DROP TRIGGER IF EXISTS api_blocksearch_au",
+    "DROP TABLE IF EXISTS api_blocksearch_fts",
+]
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in FTS_SQL:
+            schema_editor.execute(statement)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in DROP_FTS_SQL:
+            schema_editor.execute(statement)
+
+
+def index_existing_blocks(apps, schema_editor):
+    from api.search import block_text
+
+    Block = apps.get_model('api', 'Block')
+    BlockSearchDocument = apps.get_model('api', 'BlockSearchDocument')
+    documents = (
+        BlockSearchDocument(block_id=pk, user_id=user_id, text=block_text(html))
+        for pk, user_id, html in Block.objects.values_list('pk', 'user_id', 'html').iterator()
+    )
+    BlockSearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_tombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockSearchDocument',
+            fields=[
+                ('block', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='api.block')),
+                ('text', models.TextField(blank=True)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='block_search_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+        migrations.RunPython(index_existing_blocks, migrations.RunPython.noop),
+    ]
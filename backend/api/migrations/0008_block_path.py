@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:19
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Concat, LPad
+
+PATH_WIDTH = 12
+
+
+def fill_paths(apps, schema_editor):
+    # One UPDATE per tree level: each pass fills the blocks whose parent already has a path.
+    Block = apps.get_model('api', 'Block')
+    parent_path = Subquery(Block.objects.filter(pk=OuterRef('parent_block_id')).values('path')[:1])
+    segment = LPad(Cast('id', output_field=CharField()), PATH_WIDTH, Value('0'))
+    Block.objects.filter(parent_block=None).update(path=segment)
+    pending = Block.objects.filter(path='', parent_block__isnull=False).exclude(parent_block__path='')
+    while pending.update(path=Concat(Coalesce(parent_path, Value('')), segment, output_field=CharField())):
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_block_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='block',
+            name='path',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='block',
+            index=models.Index(fields=['user', 'path'], name='block_user_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
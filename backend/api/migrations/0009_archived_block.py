@@ -0,0 +1,57 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:41
+
+import api.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_block_path'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBlock',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('parent_block_id', models.BigIntegerField(blank=True, null=True)),
+                ('html', models.TextField(blank=True)),
+                ('type', models.CharField(default='text', max_length=20)),
+                ('order', models.FloatField(default=0.0)),
+                ('due_date', models.DateTimeField(blank=True, null=True)),
+                ('is_done', models.BooleanField(default=False)),
+                ('is_pinned', models.BooleanField(default=False)),
+                ('tag_ids', models.JSONField(blank=True, default=api.models.no_tags)),
+                ('path', models.TextField(default='')),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='block',
+            index=models.Index(condition=models.Q(('is_done', True), ('type', 'task-done'), _connector='OR'), fields=['updated_at'], name='block_done_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedblock',
+            name='list',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_blocks', to='api.list'),
+        ),
+        migrations.AddField(
+            model_name='archivedblock',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_blocks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedblock',
+            index=models.Index(fields=['user', 'path'], name='archived_block_user_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedblock',
+            index=models.Index(fields=['user', 'archived_at'], name='archived_block_user_at_idx'),
+        ),
+    ]
@@ -45,9 +45,121 @@ class Block(models.Model):
     is_done = models.BooleanField(default=False)
     is_pinned = models.BooleanField(default=False)
     tags = models.ManyToManyField(Tag, related_name="blocks", blank=True)
+    # Zero-padded ids from the root down to this block; maintained by api.tree.
+    path = models.TextField(default="", editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['order']
\ No newline at end of file
+        ordering = ['order']
+        indexes = [
+            models.Index(fields=['user', 'parent_block', 'order'], name='block_user_parent_order_idx'),
+            models.Index(fields=['user', 'list', 'order'], name='block_user_list_order_idx'),
+            models.Index(fields=['user', 'type', 'due_date'], name='block_user_type_due_idx'),
+            models.Index(fields=['user', 'path'], name='block_user_path_idx'),
+            models.Index(
+                fields=['user', 'order'], name='block_user_pinned_idx', condition=models.Q(is_pinned=True)
+            ),
+            # Scanned by api.archive for done blocks to move out.
+            models.Index(
+                fields=['updated_at'], name='block_done_updated_idx',
+                condition=models.Q(is_done=True) | models.Q(type='task-done'),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The parent as loaded, so saving can tell whether the block moved (see api.tree).
+        instance._loaded_parent_id = instance.__dict__.get('parent_block_id', models.DEFERRED)
+        return instance
+
+def no_tags():
+    return []
+
+class ArchivedBlock(models.Model):
+    """
+    A Block moved out of ``api_block`` by ``api.archive``: same id, placement
+    and path (kept in step by ``api.tree``), with its tag ids, so restoring
+    it puts back the same row.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_blocks")
+    list = models.ForeignKey(List, on_delete=models.CASCADE, related_name="archived_blocks", null=True, blank=True)
+    parent_block_id = models.BigIntegerField(null=True, blank=True)
+    html = models.TextField(blank=True)
+    type = models.CharField(max_length=20, default="text")
+    order = models.FloatField(default=0.0)
+    due_date = models.DateTimeField(null=True, blank=True)
+    is_done = models.BooleanField(default=False)
+    is_pinned = models.BooleanField(default=False)
+    # The class body's ``list`` is the field, hence not ``default=list``.
+    tag_ids = models.JSONField(default=no_tags, blank=True)
+    path = models.TextField(default="")
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'path'], name='archived_block_user_path_idx'),
+            models.Index(fields=['user', 'archived_at'], name='archived_block_user_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id}"
+
+class BlockOrderCounter(models.Model):
+    """
+    Last append position handed out for one sibling group (user, list, parent_block).
+
+    Bumping it is a single UPDATE, which takes the row lock and makes
+    concurrent creates in the same group receive distinct orders.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="block_order_counters")
+    key = models.CharField(max_length=64, unique=True)
+    value = models.FloatField(default=0.0)
+
+    def __str__(self):
+        return self.key
+
+class ChangeVersion(models.Model):
+    """Per-user counter bumped on every Folder/List/Block/Tag write; backs the API's ETags."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="change_version")
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}@{self.version}"
+
+class Tombstone(models.Model):
+    """Record of a deleted Folder/List/Block/Tag, so incremental sync can report deletions."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tombstones")
+    kind = models.CharField(max_length=10)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id}"
+
+class BlockSearchDocument(models.Model):
+    """
+    HTML-stripped text of a Block, kept in sync on write by ``api.search``.
+
+    On SQLite an FTS5 table (``api_blocksearch_fts``) mirrors this table
+    through triggers; other databases search ``text`` directly.
+    """
+    block = models.OneToOneField(Block, on_delete=models.CASCADE, primary_key=True, related_name="search_document")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="block_search_documents")
+    text = models.TextField(blank=True)
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.block_id}"
\ No newline at end of file
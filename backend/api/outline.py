@@ -0,0 +1,256 @@
+"""
+Outline import: turn pasted Markdown or HTML into a block tree, and create a
+whole tree in a few statements.
+
+Parsed and client-sent trees share one node shape, ``{'html', 'type',
+'is_done', 'children', ...}``, and ``flatten_nodes`` turns either into a
+pre-order list of ``(node, parent_index)``. ``create_outline`` assigns orders
+and parent links in memory, inserts each tree level with one ``bulk_create``,
+and adds every tag link in one more. ``bulk_create`` skips the model
+signals, so the tree paths, the search index and the change feed are
+updated explicitly.
+"""
+
+import re
+from collections import defaultdict
+from html import escape
+from html.parser import HTMLParser
+
+from django.db import transaction
+
+from .changes import record_change
+from .models import Block
+from .ordering import ORDER_STEP, next_orders, orders_after, sibling_blocks
+from .search import index_blocks
+from .tree import fill_paths
+
+MARKDOWN_LINE_RE = re.compile(
+    r'^(?:(?P<heading>#{1,3})\s+'
+    r'|(?P<task>[-*+]\s+\[(?P<done>[ xX])\]\s+)'
+    r'|(?P<bullet>[-*+]\s+)'
+    r'|(?P<numbered>\d+[.)]\s+)'
+    r'|(?P<quote>>\s?))?'
+    r'(?P<text>.*)$'
+)
+HTML_BLOCK_TYPES = {
+    'p': 'text', 'div': 'text', 'pre': 'text',
+    'h1': 'heading1', 'h2': 'heading2', 'h3': 'heading3', 'h4': 'heading3', 'h5': 'heading3', 'h6': 'heading3',
+    'blockquote': 'quote',
+}
+HTML_SKIPPED_TAGS = {'script', 'style', 'head', 'title'}
+
+
+def outline_node(text, type='text', is_done=False):
+    return {'html': escape(' '.join(text.split()), quote=False), 'type': type, 'is_done': is_done, 'children': []}
+
+
+def parse_markdown(text):
+    """
+    Parse an indented Markdown outline: one block per non-blank line, nested
+    by indentation. ``#`` headings, ``- [ ]``/``- [x]`` tasks, bullets,
+    numbered items and ``>`` quotes map to the matching block types; inline
+    markup is kept as text.
+    """
+    roots = []
+    stack = []  # (indent, node) of the open ancestors
+    for line in text.expandtabs(4).splitlines():
+        if not line.strip():
+            continue
+        indent = len(line) - len(line.lstrip(' '))
+        match = MARKDOWN_LINE_RE.match(line.strip())
+        if match['heading']:
+            node = outline_node(match['text'], f'heading{len(match["heading"])}')
+        elif match['task']:
+            done = match['done'] != ' '
+            node = outline_node(match['text'], 'task-done' if done else 'task', done)
+        elif match['bullet']:
+            node = outline_node(match['text'], 'bullet')
+        elif match['numbered']:
+            node = outline_node(match['text'], 'numbered')
+        elif match['quote']:
+            node = outline_node(match['text'], 'quote')
+        else:
+            node = outline_node(match['text'])
+
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        (stack[-1][1]['children'] if stack else roots).append(node)
+        stack.append((indent, node))
+    return roots
+
+
+class OutlineHTMLParser(HTMLParser):
+    """Builds outline nodes from paragraphs, headings, quotes and (nested) list items."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.roots = []
+        self.containers = [self.roots]  # children list that new blocks go into
+        self.lists = []  # 'bullet'/'numbered' per open <ul>/<ol>
+        self.items = []  # open <li> nodes
+        self.current = None  # node collecting text
+        self.text = []
+        self.skipping = 0
+
+    def flush(self):
+        if self.current is not None:
+            self.current['html'] = outline_node(''.join(self.text))['html']
+        self.current, self.text = None, []
+
+    def open_block(self, type):
+        self.flush()
+        self.current = outline_node('', type)
+        self.containers[-1].append(self.current)
+        return self.current
+
+    def handle_starttag(self, tag, attrs):
+        if tag in HTML_SKIPPED_TAGS:
+            self.skipping += 1
+        elif tag in ('ul', 'ol'):
+            self.flush()
+            self.lists.append('numbered' if tag == 'ol' else 'bullet')
+            self.containers.append(self.items[-1]['children'] if self.items else self.containers[-1])
+        elif tag == 'li':
+            self.items.append(self.open_block(self.lists[-1] if self.lists else 'bullet'))
+        elif tag == 'input' and self.current is not None and dict(attrs).get('type') == 'checkbox':
+            done = any(name == 'checked' for name, _ in attrs)
+            self.current.update(type='task-done' if done else 'task', is_done=done)
+        elif tag in HTML_BLOCK_TYPES:
+            # A paragraph right inside a list item is the item's own text.
+            if not (self.items and self.current is self.items[-1] and not ''.join(self.text).strip()):
+                self.open_block(HTML_BLOCK_TYPES[tag])
+        elif tag == 'br':
+            self.text.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in HTML_SKIPPED_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in ('ul', 'ol') and self.lists:
+            self.flush()
+            self.lists.pop()
+            self.containers.pop()
+        elif tag == 'li' and self.items:
+            self.flush()
+            self.items.pop()
+        elif tag in HTML_BLOCK_TYPES:
+            self.flush()
+
+    def handle_data(self, data):
+        if self.skipping or (self.current is None and not data.strip()):
+            return
+        if self.current is None:
+            self.open_block('text')
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        self.flush()
+
+
+def prune_empty(nodes):
+    """
+    ``nodes`` without empty text nodes that have no children left. Iterative
+    like ``flatten_nodes``: pasted HTML can nest deeper than the recursion limit.
+    """
+    def kept(node):
+        return node['html'] or node['children'] or node['type'] != 'text'
+
+    order = []
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(node['children'])
+    # Every node comes after its parent in ``order``, so walking it backwards prunes children first.
+    for node in reversed(order):
+        node['children'] = [child for child in node['children'] if kept(child)]
+    return [node for node in nodes if kept(node)]
+
+
+def parse_html(text):
+    """Parse pasted HTML into outline nodes; only the text of each block is kept."""
+    parser = OutlineHTMLParser()
+    parser.feed(text)
+    parser.close()
+    return prune_empty(parser.roots)
+
+
+def flatten_nodes(roots, limit=None):
+    """
+    Pre-order ``[(node, parent_index), ...]`` of a node tree; ``parent_index``
+    is ``None`` for roots. Raises ``ValueError`` for a malformed tree or one
+    with more than ``limit`` nodes.
+    """
+    flat = []
+    stack = [(node, None) for node in reversed(roots)]
+    while stack:
+        node, parent_index = stack.pop()
+        children = node.get('children') if isinstance(node, dict) else None
+        if not isinstance(node, dict) or not isinstance(children or [], list):
+            raise ValueError(f'Block {len(flat)} must be an object whose children are a list.')
+        flat.append((node, parent_index))
+        if limit is not None and len(flat) > limit:
+            raise ValueError(f'At most {limit} blocks can be imported at once.')
+        index = len(flat) - 1
+        stack.extend((child, index) for child in reversed(children or ()))
+    return flat
+
+
+def create_outline(user, list_id, parent_block_id, nodes, append=True, anchor=None):
+    """
+    Create the blocks of ``nodes`` (``flatten_nodes`` output, with validated
+    node fields) under ``list_id``/``parent_block_id`` and return them in
+    the same order. Roots are appended to the sibling group, or with
+    ``append=False`` placed right after ``anchor`` (first when ``None``).
+    Descendants have no list of their own, like blocks nested in the editor.
+    """
+    depth = []
+    levels = defaultdict(list)
+    children = {}
+    for index, (node, parent_index) in enumerate(nodes):
+        depth.append(0 if parent_index is None else depth[parent_index] + 1)
+        levels[depth[-1]].append(index)
+        children.setdefault(parent_index, []).append(index)
+
+    with transaction.atomic():
+        roots = children.get(None, [])
+        if append:
+            orders = next_orders(user, list_id, parent_block_id, len(roots))
+        else:
+            orders = orders_after(sibling_blocks(user, list_id, parent_block_id), anchor, len(roots))
+        order = dict(zip(roots, orders))
+        for parent_index, indexes in children.items():
+            if parent_index is not None:
+                # New parents have no other children, so plain steps need no counter.
+                order.update((index, position * ORDER_STEP) for position, index in enumerate(indexes, start=1))
+
+        blocks = [None] * len(nodes)
+        for level in range(len(levels)):
+            level_indexes = levels[level]
+            created = Block.objects.bulk_create([
+                Block(
+                    user=user,
+                    list_id=list_id if level == 0 else None,
+                    parent_block_id=parent_block_id if level == 0 else blocks[nodes[index][1]].id,
+                    html=nodes[index][0].get('html', ''),
+                    type=nodes[index][0].get('type', 'text'),
+                    order=order[index],
+                    due_date=nodes[index][0].get('due_date'),
+                    is_done=nodes[index][0].get('is_done', False),
+                    is_pinned=nodes[index][0].get('is_pinned', False),
+                )
+                for index in level_indexes
+            ])
+            fill_paths(created)
+            for index, block in zip(level_indexes, created):
+                blocks[index] = block
+
+        through = Block.tags.through
+        through.objects.bulk_create([
+            through(block_id=block.id, tag_id=tag_id)
+            for block, (node, _) in zip(blocks, nodes)
+            for tag_id in dict.fromkeys(node.get('tag_ids') or ())
+        ])
+        index_blocks(blocks)
+        record_change(user.pk, 'block', 'create', [block.id for block in blocks])
+    return blocks
@@ -0,0 +1,122 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in keyset pagination over a unique ``ordering``.
+
+    Requests without ``cursor`` or ``page_size`` keep returning a plain array,
+    cut to its first ``limit`` rows (in the view's ordering) when that is
+    given. Pages start after the cursor with ``a > x OR (a = x AND b > y)`` (the
+    expansion of the row value comparison ``(a, b) > (x, y)``) rather than at
+    an offset, so deep pages cost the same as the first one.
+    """
+
+    ordering = ('id',)
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    limit_query_param = 'limit'
+    page_size = 100
+    max_page_size = 500
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        self.limited = False
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            if self.limit_query_param not in params:
+                return None
+            self.limited = True
+            return list(queryset[:self.get_page_size(request, self.limit_query_param)])
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(params.get(self.cursor_query_param), queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_page_size(self, request, param=None):
+        try:
+            page_size = int(request.query_params[param or self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def after(self, position):
+        """Build ``(f1 > v1) OR (f1 = v1 AND f2 > v2) OR ...`` for the ordering fields."""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            term = Q(**{f'{field}__gt': position[i]})
+            for previous, value in zip(self.ordering[:i], position):
+                term &= Q(**{previous: value})
+            condition |= term
+        return condition
+
+    def decode_cursor(self, encoded, model):
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [self.cursor_value(model, name, value) for name, value in zip(self.ordering, position)]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def cursor_value(self, model, name, value):
+        """``value`` as a value of the ordering field ``name``; raises ``ValidationError`` if it is not one."""
+        if value is None or isinstance(value, (bool, dict, list)):
+            raise ValidationError('Cursor values are strings or numbers.')
+        field = model._meta.get_field(name)
+        value = field.to_python(value)
+        # Range validators too: an integer past 64 bits would only fail in the database driver.
+        field.run_validators(value)
+        return value
+
+    def encode_cursor(self, instance):
+        position = [getattr(instance, field) for field in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps(position).encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if self.limited:
+            return Response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class BlockPagination(KeysetPagination):
+    ordering = ('order', 'id')
+
+
+class ListPagination(KeysetPagination):
+    ordering = ('sort_order', 'id')
+
+
+class ArchivedBlockPagination(KeysetPagination):
+    ordering = ('path',)
@@ -0,0 +1,57 @@
+"""
+Per-user cached response payloads for the sidebar reads.
+
+``GET /api/lists/`` and ``GET /api/folders/`` are requested on nearly every
+page, and they change only when the user edits a List or Folder. Their
+serialized payload is stored in the Django cache (``PAYLOAD_CACHE_ALIAS``,
+locmem unless configured otherwise) with an ETag derived from its content.
+``signals.py`` drops the entries on List/Folder writes.
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+# Which payloads embed which models. Lists embed their folder.
+PAYLOADS_BY_KIND = {
+    'folder': ('folders', 'lists'),
+    'list': ('lists',),
+}
+
+
+def payload_cache():
+    return caches[getattr(settings, 'PAYLOAD_CACHE_ALIAS', 'default')]
+
+
+def payload_key(user_id, name):
+    return f'payload:{name}:{user_id}'
+
+
+def cached_payload(user_id, name):
+    """The cached ``{'etag', 'data'}`` of a payload, or ``None`` on a miss."""
+    return payload_cache().get(payload_key(user_id, name))
+
+
+def get_payload(user_id, name, build):
+    """Return ``{'etag', 'data'}`` for a payload, building and caching it on a miss."""
+    entry = cached_payload(user_id, name)
+    if entry is None:
+        data = list(build())
+        digest = hashlib.md5(json.dumps(data, cls=DjangoJSONEncoder).encode()).hexdigest()[:16]
+        entry = {'etag': f'"{user_id}.{name}.{digest}"', 'data': data}
+        payload_cache().set(payload_key(user_id, name), entry, getattr(settings, 'PAYLOAD_CACHE_TIMEOUT', 300))
+    return entry
+
+
+def invalidate_payloads(user_id, kind):
+    names = PAYLOADS_BY_KIND.get(kind)
+    if not names:
+        return
+    keys = [payload_key(user_id, name) for name in names]
+    payload_cache().delete_many(keys)
+    # Again after commit, in case a concurrent read cached the pre-commit rows meanwhile.
+    transaction.on_commit(lambda: payload_cache().delete_many(keys))
@@ -0,0 +1,188 @@
+"""
+Realtime change events over WebSockets.
+
+``record_change`` publishes a compact ``{type, op, ids}`` event per write to
+the configured broker. ``websocket_application`` is a plain ASGI app, mounted
+by ``config/asgi.py`` at ``/ws/changes/``. It authenticates with
+``?token=<auth token>`` and streams the user's events as JSON text frames.
+The token is checked again before each event and at least every
+``REALTIME_TOKEN_CHECK_SECONDS``; once it is logged out, expired or pruned
+the socket is closed with code 4401.
+
+The default ``InMemoryBroker`` only reaches sockets held by the same
+process. Multi-process deployments set ``REALTIME_BROKER`` to a shared
+backend such as ``api.realtime.RedisBroker``.
+"""
+
+import asyncio
+import json
+import threading
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import AuthenticationFailed
+
+from accounts.authentication import CachedTokenAuthentication
+
+WEBSOCKET_PATH = '/ws/changes/'
+RESYNC_EVENT = {'type': 'resync'}
+
+
+class Subscription:
+    """Events for one socket, delivered on the event loop that opened it."""
+
+    def __init__(self, broker, user_id, maxsize=256):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event):
+        # Called from any thread; hop onto the subscriber's loop.
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            # A slow client missed events: drop the backlog and ask it to resync.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = RESYNC_EVENT
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    """Fan out events to subscribers in this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.user_id, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self.subscribers.pop(subscription.user_id, None)
+
+    def publish(self, user_id, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+
+class RedisBroker(InMemoryBroker):
+    """
+    Relay events through Redis pub/sub so every process sees every write.
+
+    Requires the optional ``redis`` package and ``REALTIME_REDIS_URL``.
+    Local subscribers are still tracked in memory; one listener task per
+    process forwards the shared channel to them.
+    """
+
+    channel = 'flist:changes'
+
+    def __init__(self):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBroker requires the "redis" package.')
+        self.url = getattr(settings, 'REALTIME_REDIS_URL', 'redis://localhost:6379/0')
+        self.client = redis.Redis.from_url(self.url)
+        self.listener = None
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.get_running_loop().create_task(self.listen())
+        return subscription
+
+    async def listen(self):
+        import redis.asyncio
+
+        pubsub = redis.asyncio.Redis.from_url(self.url).pubsub()
+        await pubsub.subscribe(self.channel)
+        async for message in pubsub.listen():
+            if message['type'] == 'message':
+                payload = json.loads(message['data'])
+                super().publish(payload['user_id'], payload['event'])
+
+    def publish(self, user_id, event):
+        self.client.publish(self.channel, json.dumps({'user_id': user_id, 'event': event}))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'REALTIME_BROKER', 'api.realtime.InMemoryBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+async def authenticate(scope):
+    """The user of the ``?token=`` of ``scope``, checked like the API checks it (expiry included), or ``None``."""
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    if not token:
+        return None
+    try:
+        user, _ = await CachedTokenAuthentication().aauthenticate_credentials(token)
+    except AuthenticationFailed:
+        return None
+    return user
+
+
+def token_check_seconds():
+    return getattr(settings, 'REALTIME_TOKEN_CHECK_SECONDS', 60)
+
+
+async def websocket_application(scope, receive, send):
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    user = await authenticate(scope) if scope['path'] == WEBSOCKET_PATH else None
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+
+    await send({'type': 'websocket.accept'})
+    subscription = get_broker().subscribe(user.pk)
+
+    async def forward_events():
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), token_check_seconds())
+            except asyncio.TimeoutError:
+                event = None
+            if await authenticate(scope) is None:
+                await send({'type': 'websocket.close', 'code': 4401})
+                return
+            if event is not None:
+                await send({'type': 'websocket.send', 'text': json.dumps(event)})
+
+    forwarder = asyncio.create_task(forward_events())
+    try:
+        while (await receive())['type'] != 'websocket.disconnect':
+            pass  # clients only listen; ignore anything they send
+    finally:
+        forwarder.cancel()
+        subscription.close()
@@ -0,0 +1,40 @@
+"""
+JSON rendering with ``orjson`` when it is installed.
+
+``FastJSONRenderer`` (the default renderer, see ``REST_FRAMEWORK`` in
+config/settings.py) writes the same bytes as DRF's ``JSONRenderer``:
+dates, times and anything else orjson does not handle natively go through
+DRF's encoder, and U+2028/U+2029 are escaped the same way. What orjson
+cannot render (indented output for the browsable API, integers over 64
+bits, nesting deeper than its limit of 254 levels, which a block tree of
+about 120 levels reaches) and installs without orjson fall back to the
+stdlib ``json`` module through ``JSONRenderer`` itself.
+"""
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+encoder = JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=encoder.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,149 @@
+"""
+Full-text search over ``Block.html``.
+
+Each block has a ``BlockSearchDocument`` that holds its HTML-stripped text.
+The document is refreshed whenever the block's html is saved (see
+``signals.index_block``). On SQLite, triggers mirror the documents into the
+FTS5 table ``FTS_TABLE``, and results are ranked by bm25. Other databases
+match every search term against the document text with ``icontains`` and
+return the most recently edited blocks first.
+"""
+
+import html
+import re
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils.html import escape, strip_tags
+
+from .models import Block, BlockSearchDocument
+
+FTS_TABLE = 'api_blocksearch_fts'
+SNIPPET_TOKENS = 12
+SNIPPET_CHARS = 60
+
+# Control characters that cannot appear in block text; replaced by <mark> after escaping.
+MARK_START, MARK_END = '\x02', '\x03'
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+WHITESPACE_RE = re.compile(r'\s+')
+BLOCK_TAG_RE = re.compile(r'<(?:br|/p|/div|/li|/h\d)\b[^>]*>', re.IGNORECASE)
+
+
+def block_text(value):
+    """Plain text of a block's html: tags removed, entities decoded, whitespace collapsed."""
+    value = BLOCK_TAG_RE.sub(' ', value or '')
+    value = html.unescape(strip_tags(value))
+    value = value.replace(MARK_START, '').replace(MARK_END, '')
+    return WHITESPACE_RE.sub(' ', value).strip()
+
+
+def use_fts():
+    return connection.vendor == 'sqlite'
+
+
+def search_terms(query):
+    return TERM_RE.findall(query or '')[:16]
+
+
+def index_blocks(blocks):
+    """Create or refresh the search documents of ``blocks`` in one statement."""
+    documents = [
+        BlockSearchDocument(block_id=block.pk, user_id=block.user_id, text=block_text(block.html))
+        for block in blocks
+    ]
+    BlockSearchDocument.objects.bulk_create(
+        documents, batch_size=500,
+        update_conflicts=True, unique_fields=['block'], update_fields=['user', 'text', 'indexed_at'],
+    )
+    return len(documents)
+
+
+def stale_blocks(user_id=None):
+    """Blocks edited since their document was written, or never indexed."""
+    blocks = Block.objects.filter(
+        Q(search_document__isnull=True) | Q(updated_at__gt=F('search_document__indexed_at'))
+    )
+    return blocks.filter(user_id=user_id) if user_id else blocks
+
+
+def rebuild_index(user_id=None, chunk_size=2000):
+    """Rewrite every document (of one user, or everyone) and rebuild the FTS table."""
+    blocks = Block.objects.order_by('pk').only('pk', 'user_id', 'html')
+    documents = BlockSearchDocument.objects.all()
+    if user_id:
+        blocks = blocks.filter(user_id=user_id)
+        documents = documents.filter(user_id=user_id)
+
+    total = 0
+    with transaction.atomic():
+        documents.delete()
+        chunk = []
+        for block in blocks.iterator(chunk_size=chunk_size):
+            chunk.append(block)
+            if len(chunk) == chunk_size:
+                total += index_blocks(chunk)
+                chunk = []
+        total += index_blocks(chunk)
+        if use_fts() and not user_id:
+            # Triggers keep the FTS table in step; 'rebuild' also compacts it and repairs drift.
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return total
+
+
+def highlight(snippet):
+    return escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def fts_search(user, terms, limit):
+    # Terms are quoted so FTS operators in user input are inert; the last one is
+    # prefix-matched for search-as-you-type, the others must match whole words.
+    match = ' '.join(f'"{term}"' for term in terms) + '*'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT d.block_id FROM {FTS_TABLE} '
+            f'JOIN {BlockSearchDocument._meta.db_table} d ON d.block_id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s AND d.user_id = %s ORDER BY rank LIMIT %s',
+            [match, user.pk, limit],
+        )
+        ids = [pk for pk, in cursor.fetchall()]
+        if not ids:
+            return []
+        # Snippets are built in a second pass, so only the returned rows pay for them.
+        cursor.execute(
+            f'SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid IN ({", ".join(["%s"] * len(ids))})',
+            [MARK_START, MARK_END, '…', SNIPPET_TOKENS, match, *ids],
+        )
+        snippets = dict(cursor.fetchall())
+    return [(pk, snippets.get(pk, '')) for pk in ids]
+
+
+def fallback_snippet(text, terms):
+    lowered = text.lower()
+    starts = [lowered.find(term.lower()) for term in terms]
+    start = min((s for s in starts if s >= 0), default=0)
+    left, right = max(0, start - SNIPPET_CHARS // 2), start + SNIPPET_CHARS
+    snippet = text[left:right]
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+    snippet = pattern.sub(lambda m: f'{MARK_START}{m.group(0)}{MARK_END}', snippet)
+    return ('…' if left else '') + snippet + ('…' if right < len(text) else '')
+
+
+def fallback_search(user, terms, limit):
+    documents = BlockSearchDocument.objects.filter(user=user)
+    for term in terms:
+        documents = documents.filter(text__icontains=term)
+    rows = documents.order_by('-block__updated_at').values_list('block_id', 'text')[:limit]
+    return [(pk, fallback_snippet(text, terms)) for pk, text in rows]
+
+
+def search_blocks(user, query, limit=20):
+    """Return ``[(block, snippet_html)]`` for ``user``'s blocks matching ``query``, best first."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    rows = (fts_search if use_fts() else fallback_search)(user, terms, limit)
+    blocks = Block.objects.filter(user=user).in_bulk([pk for pk, _ in rows])
+    return [(blocks[pk], highlight(snippet)) for pk, snippet in rows if pk in blocks]
@@ -1,5 +1,107 @@
+from collections import defaultdict
+
+from django.db.models import Q, QuerySet
+from django.db.models.functions import Length
 from rest_framework import serializers
-from .models import Block, List, Folder, Tag
+from .models import ArchivedBlock, Block, List, Folder, Tag
+from .outline import flatten_nodes, parse_html, parse_markdown
+from .tree import PATH_WIDTH, subtree_q, subtree_roots
+
+
+def load_block_children(blocks, queryset=None, max_depth=None, tags=True, html=True):
+    """
+    Load every descendant of ``blocks`` and return a ``{parent_id: [child, ...]}`` map.
+
+    Each subtree is a range of ``Block.path`` (see ``api.tree``), so the
+    descendants of up to ``PATH_RANGES_PER_QUERY`` subtrees come from one
+    query (with their tags prefetched), however deep the trees are. When
+    ``queryset`` is the queryset ``blocks`` came from, rows it already holds
+    are excluded with a subquery; if it spans more subtrees than that, the
+    tree is walked one level at a time instead, so a queryset that already
+    holds a whole workspace costs a single extra (empty) query.
+    ``max_depth`` stops after that many levels; ``tags``/``html`` set to False
+    skip the tag prefetch and the html column.
+    """
+    loaded = {block.id: block for block in blocks}
+    base = Block.objects.order_by('order', 'id')
+    if tags:
+        base = base.prefetch_related('tags')
+    if not html:
+        base = base.defer('html')
+
+    roots = subtree_roots(block.path for block in blocks)
+    if queryset is not None and len(roots) > PATH_RANGES_PER_QUERY:
+        descendants = descendants_by_level(base, queryset, max_depth)
+    else:
+        if queryset is not None:
+            base = base.exclude(id__in=queryset.values('id'))
+        descendants = descendants_by_path(base, blocks[0].user_id if blocks else None, roots, max_depth)
+    for block in descendants:
+        loaded.setdefault(block.id, block)
+
+    children = defaultdict(list)
+    for block in loaded.values():
+        if block.parent_block_id in loaded:
+            children[block.parent_block_id].append(block)
+    for siblings in children.values():
+        siblings.sort(key=lambda block: block.order)
+    return children
+
+
+PATH_RANGES_PER_QUERY = 100
+
+
+def descendants_by_path(base, user_id, roots, max_depth=None):
+    """Rows of ``base`` strictly inside ``user_id``'s subtrees at the paths ``roots``, at most ``max_depth`` levels down."""
+    if max_depth is not None:
+        base = base.annotate(path_length=Length('path'))
+    for start in range(0, len(roots), PATH_RANGES_PER_QUERY):
+        ranges = Q()
+        for path in roots[start:start + PATH_RANGES_PER_QUERY]:
+            # The user goes into every range so each one searches the (user, path) index (see subtrees_q).
+            subtree = Q(user_id=user_id) & subtree_q(path, include_self=False)
+            if max_depth is not None:
+                subtree &= Q(path_length__lte=len(path) + max_depth * PATH_WIDTH)
+            ranges |= subtree
+        yield from base.filter(ranges)
+
+
+def descendants_by_level(base, queryset, max_depth=None):
+    """Descendants of the rows of ``queryset`` that it does not hold itself, one query per tree level."""
+    ids = queryset.values('id')
+    candidates = base.filter(parent_block__in=ids).exclude(id__in=ids)
+    level = 0
+    while max_depth is None or level < max_depth:
+        level += 1
+        frontier = []
+        for block in candidates:
+            frontier.append(block.id)
+            yield block
+        if not frontier:
+            break
+        candidates = base.filter(parent_block_id__in=frontier)
+
+def sparse_fields(request):
+    """The ``?fields=`` of a GET request as a set of names, or ``None`` for all fields."""
+    value = request.query_params.get('fields') if request is not None and request.method == 'GET' else None
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()} | {'id'}
+
+
+def requested_depth(request):
+    """The ``?depth=`` of a GET request (levels of ``child_blocks``), or ``None`` for the whole tree."""
+    value = request.query_params.get('depth') if request is not None and request.method == 'GET' else None
+    if value in (None, ''):
+        return None
+    try:
+        depth = int(value)
+    except ValueError:
+        depth = -1
+    if depth < 0:
+        raise serializers.ValidationError({'depth': 'Must be a non-negative integer.'})
+    return depth
+
 
 class FolderSerializer(serializers.ModelSerializer):
     class Meta:
@@ -32,19 +134,250 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
         read_only_fields = ['id']
 
+class BlockBulkUpdateSerializer(serializers.Serializer):
+    """One partial update in a ``POST /api/blocks/bulk/`` batch; also used for the response rows."""
+    id = serializers.IntegerField()
+    list = serializers.IntegerField(source='list_id', required=False, allow_null=True)
+    parent_block = serializers.IntegerField(source='parent_block_id', required=False, allow_null=True)
+    type = serializers.CharField(max_length=20, required=False)
+    order = serializers.FloatField(required=False)
+    due_date = serializers.DateTimeField(required=False, allow_null=True)
+    is_done = serializers.BooleanField(required=False)
+    updated_at = serializers.DateTimeField(read_only=True)
+
+    def validate(self, attrs):
+        if attrs.get('parent_block_id') == attrs['id']:
+            raise serializers.ValidationError({'parent_block': 'A block cannot be its own parent.'})
+        return attrs
+
+
+class BlockMoveSerializer(serializers.Serializer):
+    """Body of ``POST /api/blocks/{id}/move/``: the sibling to follow (``null`` for first) and an optional new parent."""
+    after = serializers.IntegerField(allow_null=True)
+    list = serializers.IntegerField(source='list_id', required=False, allow_null=True)
+    parent_block = serializers.IntegerField(source='parent_block_id', required=False, allow_null=True)
+
+
+class BlockImportNodeSerializer(serializers.Serializer):
+    """One block of an imported tree; its ``children`` are validated as nodes of their own."""
+    html = serializers.CharField(allow_blank=True, trim_whitespace=False, default='')
+    type = serializers.CharField(max_length=20, default='text')
+    due_date = serializers.DateTimeField(required=False, allow_null=True)
+    is_done = serializers.BooleanField(default=False)
+    is_pinned = serializers.BooleanField(default=False)
+    tag_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+
+class BlockImportSerializer(serializers.Serializer):
+    """
+    Body of ``POST /api/blocks/import/``: where the blocks go, and the tree
+    itself as nested ``blocks``, pasted ``markdown`` or pasted ``html``.
+    Validated data holds ``nodes``, the flattened tree (see ``outline.flatten_nodes``).
+    """
+    list = serializers.IntegerField(source='list_id', required=False, allow_null=True)
+    parent_block = serializers.IntegerField(source='parent_block_id', required=False, allow_null=True)
+    after = serializers.IntegerField(required=False, allow_null=True)
+    blocks = serializers.ListField(required=False)
+    markdown = serializers.CharField(required=False, trim_whitespace=False)
+    html = serializers.CharField(required=False, trim_whitespace=False)
+
+    def __init__(self, *args, max_blocks=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_blocks = max_blocks
+
+    def validate(self, attrs):
+        sources = [name for name in ('blocks', 'markdown', 'html') if name in attrs]
+        if len(sources) != 1:
+            raise serializers.ValidationError('Send exactly one of blocks, markdown or html.')
+        source = sources[0]
+        roots = attrs.pop(source)
+        if source == 'markdown':
+            roots = parse_markdown(roots)
+        elif source == 'html':
+            roots = parse_html(roots)
+        try:
+            nodes = flatten_nodes(roots, self.max_blocks)
+        except ValueError as error:
+            raise serializers.ValidationError({source: str(error)})
+        if not nodes:
+            raise serializers.ValidationError({source: 'Nothing to import.'})
+
+        # One ListSerializer pass over the flat rows; children were flattened out above.
+        rows = BlockImportNodeSerializer(
+            data=[{key: value for key, value in node.items() if key != 'children'} for node, _ in nodes], many=True)
+        if not rows.is_valid():
+            raise serializers.ValidationError({source: {index: error for index, error in enumerate(rows.errors) if error}})
+        attrs['nodes'] = [(row, parent_index) for row, (_, parent_index) in zip(rows.validated_data, nodes)]
+        return attrs
+
+
+class WorkspaceTagRowSerializer(serializers.Serializer):
+    """A ``tag`` line of a workspace import (see ``api.workspace``); ids are the exported ones."""
+    id = serializers.IntegerField()
+    name = serializers.CharField(max_length=50)
+
+
+class WorkspaceFolderRowSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField(max_length=255)
+
+
+class WorkspaceListRowSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField(max_length=255)
+    folder = serializers.IntegerField(allow_null=True, default=None)
+    sort_order = serializers.IntegerField(default=0)
+
+
+class WorkspaceBlockRowSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    list = serializers.IntegerField(allow_null=True, default=None)
+    parent_block = serializers.IntegerField(allow_null=True, default=None)
+    html = serializers.CharField(allow_blank=True, trim_whitespace=False, default='')
+    type = serializers.CharField(max_length=20, default='text')
+    order = serializers.FloatField(default=0.0)
+    due_date = serializers.DateTimeField(allow_null=True, default=None)
+    is_done = serializers.BooleanField(default=False)
+    is_pinned = serializers.BooleanField(default=False)
+    tags = serializers.ListField(child=serializers.IntegerField(), default=list)
+
+
+class BlockSyncSerializer(serializers.ModelSerializer):
+    """Flat block row for ``/api/sync/``; clients rebuild the tree from ``parent_block``."""
+    tags = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Block
+        fields = ['id', 'list', 'parent_block', 'html', 'type', 'order', 'due_date', 'is_done', 'is_pinned', 'tags', 'created_at', 'updated_at']
+
+
+class ArchivedBlockSerializer(serializers.ModelSerializer):
+    """Flat archived block row; ``parent_block`` and ``tags`` are the ids it had when it was archived."""
+    parent_block = serializers.IntegerField(source='parent_block_id', read_only=True)
+    tags = serializers.ListField(source='tag_ids', child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = ArchivedBlock
+        fields = ['id', 'list', 'parent_block', 'html', 'type', 'order', 'due_date', 'is_done', 'is_pinned', 'tags', 'created_at', 'updated_at', 'archived_at']
+
+
+class BlockSearchResultSerializer(serializers.ModelSerializer):
+    """Flat block row plus the highlighted ``snippet`` of the matching text."""
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Block
+        fields = ['id', 'list', 'parent_block', 'html', 'type', 'due_date', 'is_done', 'updated_at', 'snippet']
+
+
+class BlockSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class AgendaQuerySerializer(serializers.Serializer):
+    """Query of ``GET /api/agenda/``: an inclusive ``from``/``to`` date range (at most ``max_days``) in ``tz``."""
+    max_days = 366
+
+    tz = serializers.CharField(required=False, allow_blank=True)
+    include = serializers.CharField(required=False, allow_blank=True)
+
+    def get_fields(self):
+        # "from" is a Python keyword, so these cannot be declared as attributes.
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(required=False)
+        fields['to'] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, attrs):
+        start, end = attrs.get('from'), attrs.get('to')
+        if start and end and end < start:
+            raise serializers.ValidationError({'to': '"to" must not be before "from".'})
+        if start and end and (end - start).days >= self.max_days:
+            raise serializers.ValidationError({'to': f'The range is limited to {self.max_days} days.'})
+        return attrs
+
+
+class AgendaTaskSerializer(serializers.ModelSerializer):
+    """Task row in an agenda day; ``html`` only when the view was asked to include it."""
+
+    class Meta:
+        model = Block
+        fields = ['id', 'list', 'parent_block', 'type', 'order', 'due_date', 'is_done', 'is_pinned', 'html']
+
+    def __init__(self, *args, include_html=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not include_html:
+            self.fields.pop('html')
+
+
+class BlockListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        queryset = data if isinstance(data, QuerySet) else None
+        blocks = list(data.all() if hasattr(data, 'all') else data)
+        # 子ブロックはまとめて読み込み、ツリー全体をメモリ上で組み立てる
+        self.child.block_children = self.child.load_children(blocks, queryset)
+        return [self.child.to_representation(block) for block in blocks]
+
+
 class BlockSerializer(serializers.ModelSerializer):
     child_blocks = serializers.SerializerMethodField()
     tags = TagSerializer(many=True, read_only=True)
     tag_ids = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True, write_only=True, required=False, source='tags')
+    after = serializers.PrimaryKeyRelatedField(
+        queryset=Block.objects.none(), write_only=True, required=False, allow_null=True)
 
     class Meta:
         model = Block
-        fields = ['id', 'list', 'parent_block', 'html', 'type', 'order', 'child_blocks', 'due_date', 'is_done', 'is_pinned', 'tags', 'tag_ids', 'created_at', 'updated_at']
+        fields = ['id', 'list', 'parent_block', 'html', 'type', 'order', 'child_blocks', 'due_date', 'is_done', 'is_pinned', 'tags', 'tag_ids', 'after', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+        list_serializer_class = BlockListSerializer
+
+    block_children = None
+    max_depth = None
+    level = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 挿入位置の指定はユーザー自身のブロックのみ
+        if 'context' in kwargs and 'request' in kwargs['context']:
+            request = kwargs['context']['request']
+            if request.user.is_authenticated:
+                self.fields['after'].queryset = Block.objects.filter(user=request.user)
+
+            # ?fields= / ?depth= で返す項目と子ブロックの階層を絞る
+            fields = sparse_fields(request)
+            if fields is not None:
+                unknown = fields - set(self.fields)
+                if unknown:
+                    raise serializers.ValidationError({'fields': f'Unknown fields: {", ".join(sorted(unknown))}'})
+                for name in set(self.fields) - fields:
+                    self.fields.pop(name)
+            self.max_depth = requested_depth(request)
+            if self.max_depth == 0:
+                self.fields.pop('child_blocks', None)
+
+    def load_children(self, blocks, queryset=None):
+        if 'child_blocks' not in self.fields:
+            return {}
+        return load_block_children(
+            blocks, queryset, self.max_depth, tags='tags' in self.fields, html='html' in self.fields
+        )
+
+    def to_representation(self, instance):
+        if self.block_children is None:
+            self.block_children = self.load_children([instance])
+        return super().to_representation(instance)
 
     def get_child_blocks(self, obj):
-        return BlockSerializer(obj.child_blocks.all(), many=True, context=self.context).data
+        if self.max_depth is not None and self.level >= self.max_depth:
+            return []
+        self.level += 1
+        try:
+            return [self.to_representation(child) for child in self.block_children.get(obj.id, [])]
+        finally:
+            self.level -= 1
 
     def create(self, validated_data):
         tags = validated_data.pop('tags', [])
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .archive import delete_archived_under
+from .changes import record_change
+from .models import Block, Folder, List, Tag, Tombstone
+from .payload_cache import invalidate_payloads
+from .search import index_blocks
+from .tree import move_subtree, parent_changed, set_path
+
+User = get_user_model()
+
+
+def deleting_users(origin):
+    """
+    Whether a delete signal belongs to deleting user accounts, from its
+    ``origin`` (what ``delete()`` was called on): their rows need no tombstones.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, User)
+
+
+@receiver(post_save, sender=Folder)
+@receiver(post_save, sender=List)
+@receiver(post_save, sender=Block)
+@receiver(post_save, sender=Tag)
+def record_write(sender, instance, created, **kwargs):
+    record_change(instance.user_id, sender._meta.model_name, 'create' if created else 'update', [instance.pk])
+    invalidate_payloads(instance.user_id, sender._meta.model_name)
+
+
+@receiver(post_save, sender=Block)
+def index_block(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'html' in update_fields:
+        index_blocks([instance])
+
+
+@receiver(post_save, sender=Block)
+def maintain_path(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        set_path(instance)
+    elif (update_fields is None or 'parent_block' in update_fields) and parent_changed(instance):
+        move_subtree(instance)
+
+
+@receiver(post_delete, sender=Folder)
+@receiver(post_delete, sender=List)
+@receiver(post_delete, sender=Block)
+@receiver(post_delete, sender=Tag)
+def record_delete(sender, instance, origin=None, **kwargs):
+    invalidate_payloads(instance.user_id, sender._meta.model_name)
+    if deleting_users(origin):
+        return
+    Tombstone.objects.create(user_id=instance.user_id, kind=sender._meta.model_name, object_id=instance.pk)
+    record_change(instance.user_id, sender._meta.model_name, 'delete', [instance.pk])
+
+
+@receiver(pre_delete, sender=Folder)
+def touch_folder_lists(sender, instance, **kwargs):
+    # The lists' folder is nulled by the collector without saving them.
+    instance.lists.update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=List)
+def delete_archived_blocks(sender, instance, origin=None, **kwargs):
+    # Archived blocks below the list's blocks have no list of their own, so the cascade misses them.
+    if deleting_users(origin):
+        return
+    roots = instance.blocks.filter(parent_block=None).values_list('id', flat=True)
+    archived_roots = instance.archived_blocks.filter(parent_block_id=None).values_list('id', flat=True)
+    delete_archived_under(instance.user_id, [*roots, *archived_roots])
+
+
+@receiver(m2m_changed, sender=Block.tags.through)
+def record_tag_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # Tag links are part of a block's payload, so they count as a block update.
+    block_ids = [instance.pk] if not reverse else list(pk_set or ())
+    Block.objects.filter(pk__in=block_ids).update(updated_at=timezone.now())
+    record_change(instance.user_id, 'block', 'update', block_ids)
@@ -1,3 +1,1402 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gzip
+import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from threading import Barrier, Thread
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import compression
+from .archive import archive_blocks, archive_subtrees
+from .async_views import AsyncReadView
+from .compression import negotiate
+from .instrumentation import registry
+from .models import ArchivedBlock, Block, BlockSearchDocument, ChangeVersion, Folder, List, Tag, Tombstone
+from .outline import flatten_nodes, parse_html
+from .realtime import RESYNC_EVENT, InMemoryBroker, websocket_application
+from .renderers import FastJSONRenderer
+from .search import block_text, search_blocks
+from .serializers import BlockSerializer
+from .tree import depth, path_segment, subtree_q
+from .workspace import WorkspaceImportError, export_chunks, import_workspace
+
+User = get_user_model()
+
+
+class AuthenticatedTestCase(TestCase):
+    """Runs each test as ``self.user``, logged in on ``self.client``, with an empty ``self.list`` unless ``with_list`` is off."""
+
+    with_list = True
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='pass')
+        if self.with_list:
+            self.list = List.objects.create(user=self.user, title='List')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+def create_tree(user, list_obj, tags, roots=3, children=3, depth=3, parent=None, level=0):
+    blocks = []
+    for i in range(roots if parent is None else children):
+        block = Block.objects.create(
+            user=user, list=list_obj, parent_block=parent, html=f'block {level}-{i}', order=i
+        )
+        block.tags.set(tags[: i % (len(tags) + 1)])
+        blocks.append(block)
+        if level + 1 < depth:
+            blocks += create_tree(user, list_obj, tags, roots, children, depth, block, level + 1)
+    return blocks
+
+
+def serialize_naive(block):
+    """The previous recursive serialization, used as the reference shape."""
+    return {
+        'id': block.id,
+        'parent_block': block.parent_block_id,
+        'tags': [{'id': tag.id, 'name': tag.name} for tag in block.tags.all()],
+        'child_blocks': [serialize_naive(child) for child in block.child_blocks.order_by('order', 'id')],
+    }
+
+
+def strip(data):
+    return {
+        'id': data['id'],
+        'parent_block': data['parent_block'],
+        'tags': data['tags'],
+        'child_blocks': [strip(child) for child in data['child_blocks']],
+    }
+
+
+class BlockTreeSerializationTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tags = [Tag.objects.create(user=self.user, name=f'tag{i}') for i in range(2)]
+        ChangeVersion.objects.create(user=self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.data
+
+    def test_list_matches_recursive_shape(self):
+        create_tree(self.user, self.list, self.tags)
+        _, data = self.count_queries('/api/blocks/')
+
+        expected = [serialize_naive(block) for block in Block.objects.filter(user=self.user).order_by('order')]
+        self.assertEqual(sorted(map(strip, data), key=lambda d: d['id']), sorted(expected, key=lambda d: d['id']))
+
+    def test_list_query_count_does_not_grow_with_tree(self):
+        create_tree(self.user, self.list, self.tags, roots=2, children=2, depth=2)
+        small, _ = self.count_queries('/api/blocks/')
+
+        create_tree(self.user, self.list, self.tags, roots=5, children=4, depth=4)
+        large, data = self.count_queries('/api/blocks/')
+
+        self.assertEqual(small, large)
+        # change version, blocks, tags, descendant check
+        self.assertLessEqual(large, 4)
+        self.assertEqual(len(data), Block.objects.filter(user=self.user).count())
+
+    def test_filtered_list_loads_descendants_per_level(self):
+        root = create_tree(self.user, self.list, self.tags, roots=1, children=3, depth=4)[0]
+        queries, data = self.count_queries(f'/api/blocks/?parent_block={root.id}')
+
+        self.assertEqual(len(data), 3)
+        self.assertEqual(len(data[0]['child_blocks']), 3)
+        self.assertEqual(len(data[0]['child_blocks'][0]['child_blocks']), 3)
+        # change version, roots + tags, then one query per level plus their tags
+        self.assertLessEqual(queries, 8)
+
+    def test_retrieve_includes_subtree(self):
+        root = create_tree(self.user, self.list, self.tags, roots=1, children=2, depth=3)[0]
+        _, data = self.count_queries(f'/api/blocks/{root.id}/')
+
+        self.assertEqual(strip(data), serialize_naive(root))
+
+    def test_sparse_fields_skip_tags_html_and_children(self):
+        create_tree(self.user, self.list, self.tags, roots=4, children=3, depth=3)
+        full_queries, full = self.count_queries('/api/blocks/')
+        queries, data = self.count_queries('/api/blocks/?fields=id,list,due_date&depth=0')
+
+        self.assertEqual(set(data[0]), {'id', 'list', 'due_date'})
+        self.assertEqual(len(data), len(full))
+        # change version and the blocks; no tag prefetch, no descendant lookup
+        self.assertEqual(queries, 2)
+        self.assertLess(queries, full_queries)
+        self.assertLess(len(json.dumps(data)) * 10, len(json.dumps(full, default=str)))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/blocks/?fields=id,type')
+        self.assertNotIn('"html"', ctx.captured_queries[-1]['sql'])
+
+    def test_depth_limits_recursion(self):
+        root = create_tree(self.user, self.list, self.tags, roots=1, children=2, depth=4)[0]
+        _, data = self.count_queries(f'/api/blocks/{root.id}/?depth=1&fields=child_blocks')
+        self.assertEqual(len(data['child_blocks']), 2)
+        self.assertEqual(data['child_blocks'][0], {'id': data['child_blocks'][0]['id'], 'child_blocks': []})
+
+        _, data = self.count_queries(f'/api/blocks/{root.id}/?depth=2')
+        self.assertEqual(len(data['child_blocks'][0]['child_blocks']), 2)
+        self.assertEqual(data['child_blocks'][0]['child_blocks'][0]['child_blocks'], [])
+
+    def test_invalid_fields_and_depth(self):
+        self.assertEqual(self.client.get('/api/blocks/?fields=id,secret').status_code, 400)
+        self.assertEqual(self.client.get('/api/blocks/?depth=-1').status_code, 400)
+
+
+class BlockFilterTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tag = Tag.objects.create(user=self.user, name='work')
+
+    def ids(self, query):
+        response = self.client.get(f'/api/blocks/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return {block['id'] for block in response.data}
+
+    def make(self, **kwargs):
+        return Block.objects.create(user=self.user, **kwargs)
+
+    def test_type_in_and_flags(self):
+        task = self.make(type='task')
+        done = self.make(type='task-done', is_done=True)
+        pinned = self.make(type='note', is_pinned=True)
+
+        self.assertEqual(self.ids('type__in=task,task-done'), {task.id, done.id})
+        self.assertEqual(self.ids('is_done=true'), {done.id})
+        self.assertEqual(self.ids('is_pinned=true'), {pinned.id})
+
+    def test_list_and_parent(self):
+        root = self.make(list=self.list)
+        child = self.make(list=self.list, parent_block=root)
+        inbox = self.make()
+
+        self.assertEqual(self.ids(f'list_id={self.list.id}'), {root.id, child.id})
+        self.assertEqual(self.ids('list_id=none'), {inbox.id})
+        self.assertEqual(self.ids('parent_block=none'), {root.id, inbox.id})
+        self.assertEqual(self.ids(f'parent_block={root.id}'), {child.id})
+        self.assertEqual(self.ids(f'list_id={self.list.id}&parent_block=none'), {root.id})
+        response = self.client.get('/api/blocks/?parent_block=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent_block', response.data)
+
+    def test_due_windows_use_caller_timezone(self):
+        tokyo = ZoneInfo('Asia/Tokyo')
+        # 2025-06-30 (Mon) 23:30 in Tokyo is still 2025-06-30 14:30 UTC
+        now = datetime(2025, 6, 30, 23, 30, tzinfo=tokyo)
+        today = self.make(type='task', due_date=datetime(2025, 6, 30, 9, 0, tzinfo=tokyo))
+        tomorrow = self.make(type='task', due_date=datetime(2025, 7, 1, 0, 30, tzinfo=tokyo))
+        later = self.make(type='task', due_date=datetime(2025, 7, 8, 12, 0, tzinfo=tokyo))
+        overdue = self.make(type='task', due_date=now - timedelta(days=3))
+        undated = self.make(type='task')
+
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            self.assertEqual(self.ids('due=today&tz=Asia/Tokyo'), {today.id})
+            self.assertEqual(self.ids('due=tomorrow&tz=Asia/Tokyo'), {tomorrow.id})
+            self.assertEqual(self.ids('due=week&tz=Asia/Tokyo'), {today.id, tomorrow.id})
+            self.assertEqual(self.ids('due=overdue&tz=Asia/Tokyo'), {overdue.id})
+        self.assertEqual(self.ids('due=none'), {undated.id})
+        self.assertEqual(self.ids('due_from=2025-07-01&due_to=2025-07-08&tz=Asia/Tokyo'), {tomorrow.id, later.id})
+
+    def test_tags(self):
+        tagged = self.make()
+        tagged.tags.add(self.tag)
+        self.make()
+
+        self.assertEqual(self.ids(f'tags={self.tag.id}'), {tagged.id})
+        self.assertEqual(self.ids('tag=work'), {tagged.id})
+
+    def test_unknown_timezone_is_rejected(self):
+        response = self.client.get('/api/blocks/?due=today&tz=Mars/Base')
+        self.assertEqual(response.status_code, 400)
+
+
+class KeysetPaginationTests(AuthenticatedTestCase):
+    with_list = False
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_unpaginated_by_default(self):
+        Block.objects.create(user=self.user)
+        response = self.client.get('/api/blocks/')
+        self.assertIsInstance(response.data, list)
+
+    def test_blocks_walk_order_then_id_with_duplicate_orders(self):
+        blocks = [Block.objects.create(user=self.user, order=i // 3) for i in range(10)]
+        expected = [b.id for b in sorted(blocks, key=lambda b: (b.order, b.id))]
+
+        self.assertEqual(self.walk('/api/blocks/?page_size=4'), expected)
+
+    def test_lists_walk_sort_order_then_id(self):
+        lists = [List.objects.create(user=self.user, title=str(i), sort_order=-i % 4) for i in range(7)]
+        expected = [l.id for l in sorted(lists, key=lambda l: (l.sort_order, l.id))]
+
+        self.assertEqual(self.walk('/api/lists/?page_size=2'), expected)
+
+    def test_page_size_is_capped(self):
+        Block.objects.bulk_create(Block(user=self.user, order=i) for i in range(510))
+        response = self.client.get('/api/blocks/?page_size=10000')
+        self.assertEqual(len(response.data['results']), 500)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_limit_cuts_a_plain_read_in_the_requested_ordering(self):
+        utc = ZoneInfo('UTC')
+        blocks = [Block.objects.create(user=self.user, type='task', order=-i, due_date=datetime(2025, 7, 1 + i, tzinfo=utc))
+                  for i in range(5)]
+        response = self.client.get('/api/blocks/?type=task&ordering=due_date&limit=3')
+        self.assertEqual([row['id'] for row in response.data], [b.id for b in blocks[:3]])
+        response = self.client.get('/api/blocks/?ordering=-due_date&limit=2')
+        self.assertEqual([row['id'] for row in response.data], [blocks[4].id, blocks[3].id])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/blocks/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+        for position in [['x', 'y'], [None, None], [{'a': 1}, 2], [1.5, [2]], [1, 2 ** 70], [1, True]]:
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode('ascii')).decode('ascii')
+            response = self.client.get(f'/api/blocks/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404, position)
+
+
+class BlockBulkUpdateTests(AuthenticatedTestCase):
+    def test_reorder_many_blocks_in_few_queries(self):
+        blocks = Block.objects.bulk_create(Block(user=self.user, list=self.list, order=i) for i in range(200))
+        payload = [{'id': block.id, 'order': 200 - i} for i, block in enumerate(blocks)]
+
+        with self.assertNumQueries(5):
+            response = self.client.post('/api/blocks/bulk/', payload, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 200)
+        self.assertEqual(
+            list(Block.objects.filter(user=self.user).values_list('id', flat=True)),
+            [block.id for block in reversed(blocks)],
+        )
+
+    def test_moves_and_updates_fields(self):
+        parent = Block.objects.create(user=self.user, list=self.list)
+        block = Block.objects.create(user=self.user)
+        payload = [{
+            'id': block.id, 'parent_block': parent.id, 'list': self.list.id,
+            'type': 'task-done', 'is_done': True, 'due_date': '2025-07-01T00:00:00Z',
+        }]
+
+        response = self.client.post('/api/blocks/bulk/', payload, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['parent_block'], parent.id)
+        block.refresh_from_db()
+        self.assertEqual((block.parent_block_id, block.list_id, block.type, block.is_done),
+                         (parent.id, self.list.id, 'task-done', True))
+
+    def test_rejects_foreign_rows(self):
+        other = User.objects.create_user(email='other@example.com', password='pass')
+        foreign = Block.objects.create(user=other)
+        mine = Block.objects.create(user=self.user, order=1)
+
+        for payload in ([{'id': foreign.id, 'order': 5}],
+                        [{'id': mine.id, 'parent_block': foreign.id}],
+                        [{'id': mine.id, 'parent_block': mine.id}]):
+            response = self.client.post('/api/blocks/bulk/', payload, format='json')
+            self.assertEqual(response.status_code, 400)
+
+        mine.refresh_from_db()
+        self.assertEqual((mine.order, mine.parent_block_id), (1, None))
+
+
+class BlockOrderingTests(AuthenticatedTestCase):
+    def sequence(self):
+        return list(Block.objects.filter(user=self.user, list=self.list).order_by('order', 'id')
+                    .values_list('html', flat=True))
+
+    def test_repeated_inserts_at_same_position_stay_ordered(self):
+        first = Block.objects.create(user=self.user, list=self.list, html='first', order=1)
+        Block.objects.create(user=self.user, list=self.list, html='last', order=2)
+
+        # Each insert goes right after "first", so the newest ends up closest to it.
+        for i in range(200):
+            response = self.client.post('/api/blocks/', {
+                'html': str(i), 'list': self.list.id, 'after': first.id,
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.sequence(), ['first'] + [str(i) for i in reversed(range(200))] + ['last'])
+        orders = list(Block.objects.filter(list=self.list).order_by('order').values_list('order', flat=True))
+        self.assertEqual(len(set(orders)), len(orders))
+
+    def test_move_after_sibling_and_to_front(self):
+        a, b, c = (Block.objects.create(user=self.user, list=self.list, html=h, order=i)
+                   for i, h in enumerate('abc'))
+
+        response = self.client.post(f'/api/blocks/{a.id}/move/', {'after': c.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.sequence(), ['b', 'c', 'a'])
+
+        self.client.post(f'/api/blocks/{a.id}/move/', {'after': None}, format='json')
+        self.assertEqual(self.sequence(), ['a', 'b', 'c'])
+
+    def test_move_rejects_non_sibling_anchor(self):
+        parent = Block.objects.create(user=self.user, list=self.list, order=1)
+        child = Block.objects.create(user=self.user, parent_block=parent, order=1)
+        block = Block.objects.create(user=self.user, list=self.list, order=2)
+
+        response = self.client.post(f'/api/blocks/{block.id}/move/', {'after': child.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_places_the_block_after_the_anchor(self):
+        a, b, c = (Block.objects.create(user=self.user, list=self.list, html=h, order=i)
+                   for i, h in enumerate('abc'))
+
+        response = self.client.patch(f'/api/blocks/{a.id}/', {'html': 'a2', 'after': b.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.sequence(), ['b', 'a2', 'c'])
+        self.client.patch(f'/api/blocks/{c.id}/', {'after': None}, format='json')
+        self.assertEqual(self.sequence(), ['c', 'b', 'a2'])
+
+        self.assertEqual(self.client.patch(f'/api/blocks/{a.id}/', {'after': a.id}, format='json').status_code, 400)
+        other = Block.objects.create(user=self.user, parent_block=b, order=1)
+        self.assertEqual(self.client.patch(f'/api/blocks/{a.id}/', {'after': other.id}, format='json').status_code, 400)
+
+    def test_renormalize_command_fixes_collisions(self):
+        for h in 'abc':
+            Block.objects.create(user=self.user, list=self.list, html=h, order=5)
+        Block.objects.create(user=self.user, html='ok', order=1)
+
+        out = StringIO()
+        call_command('renormalize_block_orders', stdout=out)
+
+        self.assertIn('Renumbered 1 of 2', out.getvalue())
+        self.assertEqual(
+            list(Block.objects.filter(list=self.list).order_by('id').values_list('order', flat=True)),
+            [1024.0, 2048.0, 3072.0],
+        )
+
+
+class BlockAppendOrderTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='append@example.com', password='pass')
+        self.list = List.objects.create(user=self.user, title='List')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_append_is_scoped_to_sibling_group(self):
+        client = self.client_for(self.user)
+        Block.objects.create(user=self.user, order=10_000)  # another group
+        Block.objects.create(user=self.user, list=self.list, order=3)
+
+        response = client.post('/api/blocks/', {'html': 'x', 'list': self.list.id}, format='json')
+
+        self.assertEqual(response.data['order'], 3 + 1024)
+        response = client.post('/api/blocks/', {'html': 'y', 'list': self.list.id}, format='json')
+        self.assertEqual(response.data['order'], 3 + 2048)
+        response = client.post('/api/blocks/', {'html': 'z'}, format='json')
+        self.assertEqual(response.data['order'], 10_000 + 1024)
+
+    def test_parallel_creates_get_distinct_orders(self):
+        workers, per_worker = 8, 3
+        barrier = Barrier(workers)
+        statuses = []
+
+        def create():
+            client = self.client_for(self.user)
+            try:
+                barrier.wait()
+                for i in range(per_worker):
+                    response = client.post('/api/blocks/', {'html': str(i), 'list': self.list.id}, format='json')
+                    statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=create) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [201] * workers * per_worker)
+        orders = list(Block.objects.filter(list=self.list).values_list('order', flat=True))
+        self.assertEqual(len(orders), workers * per_worker)
+        self.assertEqual(len(set(orders)), len(orders))
+
+
+class SQLiteTuningTests(TestCase):
+    def test_connections_apply_the_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite profile only')
+        values = {}
+        with connection.cursor() as cursor:
+            for pragma in ('journal_mode', 'synchronous', 'temp_store'):
+                cursor.execute(f'PRAGMA {pragma}')
+                values[pragma] = cursor.fetchone()[0]
+        # synchronous=NORMAL is 1, temp_store=MEMORY is 2.
+        self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1, 'temp_store': 2})
+
+
+class ConditionalReadTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.block = Block.objects.create(user=self.user, list=self.list)
+
+    def test_unchanged_reads_get_304_without_serializing(self):
+        # The sidebar payloads are cached whole, so revalidating them is free.
+        for url, queries in (('/api/lists/', 0), ('/api/blocks/', 1), (f'/api/blocks/{self.block.id}/', 1),
+                             ('/api/folders/', 0), ('/api/tags/', 1)):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get('/api/lists/')['ETag']
+        List.objects.create(user=self.user, title='Other')
+        self.assertNotEqual(self.client.get('/api/lists/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        tag = Tag.objects.create(user=self.user, name='t')
+
+        for write in (
+            lambda: self.client.patch(f'/api/lists/{self.list.id}/', {'title': 'New'}, format='json'),
+            lambda: self.client.post('/api/folders/', {'title': 'F'}, format='json'),
+            lambda: self.block.tags.add(tag),
+            lambda: self.client.post('/api/blocks/bulk/', [{'id': self.block.id, 'order': 9}], format='json'),
+            lambda: self.client.delete(f'/api/blocks/{self.block.id}/'),
+        ):
+            etag = self.client.get('/api/blocks/')['ETag']
+            write()
+            response = self.client.get('/api/blocks/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+    def test_versions_are_per_user(self):
+        other = User.objects.create_user(email='other-etag@example.com', password='pass')
+        etag = self.client.get('/api/blocks/')['ETag']
+        Block.objects.create(user=other)
+        self.assertEqual(self.client.get('/api/blocks/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_relative_due_windows_expire_at_local_midnight(self):
+        tokyo = ZoneInfo('Asia/Tokyo')
+        evening = datetime(2025, 6, 30, 23, 30, tzinfo=tokyo)
+        Block.objects.create(user=self.user, type='task', due_date=evening)
+        url = '/api/blocks/?type=task&due=today&tz=Asia/Tokyo'
+
+        with mock.patch('django.utils.timezone.now', return_value=evening):
+            response = self.client.get(url)
+            self.assertEqual(len(response.data), 1)
+            etag = response['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            plain_etag = self.client.get('/api/blocks/')['ETag']
+        with mock.patch('django.utils.timezone.now', return_value=evening + timedelta(hours=1)):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, [])
+            # Reads that do not depend on the date still revalidate across midnight.
+            self.assertEqual(self.client.get('/api/blocks/', HTTP_IF_NONE_MATCH=plain_etag).status_code, 304)
+
+
+class SyncTests(AuthenticatedTestCase):
+    with_list = False
+
+    def sync(self, cursor=None):
+        response = self.client.get('/api/sync/', {'since': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_snapshot_then_incremental_changes(self):
+        # Created well before the snapshot, outside the cursor overlap window.
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(minutes=1)):
+            folder = Folder.objects.create(user=self.user, title='F')
+            list_obj = List.objects.create(user=self.user, title='L', folder=folder)
+            kept = Block.objects.create(user=self.user, list=list_obj)
+            doomed = Block.objects.create(user=self.user, list=list_obj)
+            tag = Tag.objects.create(user=self.user, name='t')
+
+        snapshot = self.sync()
+        self.assertEqual({b['id'] for b in snapshot['blocks']}, {kept.id, doomed.id})
+        self.assertEqual(snapshot['deleted'], [])
+
+        doomed_id, folder_id = doomed.id, folder.id
+        later = timezone.now() + timedelta(minutes=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            kept.tags.add(tag)
+            doomed.delete()
+            folder.delete()
+
+        with mock.patch('django.utils.timezone.now', return_value=later + timedelta(seconds=10)):
+            changes = self.sync(snapshot['cursor'])
+        self.assertEqual([b['id'] for b in changes['blocks']], [kept.id])
+        self.assertEqual(changes['blocks'][0]['tags'], [tag.id])
+        self.assertEqual([l['id'] for l in changes['lists']], [list_obj.id])
+        self.assertIsNone(changes['lists'][0]['folder'])
+        self.assertEqual(changes['tags'], [])
+        self.assertCountEqual(changes['deleted'], [{'type': 'block', 'id': doomed_id},
+                                                   {'type': 'folder', 'id': folder_id}])
+
+        with mock.patch('django.utils.timezone.now', return_value=later + timedelta(minutes=1)):
+            quiet = self.sync(changes['cursor'])
+        self.assertEqual((quiet['blocks'], quiet['deleted']), ([], []))
+
+    def test_rebalanced_siblings_are_reported(self):
+        a = Block.objects.create(user=self.user, order=1)
+        Block.objects.create(user=self.user, order=1)
+        cursor = self.sync()['cursor']
+
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(minutes=1)):
+            self.client.post('/api/blocks/', {'html': 'x', 'after': a.id}, format='json')
+
+        self.assertEqual(len(self.sync(cursor)['blocks']), 3)
+
+    def test_expired_and_invalid_cursors(self):
+        self.assertEqual(self.client.get('/api/sync/', {'since': '1'}).status_code, 410)
+        self.assertEqual(self.client.get('/api/sync/', {'since': 'abc'}).status_code, 400)
+
+    def test_deleting_user_leaves_no_tombstones(self):
+        Block.objects.create(user=self.user)
+        self.user.delete()
+        other = User.objects.create_user(email='gone@example.com', password='pass')
+        List.objects.create(user=other, title='List')
+        User.objects.filter(id=other.id).delete()
+        self.assertFalse(Tombstone.objects.exists())
+
+
+class RealtimeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='live@example.com', password='pass')
+        self.token = Token.objects.create(user=self.user)
+
+    def connect(self, token):
+        return ApplicationCommunicator(websocket_application, {
+            'type': 'websocket', 'path': '/ws/changes/', 'query_string': f'token={token}'.encode(),
+        })
+
+    async def test_rejects_unknown_token(self):
+        socket = self.connect('nope')
+        await socket.send_input({'type': 'websocket.connect'})
+        self.assertEqual(await socket.receive_output(1), {'type': 'websocket.close', 'code': 4401})
+
+    async def test_rejects_expired_token(self):
+        socket = self.connect(self.token.key)
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=31)):
+            await socket.send_input({'type': 'websocket.connect'})
+            self.assertEqual(await socket.receive_output(1), {'type': 'websocket.close', 'code': 4401})
+
+    async def test_streams_committed_changes_to_owner_only(self):
+        socket = self.connect(self.token.key)
+        await socket.send_input({'type': 'websocket.connect'})
+        self.assertEqual(await socket.receive_output(1), {'type': 'websocket.accept'})
+
+        def write():
+            other = User.objects.create_user(email='other@example.com', password='pass')
+            with self.captureOnCommitCallbacks(execute=True):
+                Block.objects.create(user=other)
+                return Block.objects.create(user=self.user).pk
+
+        block_id = await sync_to_async(write)()
+        message = await socket.receive_output(1)
+        self.assertEqual(json.loads(message['text']), {'type': 'block', 'op': 'create', 'ids': [block_id]})
+        self.assertTrue(await socket.receive_nothing())
+
+        await socket.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await socket.wait(1)
+
+    async def test_closes_once_the_token_is_revoked(self):
+        socket = self.connect(self.token.key)
+        await socket.send_input({'type': 'websocket.connect'})
+        self.assertEqual(await socket.receive_output(1), {'type': 'websocket.accept'})
+
+        def logout_and_write():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.token.delete()
+                Block.objects.create(user=self.user)
+
+        await sync_to_async(logout_and_write)()
+        self.assertEqual(await socket.receive_output(1), {'type': 'websocket.close', 'code': 4401})
+        await socket.send_input({'type': 'websocket.disconnect', 'code': 4401})
+        await socket.wait(1)
+
+    @override_settings(REALTIME_TOKEN_CHECK_SECONDS=0.05)
+    async def test_idle_socket_closes_when_the_token_expires(self):
+        socket = self.connect(self.token.key)
+        await socket.send_input({'type': 'websocket.connect'})
+        self.assertEqual(await socket.receive_output(1), {'type': 'websocket.accept'})
+        self.assertTrue(await socket.receive_nothing(0.2))
+
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=31)):
+            self.assertEqual(await socket.receive_output(1), {'type': 'websocket.close', 'code': 4401})
+        await socket.send_input({'type': 'websocket.disconnect', 'code': 4401})
+        await socket.wait(1)
+
+    def test_slow_subscriber_is_told_to_resync(self):
+        async def overflow():
+            broker = InMemoryBroker()
+            subscription = broker.subscribe(self.user.pk)
+            subscription.queue = asyncio.Queue(maxsize=2)
+            for i in range(3):
+                broker.publish(self.user.pk, {'type': 'block', 'op': 'update', 'ids': [i]})
+            await asyncio.sleep(0)
+            return await subscription.get(), subscription.queue.empty()
+
+        self.assertEqual(asyncio.run(overflow()), (RESYNC_EVENT, True))
+
+
+class BlockSearchTests(AuthenticatedTestCase):
+    with_list = False
+
+    def search(self, q):
+        response = self.client.get('/api/blocks/search/', {'q': q})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_ranked_prefix_search_with_snippets(self):
+        weak = Block.objects.create(user=self.user, html='<p>Budget</p> for the <b>offsite</b> &amp; travel plans')
+        strong = Block.objects.create(user=self.user, html='<p>budget budget review</p>')
+        Block.objects.create(user=self.user, html='<p>unrelated</p>')
+        other = User.objects.create_user(email='other@example.com', password='pass')
+        Block.objects.create(user=other, html='budget')
+
+        self.assertEqual(block_text(weak.html), 'Budget for the offsite & travel plans')
+        results = self.search('budg')
+        self.assertEqual([r['id'] for r in results], [strong.id, weak.id])
+        self.assertIn('<mark>budget</mark>', results[0]['snippet'])
+
+        self.assertEqual([r['id'] for r in self.search('budget travel')], [weak.id])
+        self.assertIn('&amp;', self.search('travel')[0]['snippet'])
+        self.assertEqual(self.search('"OR budget NEAR('), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        block = Block.objects.create(user=self.user, html='draft')
+        block.html = 'final version'
+        block.save()
+        self.assertEqual(self.search('draft'), [])
+        self.assertEqual([r['id'] for r in self.search('final')], [block.id])
+
+        block.delete()
+        self.assertEqual(self.search('final'), [])
+
+    def test_fallback_search_and_rebuild(self):
+        block = Block.objects.create(user=self.user, html='<p>Quarterly <i>report</i></p>')
+        Block.objects.filter(pk=block.pk).update(html='<p>Annual report</p>')
+        BlockSearchDocument.objects.all().delete()
+        self.assertEqual(self.search('annual'), [])
+
+        call_command('rebuild_block_search', '--stale', stdout=mock.MagicMock())
+        self.assertEqual([r['id'] for r in self.search('annual')], [block.id])
+
+        with mock.patch('api.search.use_fts', return_value=False):
+            results = self.search('REPORT')
+        self.assertEqual(results[0]['snippet'], 'Annual <mark>report</mark>')
+
+        call_command('rebuild_block_search', stdout=mock.MagicMock())
+        self.assertEqual([r['id'] for r in self.search('annual report')], [block.id])
+
+
+class SidebarPayloadCacheTests(AuthenticatedTestCase):
+    with_list = False
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        folders = [Folder.objects.create(user=self.user, title=f'F{i}') for i in range(3)]
+        for i in range(6):
+            List.objects.create(user=self.user, title=f'L{i}', folder=folders[i % 3])
+
+    def test_lists_are_not_n_plus_one(self):
+        ChangeVersion.objects.create(user=self.user)
+        # The ETag version, then one query for the lists with their folders joined.
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.client.get('/api/lists/', {'search': 'L'}).data), 6)
+
+    def test_warm_reads_skip_the_database(self):
+        first = self.client.get('/api/lists/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/lists/')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_list_and_folder_writes_invalidate(self):
+        self.client.get('/api/lists/')
+        self.client.get('/api/folders/')
+        list_obj = List.objects.first()
+
+        self.client.patch(f'/api/lists/{list_obj.id}/', {'title': 'Renamed'}, format='json')
+        titles = {l['id']: l['title'] for l in self.client.get('/api/lists/').data}
+        self.assertEqual(titles[list_obj.id], 'Renamed')
+
+        list_obj.folder.title = 'Moved'
+        list_obj.folder.save()
+        lists = {l['id']: l for l in self.client.get('/api/lists/').data}
+        self.assertEqual(lists[list_obj.id]['folder']['title'], 'Moved')
+        self.assertIn('Moved', [f['title'] for f in self.client.get('/api/folders/').data])
+
+        list_obj.folder.delete()
+        self.assertIsNone({l['id']: l for l in self.client.get('/api/lists/').data}[list_obj.id]['folder'])
+        self.assertEqual(len(self.client.get('/api/folders/').data), 2)
+
+        Block.objects.create(user=self.user, list=list_obj)
+        with self.assertNumQueries(0):
+            self.client.get('/api/lists/')
+
+
+class AgendaTests(AuthenticatedTestCase):
+    with_list = False
+
+    def setUp(self):
+        super().setUp()
+        tokyo = ZoneInfo('Asia/Tokyo')
+        self.now = datetime(2026, 3, 10, 12, 0, tzinfo=tokyo)
+        patcher = mock.patch('django.utils.timezone.now', return_value=self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        def task(day, hour, **kwargs):
+            return Block.objects.create(
+                user=self.user, type=kwargs.pop('type', 'task'), html='<p>task</p>',
+                due_date=datetime(2026, 3, day, hour, tzinfo=tokyo), **kwargs)
+
+        self.overdue = task(9, 9)
+        self.done = task(10, 8, type='task-done')
+        self.pending = task(10, 18)
+        self.late_night = task(11, 0, is_done=True)  # 10th in UTC, 11th in Tokyo
+        task(20, 9)
+        Block.objects.create(user=self.user, type='note', is_pinned=True)
+
+    def test_days_are_bucketed_in_the_callers_timezone(self):
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/agenda/', {'from': '2026-03-09', 'to': '2026-03-11', 'tz': 'Asia/Tokyo'}).data
+        self.assertEqual(data['counts'], {'done': 2, 'pending': 1, 'overdue': 1})
+        days = {str(day['date']): day for day in data['days']}
+        self.assertEqual(list(days), ['2026-03-09', '2026-03-10', '2026-03-11'])
+        self.assertEqual([t['id'] for t in days['2026-03-10']['tasks']], [self.done.id, self.pending.id])
+        self.assertEqual(days['2026-03-10']['counts'], {'done': 1, 'pending': 1, 'overdue': 0})
+        self.assertNotIn('html', days['2026-03-09']['tasks'][0])
+        self.assertNotIn('child_blocks', days['2026-03-09']['tasks'][0])
+
+        utc = self.client.get('/api/agenda/', {'from': '2026-03-10', 'to': '2026-03-10', 'tz': 'UTC'}).data
+        self.assertEqual([t['id'] for t in utc['days'][0]['tasks']], [self.pending.id, self.late_night.id])
+
+    def test_html_on_request_and_validation(self):
+        data = self.client.get('/api/agenda/', {'from': '2026-03-09', 'to': '2026-03-09', 'include': 'html'}).data
+        self.assertEqual(data['days'][0]['tasks'][0]['html'], '<p>task</p>')
+        self.assertEqual(self.client.get('/api/agenda/', {'from': '2026-03-09', 'to': '2026-03-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/agenda/', {'from': '2026-01-01', 'to': '2027-06-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/agenda/', {'tz': 'Mars/Base'}).status_code, 400)
+
+    def test_stats_come_from_one_query(self):
+        with self.assertNumQueries(1):
+            stats = self.client.get('/api/agenda/stats/', {'tz': 'Asia/Tokyo'}).data
+        self.assertEqual(stats, {
+            'notes': 1, 'pinned': 1, 'tasks': 5, 'completed': 2, 'pending': 3, 'overdue': 1,
+            'upcoming': 2, 'due_today': 2, 'due_tomorrow': 1, 'due_this_week': 4,
+        })
+
+
+class RequestMetricsTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def test_server_timing_and_log_record(self):
+        with override_settings(REQUEST_METRICS={'SERVER_TIMING': True}), \
+                self.assertLogs('api.requests', 'INFO') as logs:
+            response = self.client.get('/api/lists/')
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual((record['view'], record['status'], record['duplicate_queries']), ('list-list', 200, 0))
+        self.assertEqual(record['response_bytes'], len(response.content))
+        self.assertGreater(record['queries'], 0)
+
+    def test_server_timing_is_off_by_default_outside_debug(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/lists/'))
+        with override_settings(DEBUG=True):
+            self.assertIn('Server-Timing', self.client.get('/api/lists/'))
+
+    def test_repeated_statements_are_flagged(self):
+        blocks = [Block.objects.create(user=self.user, list=self.list) for _ in range(3)]
+        original = BlockSerializer.to_representation
+
+        def naive(serializer, block):
+            # A per-row query, the pattern the old get_child_blocks had.
+            list(Block.objects.filter(parent_block=block))
+            return original(serializer, block)
+
+        with override_settings(REQUEST_METRICS={'SERVER_TIMING': True, 'DUPLICATE_THRESHOLD': 3}), \
+                mock.patch.object(BlockSerializer, 'to_representation', naive), \
+                self.assertLogs('api.requests', 'WARNING') as logs:
+            response = self.client.get('/api/blocks/', {'list_id': self.list.id})
+        self.assertEqual(len(response.data), len(blocks))
+        self.assertIn('dup;desc="2 duplicated queries"', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['duplicate_queries'], 2)
+        self.assertIn('parent_block_id', record['duplicated_statement'])
+
+    def test_prometheus_endpoint(self):
+        self.client.get('/api/lists/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+        with override_settings(REQUEST_METRICS={'ENDPOINT': True}):
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+        with override_settings(REQUEST_METRICS={'ENDPOINT': True, 'TOKEN': 'secret'}):
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+            body = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_count{view="list-list",method="GET",status="2xx"} 1', body)
+        self.assertIn('http_request_db_queries_total{view="list-list",method="GET",status="2xx"}', body)
+
+
+class BlockImportTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tags = [Tag.objects.create(user=self.user, name=f'tag{i}') for i in range(2)]
+
+    def tree(self, parent=None):
+        return [
+            (block.html, block.type, block.list_id, tree)
+            for block in Block.objects.filter(user=self.user, parent_block=parent).order_by('order')
+            for tree in [self.tree(block)]
+        ]
+
+    def test_markdown_outline(self):
+        markdown = '# Plan\n- [ ] Book <flights>\n    - [x] Compare prices\n  1. Ask Kim\n\n> Quote\nPlain'
+        response = self.client.post('/api/blocks/import/', {'list': self.list.id, 'markdown': markdown}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(self.tree(), [
+            ('Plan', 'heading1', self.list.id, []),
+            ('Book &lt;flights&gt;', 'task', self.list.id, [
+                ('Compare prices', 'task-done', None, []),
+                ('Ask Kim', 'numbered', None, []),
+            ]),
+            ('Quote', 'quote', self.list.id, []),
+            ('Plain', 'text', self.list.id, []),
+        ])
+        self.assertTrue(Block.objects.get(html='Compare prices').is_done)
+        self.assertEqual([block.html for block, _ in search_blocks(self.user, 'prices', 10)], ['Compare prices'])
+
+    def test_html_paste(self):
+        html = ('<h2>Trip</h2><ul><li><p>Pack</p><ul><li><input type="checkbox" checked>Socks</li></ul></li>'
+                '<li>Go</li></ul><p>Done<br>today</p><script>x()</script>')
+        self.client.post('/api/blocks/import/', {'list': self.list.id, 'html': html}, format='json')
+        self.assertEqual(self.tree(), [
+            ('Trip', 'heading2', self.list.id, []),
+            ('Pack', 'bullet', self.list.id, [('Socks', 'task-done', None, [])]),
+            ('Go', 'bullet', self.list.id, []),
+            ('Done today', 'text', self.list.id, []),
+        ])
+
+    def test_deeply_nested_html_paste(self):
+        depth = 5000
+        # The empty paragraph at the bottom is pruned 5000 levels down.
+        roots = parse_html('<ul><li>item' * depth + '<p></p>' + '</li></ul>' * depth)
+        flat = flatten_nodes(roots)
+        self.assertEqual(len(flat), depth)
+        self.assertEqual(flat[-1][0], {'html': 'item', 'type': 'bullet', 'is_done': False, 'children': []})
+
+    def test_nested_blocks_after_anchor_in_few_queries(self):
+        first = Block.objects.create(user=self.user, list=self.list, order=1024)
+        last = Block.objects.create(user=self.user, list=self.list, order=2048)
+        tag_ids = [tag.id for tag in self.tags]
+        blocks = [
+            {'html': f'root {i}', 'tag_ids': tag_ids, 'children': [
+                {'html': f'child {i}.{j}', 'type': 'task', 'children': [{'html': 'leaf', 'tag_ids': tag_ids[:1]}]}
+                for j in range(20)
+            ]}
+            for i in range(10)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/blocks/import/', {
+                'list': self.list.id, 'after': first.id, 'blocks': blocks,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 10 + 200 + 200)
+        # Checks, orders, a few inserts and one path update per level (SQLite caps rows per INSERT),
+        # tag links, search, version.
+        self.assertLess(len(queries), 23)
+
+        roots = list(Block.objects.filter(user=self.user, parent_block=None).order_by('order'))
+        self.assertEqual([b.id for b in roots[:1] + roots[-1:]], [first.id, last.id])
+        self.assertEqual([b.html for b in roots[1:-1]], [f'root {i}' for i in range(10)])
+        self.assertEqual(Block.tags.through.objects.filter(tag=self.tags[0]).count(), 10 + 200)
+        child = roots[1].child_blocks.order_by('order')[0]
+        self.assertEqual([row['id'] for row in response.data[:3]], [roots[1].id, child.id, child.child_blocks.get().id])
+
+    def test_validation(self):
+        post = lambda body: self.client.post('/api/blocks/import/', {'list': self.list.id, **body}, format='json')
+        self.assertEqual(post({'markdown': 'a', 'html': '<p>b</p>'}).status_code, 400)
+        self.assertEqual(post({'blocks': [{'html': 'a', 'children': 'nope'}]}).status_code, 400)
+        self.assertIn(1, post({'blocks': [{'html': 'a'}, {'is_done': 'maybe'}]}).data['blocks'])
+        self.assertEqual(post({'blocks': [{'tag_ids': [0]}]}).status_code, 400)
+        self.assertEqual(post({'markdown': 'a', 'after': 0}).status_code, 400)
+        other = User.objects.create_user(email='other@example.com', password='pass')
+        self.client.force_authenticate(other)
+        self.assertEqual(post({'markdown': 'a'}).data['list'], 'Unknown list.')
+        self.assertFalse(Block.objects.exists())
+
+
+class BlockHierarchyTests(AuthenticatedTestCase):
+    def chain(self, length, parent=None):
+        blocks = []
+        for i in range(length):
+            parent = Block.objects.create(user=self.user, list=self.list, parent_block=parent, html=f'level {i}')
+            blocks.append(parent)
+        return blocks
+
+    def assert_paths_consistent(self):
+        for block in Block.objects.filter(user=self.user):
+            parent_path = block.parent_block.path if block.parent_block_id else ''
+            self.assertEqual(block.path, parent_path + path_segment(block.id))
+
+    def test_paths_follow_creates_and_moves(self):
+        a, b, c = self.chain(3)
+        other = self.chain(2)[-1]
+        self.assertEqual(depth(Block.objects.get(id=c.id).path), 2)
+
+        response = self.client.post(f'/api/blocks/{b.id}/move/', {'parent_block': other.id, 'after': None}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(depth(Block.objects.get(id=c.id).path), 3)
+        self.client.patch(f'/api/blocks/{b.id}/', {'parent_block': a.id}, format='json')
+        self.client.post('/api/blocks/bulk/', [{'id': c.id, 'parent_block': None}], format='json')
+        self.client.post('/api/blocks/import/', {'parent_block': c.id, 'markdown': '- x\n  - y'}, format='json')
+        self.assert_paths_consistent()
+        self.assertEqual(Block.objects.filter(subtree_q(Block.objects.get(id=c.id).path)).count(), 3)
+
+    def test_rejects_moves_into_own_subtree(self):
+        a, b, c = self.chain(3)
+        other = Block.objects.create(user=self.user, list=self.list)
+        responses = [
+            self.client.post(f'/api/blocks/{a.id}/move/', {'parent_block': c.id, 'after': None}, format='json'),
+            self.client.post(f'/api/blocks/{a.id}/move/', {'parent_block': a.id, 'after': None}, format='json'),
+            self.client.patch(f'/api/blocks/{b.id}/', {'parent_block': c.id}, format='json'),
+            # Each move is fine on its own; together they make a cycle.
+            self.client.post('/api/blocks/bulk/', [
+                {'id': a.id, 'parent_block': other.id}, {'id': other.id, 'parent_block': c.id},
+            ], format='json'),
+        ]
+        self.assertEqual([response.status_code for response in responses], [400] * 4)
+        self.assertEqual(
+            list(Block.objects.order_by('id').values_list('parent_block_id', flat=True)), [None, a.id, b.id, None])
+        self.assert_paths_consistent()
+
+    def test_deep_subtree_reads_do_not_grow_with_depth(self):
+        def retrieve(root):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(f'/api/blocks/{root.id}/')
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries), response.data
+
+        root = self.chain(3)[0]
+        retrieve(root)  # the first request also sets up the change version
+        shallow, _ = retrieve(root)
+        deep, data = retrieve(self.chain(60)[0])
+        self.assertEqual(shallow, deep)
+        for _ in range(59):
+            data = data['child_blocks'][0]
+        self.assertEqual((data['html'], data['child_blocks']), ('level 59', []))
+
+        data = self.client.get(f'/api/blocks/{self.chain(5)[0].id}/?depth=2').data
+        self.assertEqual(data['child_blocks'][0]['child_blocks'][0]['child_blocks'], [])
+
+    def test_delete_removes_subtree_in_bulk(self):
+        tag = Tag.objects.create(user=self.user, name='tag')
+        root = Block.objects.create(user=self.user, list=self.list)
+        keep = Block.objects.create(user=self.user, list=self.list, html='keep')
+        children = self.chain(30, parent=root) + [
+            Block.objects.create(user=self.user, parent_block=root, html=f'wide {i}') for i in range(30)
+        ]
+        children[-1].tags.add(tag)
+        ids = {root.id} | {block.id for block in children}
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.delete(f'/api/blocks/{root.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertLess(len(ctx.captured_queries), 15)
+        self.assertEqual(list(Block.objects.values_list('id', flat=True)), [keep.id])
+        self.assertFalse(Block.tags.through.objects.exists())
+        self.assertEqual(set(Tombstone.objects.filter(kind='block').values_list('object_id', flat=True)), ids)
+        self.assertEqual(search_blocks(self.user, 'wide', 10), [])
+
+
+class WorkspaceExportImportTests(AuthenticatedTestCase):
+    with_list = False
+
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(email='import@example.com', password='pass')
+
+        folder = Folder.objects.create(user=self.user, title='Folder')
+        self.lists = [List.objects.create(user=self.user, title='Inbox', folder=folder, sort_order=1),
+                      List.objects.create(user=self.user, title='Loose', sort_order=2)]
+        tags = [Tag.objects.create(user=self.user, name=f'tag{i}') for i in range(2)]
+        for list_obj in self.lists:
+            create_tree(self.user, list_obj, tags, roots=2, children=2, depth=3)
+        Block.objects.filter(user=self.user, parent_block=None).update(due_date='2025-07-01T09:00:00Z', is_done=True)
+
+    def export(self):
+        response = self.client.get('/api/workspace/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return b''.join(response.streaming_content)
+
+    def snapshot(self, user):
+        def tree(parent):
+            return [
+                (block.html, block.type, block.order, block.list and block.list.title, block.due_date, block.is_done,
+                 sorted(tag.name for tag in block.tags.all()), tree(block))
+                for block in Block.objects.filter(user=user, parent_block=parent).order_by('list__title', 'order', 'html')
+            ]
+        lists = sorted(List.objects.filter(user=user).values_list('title', 'folder__title', 'sort_order'))
+        return lists, sorted(Tag.objects.filter(user=user).values_list('name', flat=True)), tree(None)
+
+    def test_round_trip(self):
+        body = self.export()
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual((lines[0]['kind'], lines[0]['version']), ('header', 1))
+        seen = set()
+        for row in lines:
+            if row['kind'] == 'block':
+                self.assertTrue(row['parent_block'] is None or row['parent_block'] in seen)
+                seen.add(row['id'])
+        self.assertEqual(len(seen), Block.objects.filter(user=self.user).count())
+
+        self.client.force_authenticate(self.other)
+        response = self.client.post('/api/workspace/import/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], {'tag': 2, 'folder': 1, 'list': 2, 'block': 28})
+        self.assertEqual(self.snapshot(self.other), self.snapshot(self.user))
+        self.assertEqual(search_blocks(self.other, 'block', 100)[0][0].user, self.other)
+        for block in Block.objects.filter(user=self.other):
+            self.assertEqual(block.path, (block.parent_block.path if block.parent_block else '') + path_segment(block.id))
+
+    def test_small_chunks_and_batches(self):
+        body = self.export()
+        rows = lambda data: data.splitlines()[1:]
+        self.assertEqual(rows(b''.join(export_chunks(self.user, chunk_size=3))), rows(body))
+
+        counts = import_workspace(self.other, body.splitlines(keepends=True), batch_size=2)
+        self.assertEqual(counts['block'], 28)
+        self.assertEqual(self.snapshot(self.other), self.snapshot(self.user))
+
+    def test_blocks_without_a_path_are_exported_once(self):
+        unfilled = Block.objects.bulk_create(Block(user=self.user, list=self.lists[1]) for _ in range(7))
+        ids = [json.loads(line)['id'] for line in b''.join(export_chunks(self.user, chunk_size=3)).splitlines()
+               if b'"kind":"block"' in line]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), set(Block.objects.filter(user=self.user).values_list('id', flat=True)))
+        self.assertTrue({block.id for block in unfilled} <= set(ids))
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+        response = await self.async_client.get('/api/workspace/export/', headers={'Authorization': f'Token {token.key}'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        expected = await sync_to_async(lambda: b''.join(export_chunks(self.user)))()
+        self.assertEqual(body.splitlines()[1:], expected.splitlines()[1:])
+
+    def test_errors_name_the_line_and_roll_back(self):
+        self.client.force_authenticate(self.other)
+        header = json.dumps({'kind': 'header', 'format': 'flist-workspace', 'version': 1})
+        post = lambda *lines: self.client.post(
+            '/api/workspace/import/', '\n'.join(lines), content_type='application/x-ndjson')
+
+        self.assertEqual(post('{"kind": "tag", "id": 1, "name": "x"}').data['line'], 1)
+        response = post(header, '{"kind": "tag", "id": 1, "name": "x"}', '',
+                        '{"kind": "block", "id": 5, "parent_block": 4}')
+        self.assertEqual((response.status_code, response.data['line']), (400, 4))
+        self.assertEqual(post(header, '{"kind": "list", "id": 1}').data['line'], 2)
+        self.assertEqual(post(header, 'not json').data['line'], 2)
+        self.assertFalse(Tag.objects.filter(user=self.other).exists())
+
+    def test_failed_import_deletes_the_batches_it_committed(self):
+        lines = self.export().splitlines(keepends=True)
+        lines.append(b'{"kind": "block", "id": 999999, "parent_block": 888888}\n')
+        with self.assertRaises(WorkspaceImportError) as error:
+            import_workspace(self.other, lines, batch_size=2)
+
+        self.assertEqual(error.exception.line, len(lines))
+        for model in (Block, List, Folder, Tag):
+            self.assertFalse(model.objects.filter(user=self.other).exists())
+        self.assertEqual(Tombstone.objects.filter(user=self.other, kind='block').count(), 28)
+        self.assertEqual(Block.objects.filter(user=self.user).count(), 28)
+
+
+class BlockArchiveTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tag = Tag.objects.create(user=self.user, name='tag')
+
+    def block(self, parent=None, age=0, **fields):
+        block = Block.objects.create(user=self.user, list=self.list, parent_block=parent, **fields)
+        Block.objects.filter(id=block.id).update(updated_at=timezone.now() - timedelta(days=age))
+        return block
+
+    def assert_paths_consistent(self):
+        for block in Block.objects.filter(user=self.user):
+            self.assertEqual(block.path, (block.parent_block.path if block.parent_block else '') + path_segment(block.id))
+
+    def test_archives_old_done_subtrees_and_restores_them(self):
+        done = self.block(age=120, type='task-done', html='<p>shipped</p>')
+        child = self.block(done, age=120, is_done=True, html='<p>shipped part</p>')
+        child.tags.add(self.tag)
+        Block.objects.filter(id=child.id).update(updated_at=Block.objects.get(id=done.id).updated_at)
+        open_task = self.block(age=120, type='task')
+        kept = [open_task, self.block(age=5, is_done=True), self.block(age=120, is_done=True, is_pinned=True)]
+        nested = self.block(open_task, age=120, is_done=True)
+
+        out = StringIO()
+        call_command('archive_blocks', '--dry-run', stdout=out)
+        self.assertIn('3 blocks are done for over 90 days', out.getvalue())
+        call_command('archive_blocks', '--batch-size', '1', stdout=out)
+        self.assertIn('Archived 3 blocks (2 subtrees)', out.getvalue())
+
+        self.assertEqual(set(Block.objects.values_list('id', flat=True)), {block.id for block in kept})
+        self.assertEqual(set(ArchivedBlock.objects.values_list('id', flat=True)), {done.id, child.id, nested.id})
+        self.assertEqual(Tombstone.objects.filter(kind='block').count(), 3)
+        self.assertEqual(search_blocks(self.user, 'shipped', 10), [])
+        response = self.client.get(f'/api/archive/?parent_block={open_task.id}')
+        self.assertEqual([row['id'] for row in response.data], [nested.id])
+        self.assertEqual(self.client.get(f'/api/archive/{child.id}/').data['tags'], [self.tag.id])
+
+        response = self.client.post(f'/api/archive/{done.id}/restore/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['child_blocks'][0]['id'], child.id)
+        self.assertEqual(response.data['child_blocks'][0]['tags'], [{'id': self.tag.id, 'name': 'tag'}])
+        restored = Block.objects.get(id=done.id)
+        self.assertEqual((restored.type, restored.list_id, restored.created_at), ('task-done', self.list.id, done.created_at))
+        self.assertEqual(search_blocks(self.user, 'shipped', 10)[0][0].id, done.id)
+        self.assertEqual(list(Tombstone.objects.filter(kind='block').values_list('object_id', flat=True)), [nested.id])
+        self.assertEqual(list(ArchivedBlock.objects.values_list('id', flat=True)), [nested.id])
+        self.assertEqual(self.client.post(f'/api/archive/{done.id}/restore/').status_code, 404)
+        self.assert_paths_consistent()
+
+    def test_archived_blocks_follow_moves_and_deletes(self):
+        parent, target = self.block(), self.block()
+        child = self.block(parent)
+        grandchild = self.block(child)
+        response = self.client.post(f'/api/blocks/{grandchild.id}/archive/')
+        self.assertEqual(response.data['parent_block'], child.id)
+        self.assertIsNotNone(response.data['archived_at'])
+        self.assertEqual(self.client.post(f'/api/blocks/{child.id}/archive/').status_code, 200)
+
+        self.client.post(f'/api/blocks/{parent.id}/move/', {'parent_block': target.id, 'after': None}, format='json')
+        # Restoring the grandchild brings back the archived parent it hangs from.
+        response = self.client.post(f'/api/archive/{grandchild.id}/restore/')
+        self.assertEqual(response.data['parent_block'], child.id)
+        self.assertEqual(Block.objects.get(id=child.id).parent_block_id, parent.id)
+        self.assert_paths_consistent()
+        self.assertFalse(ArchivedBlock.objects.exists())
+
+        self.client.post(f'/api/blocks/{grandchild.id}/archive/')
+        self.client.delete(f'/api/blocks/{parent.id}/')
+        self.assertFalse(ArchivedBlock.objects.exists())
+
+        self.client.post(f'/api/blocks/{self.block(self.block()).id}/archive/')
+        self.client.delete(f'/api/lists/{self.list.id}/')
+        self.assertFalse(ArchivedBlock.objects.exists())
+
+    def test_open_and_pinned_descendants_keep_their_ancestors(self):
+        done = self.block(age=120, is_done=True)
+        open_task = self.block(done, age=120, type='task')
+        finished = self.block(done, age=120, is_done=True)
+        pinned_parent = self.block(age=120, is_done=True)
+        self.block(self.block(pinned_parent, age=120, is_done=True), age=120, is_done=True, is_pinned=True)
+        recent_parent = self.block(age=120, is_done=True)
+        self.block(recent_parent, age=2, is_done=True)
+
+        self.assertEqual(archive_blocks(), (1, 1))
+        self.assertEqual(list(ArchivedBlock.objects.values_list('id', flat=True)), [finished.id])
+        self.assertEqual(Block.objects.filter(id__in=[done.id, open_task.id, pinned_parent.id, recent_parent.id]).count(), 4)
+
+        Block.objects.filter(id=open_task.id).update(type='task-done', is_done=True)
+        self.assertEqual(archive_blocks(), (1, 2))
+        self.assertEqual(ArchivedBlock.objects.filter(id__in=[done.id, open_task.id]).count(), 2)
+        self.assert_paths_consistent()
+
+    def test_blocks_without_a_path_are_left_alone(self):
+        other = User.objects.create_user(email='archive-other@example.com', password='pass')
+        other_block = Block.objects.create(user=other, list=List.objects.create(user=other, title='Other'))
+        done = self.block(age=120, is_done=True)
+        Block.objects.filter(id=done.id).update(path='')
+
+        self.assertEqual(archive_blocks(), (0, 0))
+        self.assertEqual(archive_subtrees(self.user.id, []), [])
+        self.assertEqual(set(Block.objects.values_list('id', flat=True)), {other_block.id, done.id})
+        self.assertFalse(ArchivedBlock.objects.exists())
+
+        child = self.block(done)
+        Block.objects.filter(id=child.id).update(path='')
+        self.assertEqual(self.client.post(f'/api/blocks/{done.id}/archive/').status_code, 409)
+        self.assertEqual(self.client.delete(f'/api/blocks/{done.id}/').status_code, 204)
+        self.assertEqual(set(Block.objects.values_list('id', flat=True)), {other_block.id})
+        self.assertEqual(
+            set(Tombstone.objects.filter(user=self.user, kind='block').values_list('object_id', flat=True)),
+            {done.id, child.id})
+
+
+class ResponseEncodingTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        Block.objects.bulk_create(
+            Block(user=self.user, list=self.list, html=f'<p>block {i} – ünïcode</p>' * 5, order=i) for i in range(30))
+
+    def test_fast_renderer_writes_what_the_drf_renderer_writes(self):
+        deep = []
+        for _ in range(300):
+            deep = [deep]
+        data = {
+            'at': datetime(2025, 7, 1, 9, 30, 15, 123456, tzinfo=dt_timezone.utc), 'day': date(2025, 7, 1),
+            'amount': Decimal('1.50'), 'html': '<p>ü\u2028x\u2029</p>', 'label': gettext_lazy('Title'),
+            'ids': {1: [1, 2.5, None, True]},
+        }
+        for value, media_type in [(data, None), ({'deep': deep}, None), (data, 'application/json; indent=2')]:
+            expected = JSONRenderer().render(value, media_type)
+            self.assertEqual(FastJSONRenderer().render(value, media_type), expected)
+            with mock.patch('api.renderers.orjson', None):
+                self.assertEqual(FastJSONRenderer().render(value, media_type), expected)
+
+    def test_fast_parser(self):
+        response = self.client.post('/api/lists/', '{"title": "Ünïcode"}', content_type='application/json')
+        self.assertEqual((response.status_code, response.data['title']), (201, 'Ünïcode'))
+        response = self.client.post('/api/lists/', '{"title": NaN}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.data['detail'])
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate('gzip, deflate'), 'gzip')
+        self.assertIsNone(negotiate('gzip;q=0, identity'))
+        with mock.patch('api.compression.brotli', object()):
+            self.assertEqual([negotiate(header) for header in ('gzip, br', 'br;q=0.5, gzip', '*', '')],
+                             ['br', 'gzip', 'br', None])
+        self.assertEqual(negotiate('br'), 'br' if compression.brotli is not None else None)
+
+    def test_large_responses_are_compressed(self):
+        plain = self.client.get('/api/blocks/')
+        response = self.client.get('/api/blocks/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), plain.json())
+        self.assertLess(len(response.content), len(plain.content) / 4)
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        self.assertEqual(self.client.get(
+            '/api/blocks/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertFalse(self.client.get('/api/tags/', HTTP_ACCEPT_ENCODING='gzip').has_header('Content-Encoding'))
+        self.assertFalse(self.client.get('/api/blocks/', HTTP_ACCEPT_ENCODING='gzip;q=0').has_header('Content-Encoding'))
+
+    def test_streaming_export_is_compressed(self):
+        response = self.client.get('/api/workspace/export/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(body.splitlines()[1:], b''.join(export_chunks(self.user)).splitlines()[1:])
+
+    async def test_async_streaming_export_is_compressed(self):
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+        response = await self.async_client.get(
+            '/api/workspace/export/', headers={'Authorization': f'Token {token.key}', 'Accept-Encoding': 'gzip'})
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual(len(body.splitlines()), 32)
+
+
+class AsyncReadTests(TestCase):
+    """The async read views, routed as under ASGI (see ``urlpatterns`` below)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='async@example.com', password='pass')
+        folder = Folder.objects.create(user=self.user, title='Folder')
+        self.list = List.objects.create(user=self.user, title='List', folder=folder)
+        tag = Tag.objects.create(user=self.user, name='tag')
+        block = Block.objects.create(user=self.user, list=self.list, html='<p>a</p>', type='task')
+        block.tags.add(tag)
+        Block.objects.create(user=self.user, parent_block=block, html='child')
+        Block.objects.create(user=self.user, type='note', is_pinned=True)
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=self.user).key}'}
+        self.sync = APIClient()
+        self.sync.credentials(HTTP_AUTHORIZATION=self.headers['Authorization'])
+
+    async def test_responses_match_the_drf_views(self):
+        urls = [
+            '/api/lists/', '/api/folders/', '/api/tags/', '/api/agenda/stats/?tz=Asia/Tokyo',
+            '/api/blocks/?depth=0', f'/api/blocks/?depth=0&list_id={self.list.id}&fields=id,html,tags',
+            '/api/blocks/?depth=0&type__in=task,note',
+        ]
+        for url in urls:
+            with self.subTest(url=url), self.settings(ROOT_URLCONF='api.tests'):
+                path = url.split('?')[0]
+                self.assertTrue(issubclass(self.resolve_view(path), AsyncReadView))
+                response = await self.async_client.get(url, headers=self.headers)
+                expected = await sync_to_async(self.sync.get)(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), expected.json())
+                self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+    def resolve_view(self, path):
+        return resolve(path, urlconf='api.tests').func.view_class
+
+    async def test_revalidation_and_cached_payloads_need_no_queries(self):
+        with self.settings(ROOT_URLCONF='api.tests', REQUEST_METRICS={'SERVER_TIMING': True}):
+            first = await self.async_client.get('/api/blocks/?depth=0', headers=self.headers)
+            await self.async_client.get('/api/lists/', headers=self.headers)
+            lists = await self.async_client.get('/api/lists/', headers=self.headers)
+            revalidated = await self.async_client.get(
+                '/api/blocks/?depth=0', headers={**self.headers, 'If-None-Match': first['ETag']})
+        # Counted by RequestMetricsMiddleware, which runs async here too.
+        self.assertEqual(lists.status_code, 200)
+        self.assertIn('desc="0 queries"', lists['Server-Timing'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertIn('desc="1 queries"', revalidated['Server-Timing'])  # the change version
+
+    async def test_other_requests_go_to_the_drf_views(self):
+        with self.settings(ROOT_URLCONF='api.tests'):
+            created = await self.async_client.post(
+                '/api/lists/', {'title': 'New'}, content_type='application/json', headers=self.headers)
+            nested = await self.async_client.get('/api/blocks/', headers=self.headers)
+            searched = await self.async_client.get('/api/lists/?search=New', headers=self.headers)
+            anonymous = await self.async_client.get('/api/lists/')
+            invalid = await self.async_client.get('/api/agenda/stats/?tz=Mars/Base', headers=self.headers)
+        self.assertEqual(created.status_code, 201)
+        self.assertIn('child_blocks', nested.json()[0])
+        self.assertEqual([row['title'] for row in searched.json()], ['New'])
+        self.assertEqual((anonymous.status_code, anonymous['WWW-Authenticate']), (401, 'Token'))
+        self.assertEqual(invalid.status_code, 400)
+
+
+def async_read_urlpatterns():
+    from django.urls import include, path
+    from .async_views import async_read_urls
+    from .urls import urlpatterns as api_urlpatterns
+    return [path('api/', include(async_read_urls + api_urlpatterns))]
+
+
+# URLconf for AsyncReadTests: the API with the async reads in front, as config/asgi.py runs it.
+urlpatterns = async_read_urlpatterns()
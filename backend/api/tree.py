@@ -0,0 +1,188 @@
+"""
+Materialized paths for the block tree.
+
+``Block.path`` is the chain of ids from the root block down to the block
+itself, each zero-padded to ``PATH_WIDTH`` digits, so block 34 under root 12
+has the path ``000000000012000000000034``. Every descendant's path starts
+with its ancestor's, which makes a subtree one contiguous range of paths:
+from the block's own path up to (excluding) the path its next id would have
+(``subtree_range``). With the (user, path) index, reading, moving or
+deleting a subtree is a single range statement at any depth, and a block's
+depth is ``len(path) // PATH_WIDTH - 1``.
+
+Paths are written by the ``post_save`` signal for single saves, by
+``fill_paths`` after ``bulk_create`` (which skips signals), and by
+``move_subtree`` when a block changes parent. Archived blocks
+(``ArchivedBlock``, see ``api.archive``) keep their paths too, and move and
+get deleted along with the subtree they were archived from.
+"""
+
+from django.db import connection, transaction
+from django.db.models import CharField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Concat, LPad, Substr
+
+from .changes import record_change
+from .models import ArchivedBlock, Block, BlockSearchDocument, Tombstone
+
+PATH_WIDTH = 12
+
+# Batch size for statements that list block ids.
+ID_BATCH = 500
+
+# Parent of a block that was not loaded from the database, so its move cannot be ruled out.
+UNKNOWN = object()
+
+
+def path_segment(block_id):
+    return str(block_id).zfill(PATH_WIDTH)
+
+
+def depth(path):
+    return len(path) // PATH_WIDTH - 1
+
+
+def subtree_range(path):
+    """``(low, high)`` such that ``low <= p < high`` holds exactly for the paths of the subtree at ``path``."""
+    if not path:
+        raise ValueError('A block without a path has no subtree range.')
+    return path, path[:-PATH_WIDTH] + path_segment(int(path[-PATH_WIDTH:]) + 1)
+
+
+def subtree_q(path, include_self=True):
+    low, high = subtree_range(path)
+    return Q(path__gte=low, path__lt=high) if include_self else Q(path__gt=low, path__lt=high)
+
+
+def subtrees_q(user_id, paths, include_self=True):
+    """
+    Any of ``user_id``'s subtrees at ``paths``, which should not be inside one
+    another (see ``subtree_roots``). Every range repeats the user, so each one
+    is a search of the (user, path) index; with the user outside the OR,
+    SQLite scans all of the user's rows once there are a few dozen ranges.
+    No paths match nothing (an empty ``Q()`` would match every row).
+    """
+    if not paths:
+        return Q(pk__in=[])
+    ranges = Q()
+    for path in paths:
+        ranges |= Q(user_id=user_id) & subtree_q(path, include_self)
+    return ranges
+
+
+def in_subtree(path, root_path):
+    """Whether the block at ``path`` is the block at ``root_path`` or one of its descendants."""
+    return path.startswith(root_path)
+
+
+def subtree_roots(paths):
+    """The paths of ``paths`` that are not inside the subtree of another one, sorted."""
+    roots = []
+    for path in sorted(paths):
+        if path and not (roots and in_subtree(path, roots[-1])):
+            roots.append(path)
+    return roots
+
+
+def path_expression():
+    """The path of the row being updated, from its parent's stored path and its own id."""
+    parent_path = Subquery(Block.objects.filter(pk=OuterRef('parent_block_id')).values('path')[:1])
+    segment = LPad(Cast('id', output_field=CharField()), PATH_WIDTH, Value('0'))
+    return Concat(Coalesce(parent_path, Value('')), segment, output_field=CharField())
+
+
+def fill_paths(blocks):
+    """
+    Write the paths of freshly ``bulk_create``d ``blocks``, whose parents
+    must already have theirs: one UPDATE per ``ID_BATCH`` blocks, so a tree
+    created level by level needs one call per level.
+    """
+    ids = [block.id for block in blocks]
+    for start in range(0, len(ids), ID_BATCH):
+        Block.objects.filter(id__in=ids[start:start + ID_BATCH]).update(path=path_expression())
+
+
+def stored_path(block_id):
+    if block_id is None:
+        return ''
+    return Block.objects.values_list('path', flat=True).get(pk=block_id)
+
+
+def set_path(block):
+    """Write the path of a block that was just created with ``save()``."""
+    if block.parent_block_id is not None and not (Block.parent_block.is_cached(block) and block.parent_block.path):
+        Block.objects.filter(pk=block.pk).update(path=path_expression())
+        block.path = stored_path(block.pk)
+    else:
+        parent_path = block.parent_block.path if block.parent_block_id is not None else ''
+        block.path = parent_path + path_segment(block.pk)
+        Block.objects.filter(pk=block.pk).update(path=block.path)
+    block._loaded_parent_id = block.parent_block_id
+
+
+def parent_changed(block):
+    """Whether ``block``'s parent differs from the one it was loaded with (see ``Block.from_db``)."""
+    return block.parent_block_id != getattr(block, '_loaded_parent_id', UNKNOWN)
+
+
+def move_subtree(block):
+    """
+    Rewrite the paths of ``block`` and all its descendants after its parent
+    changed, with one UPDATE over the subtree's range. Raises ``ValueError``
+    if the new parent is inside the subtree.
+    """
+    old_path = stored_path(block.pk)
+    parent_path = stored_path(block.parent_block_id)
+    if parent_path and in_subtree(parent_path, old_path):
+        raise ValueError('A block cannot be moved under itself or one of its descendants.')
+    new_path = parent_path + path_segment(block.pk)
+    if new_path != old_path:
+        moved = Concat(Value(new_path), Substr('path', len(old_path) + 1), output_field=CharField())
+        Block.objects.filter(subtree_q(old_path), user_id=block.user_id).update(path=moved)
+        ArchivedBlock.objects.filter(subtree_q(old_path), user_id=block.user_id).update(path=moved)
+    block.path = new_path
+    block._loaded_parent_id = block.parent_block_id
+
+
+def delete_subtree(block):
+    """
+    Delete ``block``, its descendants and what was archived from them; see
+    ``delete_subtrees``. A block whose path is not filled in yet (nothing is
+    archived under it) goes through the ORM's cascade instead, one level of
+    the tree at a time.
+    """
+    if not block.path:
+        block.delete()
+        return
+    delete_subtrees(block.user_id, [block.path])
+
+
+def delete_subtrees(user_id, paths, archived=True):
+    """
+    Delete the blocks in the subtrees at ``paths`` (see ``subtree_roots``)
+    with range statements and return their ids. The ORM's cascade would
+    collect each tree one level at a time and run the ``post_delete``
+    receivers once per row, so the tag links, search documents, tombstones
+    and change record are handled here in bulk. With ``archived`` the
+    archived blocks inside the subtrees are deleted as well.
+    """
+    if not paths:
+        return []
+    subtrees = Block.objects.filter(subtrees_q(user_id, paths))
+    quote = connection.ops.quote_name
+    with transaction.atomic():
+        ids = list(subtrees.values_list('id', flat=True))
+        Block.tags.through.objects.filter(block__in=subtrees.values('id')).delete()
+        BlockSearchDocument.objects.filter(block__in=subtrees.values('id')).delete()
+        ranges = ' OR '.join(
+            [f'({quote("user_id")} = %s AND {quote("path")} >= %s AND {quote("path")} < %s)'] * len(paths))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {quote(Block._meta.db_table)} WHERE {ranges}',
+                [value for path in paths for value in (user_id, *subtree_range(path))],
+            )
+        if archived:
+            ArchivedBlock.objects.filter(subtrees_q(user_id, paths)).delete()
+        Tombstone.objects.bulk_create(
+            [Tombstone(user_id=user_id, kind='block', object_id=pk) for pk in ids], batch_size=ID_BATCH)
+        record_change(user_id, 'block', 'delete', ids)
+    return ids
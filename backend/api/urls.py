@@ -1,10 +1,28 @@
+from django.conf import settings
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import BlockViewSet, ListViewSet, FolderViewSet, TagViewSet
+from .instrumentation import metrics_view
+from .views import (
+    AgendaStatsView, AgendaView, ArchivedBlockViewSet, BlockViewSet, ListViewSet, FolderViewSet, TagViewSet, SyncView,
+    WorkspaceExportView, WorkspaceImportView,
+)
 
 router = DefaultRouter()
 router.register(r'blocks', BlockViewSet, basename='block')
 router.register(r'lists', ListViewSet, basename='list')
 router.register(r'folders', FolderViewSet, basename='folder')
 router.register(r'tags', TagViewSet, basename='tag')
+router.register(r'archive', ArchivedBlockViewSet, basename='archived-block')
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('agenda/', AgendaView.as_view(), name='agenda'),
+    path('agenda/stats/', AgendaStatsView.as_view(), name='agenda-stats'),
+    path('workspace/export/', WorkspaceExportView.as_view(), name='workspace-export'),
+    path('workspace/import/', WorkspaceImportView.as_view(), name='workspace-import'),
+    path('metrics/', metrics_view, name='metrics'),
+] + router.urls
+
+if settings.API_ASYNC_READS:
+    from .async_views import async_read_urls
+    urlpatterns = async_read_urls + urlpatterns
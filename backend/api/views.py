@@ -1,11 +1,104 @@
-from rest_framework import viewsets, filters
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from rest_framework import viewsets, filters, serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db import models
-from .models import Block, List, Folder, Tag
-from .serializers import BlockSerializer, ListSerializer, FolderSerializer, TagSerializer
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from .agenda import agenda, task_stats
+from .archive import archive_subtrees, restore_block
+from .changes import get_version, record_change
+from .filters import ArchivedBlockFilter, BlockFilter, relative_due_day, resolve_timezone
+from .models import ArchivedBlock, Block, List, Folder, Tag, Tombstone
+from .ordering import next_order, order_after, sibling_blocks
+from .outline import create_outline
+from .pagination import ArchivedBlockPagination, BlockPagination, ListPagination
+from .payload_cache import get_payload
+from .search import search_blocks
+from .serializers import (
+    AgendaQuerySerializer, AgendaTaskSerializer, ArchivedBlockSerializer, BlockBulkUpdateSerializer, BlockImportSerializer, BlockMoveSerializer, BlockSearchQuerySerializer, BlockSearchResultSerializer,
+    BlockSerializer, BlockSyncSerializer, ListSerializer, FolderSerializer, TagSerializer, sparse_fields,
+)
+from .tree import delete_subtree, in_subtree, move_subtree, parent_changed
+from .workspace import WorkspaceImportError, export_chunks, import_workspace
+
+def version_etag(user_id, version, day=None):
+    if day is not None:
+        return f'"{user_id}.{version}.{day.isoformat()}"'
+    return f'"{user_id}.{version}"'
+
+
+def tag_response(response, etag):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        # ブラウザに毎回再検証させ、ユーザーごとにキャッシュを分ける
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+class ConditionalReadMixin:
+    """
+    Tag list/detail responses with an ETag built from the user's change
+    version (and the local date, for ``due`` windows relative to today) and
+    answer a matching ``If-None-Match`` with 304 before any queryset or
+    serializer work.
+    """
+
+    def get_etag(self):
+        user_id = self.request.user.pk
+        return version_etag(user_id, get_version(user_id), relative_due_day(self.request.query_params))
+
+    def conditional_read(self, handler, request, *args, **kwargs):
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=etag) or handler(request, *args, **kwargs)
+        return tag_response(response, etag)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_read(super().list, request, *args, **kwargs)
 
-class FolderViewSet(viewsets.ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_read(super().retrieve, request, *args, **kwargs)
+
+
+class CachedPayloadMixin:
+    """
+    Serve the unfiltered ``list`` action from a per-user cached payload (see
+    ``payload_cache``), so a warm read costs no queries. Requests with query
+    parameters (search, pagination) take the normal path.
+    """
+
+    payload_name = None
+
+    def cacheable(self):
+        return self.action == 'list' and not self.request.query_params
+
+    def get_etag(self):
+        if not self.cacheable():
+            return super().get_etag()
+        queryset = self.get_queryset()
+        self.payload = get_payload(
+            self.request.user.pk, self.payload_name,
+            lambda: self.get_serializer(queryset, many=True).data,
+        )
+        return self.payload['etag']
+
+    def list(self, request, *args, **kwargs):
+        if not self.cacheable():
+            return super().list(request, *args, **kwargs)
+        return self.conditional_read(lambda *args, **kwargs: Response(self.payload['data']), request)
+
+
+class FolderViewSet(CachedPayloadMixin, ConditionalReadMixin, viewsets.ModelViewSet):
     serializer_class = FolderSerializer
+    payload_name = 'folders'
     
     def get_queryset(self):
         return Folder.objects.filter(user=self.request.user)
@@ -13,59 +106,399 @@ class FolderViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
-class ListViewSet(viewsets.ModelViewSet):
+class ListViewSet(CachedPayloadMixin, ConditionalReadMixin, viewsets.ModelViewSet):
     serializer_class = ListSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['title']
+    pagination_class = ListPagination
+    payload_name = 'lists'
 
     def get_queryset(self):
-        return List.objects.filter(user=self.request.user)
+        return List.objects.filter(user=self.request.user).select_related('folder')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class BlockViewSet(viewsets.ModelViewSet):
+class BlockViewSet(ConditionalReadMixin, viewsets.ModelViewSet):
     serializer_class = BlockSerializer
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_class = BlockFilter
+    # Cursor pages stay in block order; ?ordering= sorts plain and ?limit= reads.
+    ordering_fields = ['due_date', 'created_at', 'updated_at']
+    pagination_class = BlockPagination
 
     def get_queryset(self):
-        queryset = Block.objects.filter(user=self.request.user)
-        params = self.request.query_params
+        queryset = Block.objects.filter(user=self.request.user).order_by('order')
+        # Skip the tag prefetch and the html column when ?fields= leaves them out.
+        fields = sparse_fields(self.request)
+        if fields is None or 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if fields is not None and 'html' not in fields:
+            queryset = queryset.defer('html')
+        return queryset
 
-        block_type = params.get('type')
-        list_id = params.get('list_id')
-        parent_block = params.get('parent_block')
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        list_id = data['list'].id if data.get('list') else None
+        parent_block_id = data['parent_block'].id if data.get('parent_block') else None
+
+        with transaction.atomic():
+            if 'after' in data:
+                # 指定したブロックの直後に挿入（必要なら兄弟グループだけ振り直す）
+                anchor = data.pop('after')
+                self.check_anchor(anchor, list_id, parent_block_id)
+                order = order_after(sibling_blocks(self.request.user, list_id, parent_block_id), anchor)
+            else:
+                order = data.get("order")
+                if order is None:
+                    order = next_order(self.request.user, list_id, parent_block_id)
+            serializer.save(user=self.request.user, order=order)
+
+    def perform_update(self, serializer):
+        data = serializer.validated_data
+        block = serializer.instance
+        parent = data.get('parent_block')
+        if parent is not None:
+            self.check_not_inside(parent.path, block)
+        if 'after' not in data:
+            serializer.save()
+            return
+
+        # Same placement as create/move: right after the anchor among the block's (new) siblings.
+        anchor = data.pop('after')
+        list_id = (data['list'].id if data['list'] else None) if 'list' in data else block.list_id
+        parent_block_id = (parent.id if parent else None) if 'parent_block' in data else block.parent_block_id
+        if anchor is not None and anchor.id == block.id:
+            raise serializers.ValidationError({'after': 'A block cannot be placed after itself.'})
+        self.check_anchor(anchor, list_id, parent_block_id)
+        with transaction.atomic():
+            siblings = sibling_blocks(self.request.user, list_id, parent_block_id).exclude(id=block.id)
+            serializer.save(order=order_after(siblings, anchor))
+
+    def perform_destroy(self, instance):
+        # The whole subtree goes in a few range statements instead of a cascade per level.
+        delete_subtree(instance)
+
+    def check_anchor(self, anchor, list_id, parent_block_id):
+        if anchor is not None and (anchor.list_id, anchor.parent_block_id) != (list_id, parent_block_id):
+            raise serializers.ValidationError({'after': 'The block to insert after must be a sibling.'})
+
+    def check_placement(self, list_id, parent_block_id, exclude=None):
+        """Reject a list or parent block that is not the user's (or is inside the block being placed)."""
+        if list_id is not None and not List.objects.filter(user=self.request.user, id=list_id).exists():
+            raise serializers.ValidationError({'list': 'Unknown list.'})
+        if parent_block_id is None:
+            return
+        parents = Block.objects.filter(user=self.request.user, id=parent_block_id)
+        parent_path = parents.values_list('path', flat=True).first()
+        if parent_path is None:
+            raise serializers.ValidationError({'parent_block': 'Unknown block.'})
+        if exclude is not None:
+            self.check_not_inside(parent_path, exclude)
+
+    def check_not_inside(self, parent_path, block):
+        if in_subtree(parent_path, block.path):
+            raise serializers.ValidationError({'parent_block': 'A block cannot be moved under itself or one of its descendants.'})
+
+    def get_anchor(self, anchor_id, list_id, parent_block_id, exclude=None):
+        if anchor_id is None:
+            return None
+        anchors = Block.objects.filter(user=self.request.user, id=anchor_id)
+        anchor = (anchors.exclude(id=exclude.id) if exclude is not None else anchors).first()
+        if anchor is None:
+            raise serializers.ValidationError({'after': 'Unknown block.'})
+        self.check_anchor(anchor, list_id, parent_block_id)
+        return anchor
 
-        if block_type:
-            queryset = queryset.filter(type=block_type)
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """
+        Place a block right after another sibling (or first with ``after: null``),
+        optionally under a new list/parent, writing only this block's order.
+        """
+        block = self.get_object()
+        serializer = BlockMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
 
-        if parent_block is not None:
-            queryset = queryset.filter(parent_block=parent_block)
-        elif parent_block == '':
-            queryset = queryset.filter(parent_block__isnull=True)
+        list_id = data.get('list_id', block.list_id)
+        parent_block_id = data.get('parent_block_id', block.parent_block_id)
+        self.check_placement(list_id, parent_block_id, exclude=block)
+        anchor = self.get_anchor(data['after'], list_id, parent_block_id, exclude=block)
 
-        if list_id == 'none':
-            queryset = queryset.filter(list__isnull=True)
-        elif list_id:
+        with transaction.atomic():
+            siblings = sibling_blocks(request.user, list_id, parent_block_id).exclude(id=block.id)
+            block.list_id = list_id
+            block.parent_block_id = parent_block_id
+            block.order = order_after(siblings, anchor)
+            block.save(update_fields=['list', 'parent_block', 'order', 'updated_at'])
+
+        return Response(BlockBulkUpdateSerializer(block).data)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        ``?q=<words>&limit=<n>``: the user's blocks whose text contains every
+        word (prefix match), best match first, each with a highlighted snippet.
+        """
+        params = BlockSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        results = search_blocks(request.user, params.validated_data['q'], params.validated_data['limit'])
+        for block, snippet in results:
+            block.snippet = snippet
+        return Response(BlockSearchResultSerializer([block for block, _ in results], many=True).data)
+
+    bulk_max_items = 1000
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Apply a batch of partial updates (order, parent_block, list, due_date,
+        is_done, type) in one transaction and return only the changed rows.
+        """
+        serializer = BlockBulkUpdateSerializer(data=request.data, many=True, max_length=self.bulk_max_items)
+        serializer.is_valid(raise_exception=True)
+        updates = {item.pop('id'): item for item in serializer.validated_data}
+
+        list_ids = {item['list_id'] for item in updates.values() if item.get('list_id')}
+        if list_ids - set(List.objects.filter(user=request.user, id__in=list_ids).values_list('id', flat=True)):
+            raise serializers.ValidationError({'list': 'Unknown list.'})
+        parent_ids = {item['parent_block_id'] for item in updates.values() if item.get('parent_block_id')}
+        if parent_ids - set(Block.objects.filter(user=request.user, id__in=parent_ids).values_list('id', flat=True)):
+            raise serializers.ValidationError({'parent_block': 'Unknown block.'})
+
+        fields = {'updated_at'}
+        now = timezone.now()
+        with transaction.atomic():
+            blocks = list(Block.objects.select_for_update().filter(user=request.user, id__in=updates))
+            if len(blocks) != len(updates):
+                missing = set(updates) - {block.id for block in blocks}
+                raise serializers.ValidationError({'id': f'Unknown blocks: {sorted(missing)}'})
+            for block in blocks:
+                for field, value in updates[block.id].items():
+                    setattr(block, field, value)
+                    fields.add(field)
+                block.updated_at = now
+            Block.objects.bulk_update(blocks, sorted(fields))
+            # bulk_update skips post_save, so moved subtrees get their paths here.
             try:
-                queryset = queryset.filter(list_id=int(list_id))
-            except (ValueError, TypeError):
-                pass
+                for block in blocks:
+                    if parent_changed(block):
+                        move_subtree(block)
+            except ValueError as error:
+                raise serializers.ValidationError({'parent_block': str(error)})
+            record_change(request.user.pk, 'block', 'update', updates)
 
-        return queryset.order_by('order')
+        return Response(BlockBulkUpdateSerializer(blocks, many=True).data, status=status.HTTP_200_OK)
 
-    def perform_create(self, serializer):
-        order = serializer.validated_data.get("order")
-        if order is None:
-            max_order = Block.objects.filter(user=self.request.user).aggregate(models.Max('order'))['order__max'] or 0
-            order = max_order + 1
-        serializer.save(user=self.request.user, order=order)
+    import_max_blocks = 10000
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_blocks(self, request):
+        """
+        Create a whole tree of blocks (nested ``blocks``, or pasted
+        ``markdown``/``html``) under ``list``/``parent_block``, appended or
+        right after the ``after`` sibling. Returns the new rows in document order.
+        """
+        serializer = BlockImportSerializer(data=request.data, max_blocks=self.import_max_blocks)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
 
-class TagViewSet(viewsets.ModelViewSet):
+        list_id = data.get('list_id')
+        parent_block_id = data.get('parent_block_id')
+        self.check_placement(list_id, parent_block_id)
+        anchor = self.get_anchor(data.get('after'), list_id, parent_block_id)
+        tag_ids = {tag_id for node, _ in data['nodes'] for tag_id in node.get('tag_ids', ())}
+        if tag_ids - set(Tag.objects.filter(user=request.user, id__in=tag_ids).values_list('id', flat=True)):
+            raise serializers.ValidationError({'tag_ids': 'Unknown tags.'})
+
+        blocks = create_outline(
+            request.user, list_id, parent_block_id, data['nodes'], append='after' not in data, anchor=anchor)
+        return Response(BlockBulkUpdateSerializer(blocks, many=True).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def archive(self, request, pk=None):
+        """Move a block and its subtree to the archive now, done or not (see ``api.archive``)."""
+        block = self.get_object()
+        if not block.path:
+            # Rows from before the path backfill cannot be moved by range yet.
+            return Response({'detail': 'This block cannot be archived yet.'}, status=status.HTTP_409_CONFLICT)
+        archived = archive_subtrees(request.user.pk, [block.path])
+        return Response(ArchivedBlockSerializer(archived[0]).data)
+
+class ArchivedBlockViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ``GET /api/archive/``: the blocks ``api.archive`` moved out of the block
+    table, flat and in tree order, optionally by ``list_id``/``parent_block``.
+    ``POST /api/archive/{id}/restore/`` moves one back with its archived
+    subtree and returns it like ``GET /api/blocks/{id}/``.
+    """
+    serializer_class = ArchivedBlockSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ArchivedBlockFilter
+    pagination_class = ArchivedBlockPagination
+
+    def get_queryset(self):
+        return ArchivedBlock.objects.filter(user=self.request.user).order_by('path')
+
+    @action(detail=True, methods=['post'])
+    def restore(self, request, pk=None):
+        block = restore_block(request.user, self.get_object().id)
+        return Response(BlockSerializer(block, context=self.get_serializer_context()).data)
+
+class TagViewSet(ConditionalReadMixin, viewsets.ModelViewSet):
     serializer_class = TagSerializer
 
     def get_queryset(self):
         return Tag.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
\ No newline at end of file
+        serializer.save(user=self.request.user)
+
+class SyncView(APIView):
+    """
+    ``GET /api/sync/?since=<cursor>``: every Folder, List, Block and Tag
+    created or updated after the cursor, tombstones for rows deleted since,
+    and the cursor for the next call. Without ``since`` it returns a full
+    snapshot.
+
+    Rows written up to ``overlap`` before the cursor are sent again, so
+    transactions that committed late are not missed. Clients apply rows
+    as idempotent upserts.
+    """
+
+    overlap = timedelta(seconds=5)
+
+    def get(self, request):
+        now = timezone.now()
+        since = self.parse_cursor(request.query_params.get('since'))
+        user = request.user
+
+        if since is not None and since < now - self.tombstone_retention():
+            return Response({'detail': 'Cursor expired; fetch a full snapshot.'}, status=status.HTTP_410_GONE)
+
+        folders = Folder.objects.filter(user=user)
+        lists = List.objects.filter(user=user)
+        blocks = Block.objects.filter(user=user).prefetch_related('tags')
+        tags = Tag.objects.filter(user=user)
+        deleted = []
+        if since is not None:
+            changed_after = since - self.overlap
+            folders, lists, blocks, tags = (
+                queryset.filter(updated_at__gt=changed_after) for queryset in (folders, lists, blocks, tags)
+            )
+            deleted = [
+                {'type': kind, 'id': object_id}
+                for kind, object_id in Tombstone.objects.filter(user=user, deleted_at__gt=changed_after)
+                .order_by('deleted_at').values_list('kind', 'object_id')
+            ]
+
+        return Response({
+            'cursor': self.encode_cursor(now),
+            'folders': FolderSerializer(folders, many=True).data,
+            'lists': ListSerializer(lists.select_related('folder'), many=True).data,
+            'blocks': BlockSyncSerializer(blocks.order_by('order', 'id'), many=True).data,
+            'tags': TagSerializer(tags, many=True).data,
+            'deleted': deleted,
+        })
+
+    @staticmethod
+    def tombstone_retention():
+        return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+    @staticmethod
+    def encode_cursor(moment):
+        return str(int(moment.timestamp() * 1_000_000))
+
+    @staticmethod
+    def parse_cursor(value):
+        if not value:
+            return None
+        try:
+            return datetime.fromtimestamp(int(value) / 1_000_000, tz=dt_timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            raise serializers.ValidationError({'since': 'Invalid cursor.'})
+
+
+class AgendaView(APIView):
+    """
+    ``GET /api/agenda/?from=&to=&tz=``: tasks due in the date range (inclusive,
+    in ``tz``) grouped per day, with done/pending/overdue counts per day and
+    overall. Rows are flat and omit ``html`` unless ``include=html``.
+    Without ``from``/``to`` the range is the coming week.
+    """
+
+    default_days = 7
+
+    def get(self, request):
+        params = AgendaQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        tzinfo = resolve_timezone(params.validated_data.get('tz'))
+        start = params.validated_data.get('from') or timezone.now().astimezone(tzinfo).date()
+        end = params.validated_data.get('to') or start + timedelta(days=self.default_days - 1)
+        if 'to' in params.validated_data and 'from' not in params.validated_data:
+            start = end - timedelta(days=self.default_days - 1)
+        include_html = 'html' in params.validated_data.get('include', '').split(',')
+
+        counts, days = agenda(request.user, start, end, tzinfo, include_html)
+        return Response({
+            'from': start,
+            'to': end,
+            'counts': counts,
+            'days': [
+                {
+                    'date': day,
+                    'counts': day_counts,
+                    'tasks': AgendaTaskSerializer(tasks, many=True, include_html=include_html).data,
+                }
+                for day, day_counts, tasks in days
+            ],
+        })
+
+
+class AgendaStatsView(APIView):
+    """``GET /api/agenda/stats/?tz=``: dashboard note/task counters from one aggregate query."""
+
+    def get(self, request):
+        tzinfo = resolve_timezone(request.query_params.get('tz'))
+        return Response(task_stats(request.user, tzinfo))
+
+
+async def iterate_async(chunks):
+    """Hand a synchronous iterator to an ASGI server a chunk at a time (it would otherwise be read whole)."""
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+class WorkspaceExportView(APIView):
+    """
+    ``GET /api/workspace/export/``: the user's whole workspace as a streamed
+    NDJSON download (see ``api.workspace`` for the format).
+    """
+
+    def get(self, request):
+        chunks = export_chunks(request.user)
+        if isinstance(request._request, ASGIRequest):
+            chunks = iterate_async(chunks)
+        response = StreamingHttpResponse(chunks, content_type='application/x-ndjson')
+        filename = f'flist-workspace-{timezone.now():%Y%m%d}.ndjson'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class WorkspaceImportView(APIView):
+    """
+    ``POST /api/workspace/import/`` with an export as the request body: adds
+    its folders, lists, tags and blocks to the user's workspace under new ids.
+    The body is read line by line, never as a whole. All or nothing; an
+    error names the first line that could not be imported.
+    """
+
+    def post(self, request):
+        stream = request.stream
+        try:
+            counts = import_workspace(request.user, iter(stream.readline, b'') if stream is not None else ())
+        except WorkspaceImportError as error:
+            return Response({'line': error.line, 'detail': error.detail}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'created': counts}, status=status.HTTP_201_CREATED)
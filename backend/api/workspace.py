@@ -0,0 +1,288 @@
+"""
+Whole-workspace export and import as NDJSON, one JSON object per line.
+
+The first line is a header (``{"kind": "header", "format": "flist-workspace",
+"version": 1}``); every other line is one row, with a ``kind`` of ``tag``,
+``folder``, ``list`` or ``block`` and the fields of the API representation::
+
+    {"kind": "list", "id": 7, "title": "Inbox", "folder": 2, "sort_order": 0}
+    {"kind": "block", "id": 41, "list": 7, "parent_block": null, "type": "task", "tags": [3], ...}
+
+``export_chunks`` reads each table in keyset-paginated chunks of
+``CHUNK_SIZE`` rows (blocks in ``(path, id)`` order, so every block comes
+after its parent) and yields one encoded chunk at a time, so a response of any
+size holds a single chunk in memory.
+
+``import_workspace`` reads lines one at a time and inserts rows in batches
+of ``BATCH_SIZE`` with ``bulk_create``, one transaction per batch: on
+SQLite a transaction holds the database's only write lock, and one around
+the whole import would stall every other writer for as long as it runs.
+If a line fails, the rows of the batches already committed are deleted
+again (with tombstones, as clients may have synced them), so an import
+still leaves all or nothing behind. Rows keep nothing of their old ids but
+the mapping to the new ones; a row may only refer to rows on earlier
+lines, which an export always satisfies. That mapping (well under half a
+KiB per row) is the only memory that grows with the size of the input.
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .changes import record_change
+from .models import Block, Folder, List, Tag
+from .payload_cache import invalidate_payloads
+from .search import index_blocks
+from .serializers import (
+    WorkspaceBlockRowSerializer, WorkspaceFolderRowSerializer, WorkspaceListRowSerializer, WorkspaceTagRowSerializer,
+)
+from .tree import ID_BATCH, delete_subtrees, fill_paths, subtree_roots
+
+FORMAT = 'flist-workspace'
+VERSION = 1
+CHUNK_SIZE = 2000
+BATCH_SIZE = 1000
+
+encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+ROW_SERIALIZERS = {
+    'tag': WorkspaceTagRowSerializer,
+    'folder': WorkspaceFolderRowSerializer,
+    'list': WorkspaceListRowSerializer,
+    'block': WorkspaceBlockRowSerializer,
+}
+
+
+class WorkspaceImportError(ValueError):
+    """A line that cannot be imported; ``line`` is its 1-based number."""
+
+    def __init__(self, line, detail):
+        super().__init__(f'Line {line}: {detail}')
+        self.line = line
+        self.detail = detail
+
+
+def keyset_chunks(queryset, keys, size):
+    """Rows of a ``values()`` queryset ordered by ``keys``, unique together, one query per ``size`` rows."""
+    queryset = queryset.order_by(*keys)
+    rows = list(queryset[:size])
+    while rows:
+        last = [rows[-1][key] for key in keys]
+        yield rows
+        if len(rows) < size:
+            return
+        # (k1, k2) > (v1, v2) as k1 > v1 OR (k1 = v1 AND k2 > v2).
+        after = Q()
+        for i, key in enumerate(keys):
+            after |= Q(**{f'{key}__gt': last[i]}, **dict(zip(keys[:i], last)))
+        rows = list(queryset.filter(after)[:size])
+
+
+def encode(rows):
+    return ''.join(encoder.encode(row) + '\n' for row in rows).encode()
+
+
+def export_chunks(user, chunk_size=CHUNK_SIZE):
+    """Yield the NDJSON export of ``user``'s workspace as a few encoded chunks."""
+    yield encode([{'kind': 'header', 'format': FORMAT, 'version': VERSION, 'exported_at': timezone.now()}])
+
+    tags = Tag.objects.filter(user=user).values('id', 'name')
+    for rows in keyset_chunks(tags, ('id',), chunk_size):
+        yield encode({'kind': 'tag', **row} for row in rows)
+
+    folders = Folder.objects.filter(user=user).values('id', 'title')
+    for rows in keyset_chunks(folders, ('id',), chunk_size):
+        yield encode({'kind': 'folder', **row} for row in rows)
+
+    lists = List.objects.filter(user=user).values('id', 'title', 'folder', 'sort_order')
+    for rows in keyset_chunks(lists, ('id',), chunk_size):
+        yield encode({'kind': 'list', **row} for row in rows)
+
+    blocks = Block.objects.filter(user=user).values(
+        'id', 'list', 'parent_block', 'html', 'type', 'order', 'due_date', 'is_done', 'is_pinned', 'path')
+    through = Block.tags.through.objects
+    # Blocks without a path yet all share '', so the id keeps the keyset unique.
+    for rows in keyset_chunks(blocks, ('path', 'id'), chunk_size):
+        tags = {}
+        for block_id, tag_id in through.filter(block_id__in=[row['id'] for row in rows]).values_list('block_id', 'tag_id'):
+            tags.setdefault(block_id, []).append(tag_id)
+        for row in rows:
+            del row['path']
+            row['tags'] = tags.get(row['id'], [])
+        yield encode({'kind': 'block', **row} for row in rows)
+
+
+def parse_lines(lines):
+    """``(line number, row)`` for each non-blank line of ``lines`` (bytes or str)."""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            raise WorkspaceImportError(number, f'Invalid JSON ({error}).')
+        if not isinstance(row, dict):
+            raise WorkspaceImportError(number, 'Each line must be a JSON object.')
+        yield number, row
+
+
+class WorkspaceImporter:
+    """
+    Creates imported rows for ``user`` in batches. Rows are buffered per
+    kind; a row of another kind, a full buffer or ``finish()`` writes the
+    buffer in a transaction of its own, so the rows a line refers to are
+    always written before it. ``discard()`` deletes what was written.
+    """
+
+    def __init__(self, user, batch_size=BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self.ids = {kind: {} for kind in ROW_SERIALIZERS}
+        self.kind = None
+        self.pending = []  # (line number, row) of self.kind
+        self.added = []  # old ids of self.kind mapped by the batch being written
+
+    def add(self, number, row):
+        kind = row.pop('kind', None)
+        if kind not in self.ids:
+            raise WorkspaceImportError(number, f'Unknown row kind {kind!r}.')
+        if kind != self.kind or len(self.pending) >= self.batch_size:
+            self.flush()
+            self.kind = kind
+        self.pending.append((number, row))
+
+    def finish(self):
+        self.flush()
+        return {kind: len(ids) for kind, ids in self.ids.items()}
+
+    def flush(self):
+        if not self.pending:
+            return
+        rows = ROW_SERIALIZERS[self.kind](data=[row for _, row in self.pending], many=True)
+        if not rows.is_valid():
+            index, errors = next((index, errors) for index, errors in enumerate(rows.errors) if errors)
+            raise WorkspaceImportError(self.pending[index][0], errors)
+        numbers = [number for number, _ in self.pending]
+        self.added = []
+        try:
+            with transaction.atomic():
+                getattr(self, f'create_{self.kind}s')(numbers, rows.validated_data)
+        except Exception:
+            # The batch was rolled back, so its rows must not be found (or discarded) later.
+            for old_id in self.added:
+                del self.ids[self.kind][old_id]
+            raise
+        self.pending = []
+
+    def discard(self):
+        """Delete the rows of the batches written so far, blocks first."""
+        block_ids = list(self.ids['block'].values())
+        for start in range(0, len(block_ids), ID_BATCH):
+            blocks = Block.objects.filter(user=self.user, id__in=block_ids[start:start + ID_BATCH])
+            delete_subtrees(self.user.pk, subtree_roots(blocks.values_list('path', flat=True)))
+        for kind, model in (('list', List), ('folder', Folder), ('tag', Tag)):
+            ids = list(self.ids[kind].values())
+            for start in range(0, len(ids), ID_BATCH):
+                model.objects.filter(user=self.user, id__in=ids[start:start + ID_BATCH]).delete()
+        self.ids = {kind: {} for kind in ROW_SERIALIZERS}
+
+    def resolve(self, kind, old_id, number):
+        if old_id is None:
+            return None
+        try:
+            return self.ids[kind][old_id]
+        except KeyError:
+            raise WorkspaceImportError(number, f'Unknown {kind} {old_id}; rows must come after the rows they refer to.')
+
+    def remember(self, kind, numbers, rows, created):
+        ids = self.ids[kind]
+        for number, row, obj in zip(numbers, rows, created):
+            if row['id'] in ids:
+                raise WorkspaceImportError(number, f'Duplicate {kind} id {row["id"]}.')
+            ids[row['id']] = obj.id
+            self.added.append(row['id'])
+
+    def created(self, kind, numbers, rows, created):
+        self.remember(kind, numbers, rows, created)
+        record_change(self.user.pk, kind, 'create', [obj.id for obj in created])
+        invalidate_payloads(self.user.pk, kind)
+
+    def create_tags(self, numbers, rows):
+        created = Tag.objects.bulk_create([Tag(user=self.user, name=row['name']) for row in rows])
+        self.created('tag', numbers, rows, created)
+
+    def create_folders(self, numbers, rows):
+        created = Folder.objects.bulk_create([Folder(user=self.user, title=row['title']) for row in rows])
+        self.created('folder', numbers, rows, created)
+
+    def create_lists(self, numbers, rows):
+        created = List.objects.bulk_create([
+            List(user=self.user, title=row['title'], sort_order=row['sort_order'],
+                 folder_id=self.resolve('folder', row['folder'], number))
+            for number, row in zip(numbers, rows)
+        ])
+        self.created('list', numbers, rows, created)
+
+    def create_blocks(self, numbers, rows):
+        # Parents inside the batch need their new ids first, so insert it one tree level at a time.
+        batch = {row['id'] for row in rows}
+        depth = {}
+        for number, row in zip(numbers, rows):
+            parent = row['parent_block']
+            if parent in batch and parent not in depth:
+                raise WorkspaceImportError(number, f'Unknown block {parent}; rows must come after the rows they refer to.')
+            depth[row['id']] = depth[parent] + 1 if parent in batch else 0
+
+        created = []
+        for level in range(max(depth.values()) + 1):
+            level_rows = [(number, row) for number, row in zip(numbers, rows) if depth[row['id']] == level]
+            blocks = Block.objects.bulk_create([
+                Block(
+                    user=self.user,
+                    list_id=self.resolve('list', row['list'], number),
+                    parent_block_id=self.resolve('block', row['parent_block'], number),
+                    html=row['html'], type=row['type'], order=row['order'], due_date=row['due_date'],
+                    is_done=row['is_done'], is_pinned=row['is_pinned'],
+                )
+                for number, row in level_rows
+            ])
+            fill_paths(blocks)
+            self.remember('block', [number for number, _ in level_rows], [row for _, row in level_rows], blocks)
+            created += zip(level_rows, blocks)
+
+        through = Block.tags.through
+        through.objects.bulk_create([
+            through(block_id=block.id, tag_id=self.resolve('tag', tag_id, number))
+            for (number, row), block in created
+            for tag_id in dict.fromkeys(row['tags'])
+        ])
+        blocks = [block for _, block in created]
+        index_blocks(blocks)
+        record_change(self.user.pk, 'block', 'create', [block.id for block in blocks])
+
+
+def import_workspace(user, lines, batch_size=BATCH_SIZE):
+    """
+    Create the rows of an NDJSON export (an iterable of lines) in ``user``'s
+    workspace, a transaction per batch, and return ``{kind: rows created}``.
+    Raises ``WorkspaceImportError`` for the first line that cannot be
+    imported, after deleting the rows created before it.
+    """
+    rows = parse_lines(lines)
+    number, header = next(rows, (1, None))
+    if header is None or header.get('kind') != 'header' or header.get('format') != FORMAT:
+        raise WorkspaceImportError(number, f'The first line must be a {FORMAT} header.')
+    if header.get('version') != VERSION:
+        raise WorkspaceImportError(number, f'Unsupported version {header.get("version")!r}.')
+
+    importer = WorkspaceImporter(user, batch_size)
+    try:
+        for number, row in rows:
+            importer.add(number, row)
+        return importer.finish()
+    except Exception:
+        importer.discard()
+        raise
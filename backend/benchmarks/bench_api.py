@@ -0,0 +1,146 @@
+"""
+Micro-benchmarks for every BlockViewSet/ListViewSet action, with stored baselines.
+
+    python benchmarks/bench_api.py                          # print results
+    python benchmarks/bench_api.py --save baselines/api.json
+    python benchmarks/bench_api.py --compare baselines/api.json
+
+Each case runs through Django's test client in-process against a generated
+workspace (see ``generate.py``) and reports latency percentiles and the
+number of queries per request. A comparison fails (exit status 1) when a
+case issues more queries than its baseline or its p50 is slower by more than
+``--tolerance``. Query counts are exact, but timings depend on the machine,
+so refresh the baseline when the hardware changes.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from common import format_timing, measure, scratch_database
+from generate import add_scale_arguments, generate_workspace, scale_from_args
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from rest_framework.test import APIClient
+
+from api.models import Block
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+
+def cases(client, workspace):
+    """``{name: callable}``; each callable performs one request and returns the response."""
+    list_obj = workspace.lists[0]
+    roots = Block.objects.filter(list=list_obj, parent_block=None).order_by('order')
+    block, anchor, other = roots[0], roots[1], roots[2]
+    created = []
+
+    def create():
+        response = client.post('/api/blocks/', {'list': list_obj.id, 'html': 'new block'}, format='json')
+        created.append(response.data['id'])
+        return response
+
+    def destroy():
+        # Deletes blocks made by the create case, so the workspace keeps its shape.
+        pk = created.pop() if created else create().data['id']
+        return client.delete(f'/api/blocks/{pk}/')
+
+    def bulk():
+        return client.post('/api/blocks/bulk/', [
+            {'id': b.id, 'order': float(i), 'is_done': bool(i % 2)} for i, b in enumerate(roots[:20])
+        ], format='json')
+
+    return {
+        'blocks.list': lambda: client.get('/api/blocks/'),
+        'blocks.list (list_id, depth=0)': lambda: client.get('/api/blocks/', {'list_id': list_obj.id, 'depth': 0}),
+        'blocks.list (page)': lambda: client.get('/api/blocks/', {'page_size': 100}),
+        'blocks.list (due=week)': lambda: client.get('/api/blocks/', {'type': 'task', 'due': 'week'}),
+        'blocks.retrieve': lambda: client.get(f'/api/blocks/{block.id}/'),
+        'blocks.create': create,
+        'blocks.partial_update': lambda: client.patch(f'/api/blocks/{other.id}/', {'html': 'edited'}, format='json'),
+        'blocks.destroy': destroy,
+        'blocks.move': lambda: client.post(f'/api/blocks/{block.id}/move/', {'after': anchor.id}, format='json'),
+        'blocks.bulk': bulk,
+        'blocks.search': lambda: client.get('/api/blocks/search/', {'q': 'budget'}),
+        'lists.list': lambda: client.get('/api/lists/'),
+        'lists.list (cold cache)': lambda: (cache.clear(), client.get('/api/lists/'))[1],
+        'lists.retrieve': lambda: client.get(f'/api/lists/{list_obj.id}/'),
+        'lists.create': lambda: client.post('/api/lists/', {'title': 'New'}, format='json'),
+        'lists.partial_update': lambda: client.patch(f'/api/lists/{list_obj.id}/', {'title': 'Renamed'}, format='json'),
+    }
+
+
+def run(scale, repeat):
+    results = {}
+    with scratch_database():
+        workspace = generate_workspace(scale)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {workspace.token}')
+        for name, request in cases(client, workspace).items():
+            response = request()
+            if response.status_code >= 400:
+                raise SystemExit(f'{name}: HTTP {response.status_code} {getattr(response, "data", "")}')
+            timing = measure(request, repeat=repeat)
+            # Counted after the warm-up, so one-off work (version rows, token cache) is excluded.
+            with CaptureQueriesContext(connection) as queries:
+                request()
+            results[name] = {'queries': len(queries), **{key: round(value, 3) for key, value in timing.items()}}
+            print(f'{name:34} queries={len(queries):<3} {format_timing(timing)}')
+    return results
+
+
+def compare(results, baseline, tolerance):
+    failures = []
+    for name, expected in baseline['results'].items():
+        actual = results.get(name)
+        if actual is None:
+            failures.append(f'{name}: missing')
+            continue
+        if actual['queries'] > expected['queries']:
+            failures.append(f'{name}: {actual["queries"]} queries (baseline {expected["queries"]})')
+        if actual['p50'] > expected['p50'] * (1 + tolerance):
+            failures.append(f'{name}: p50 {actual["p50"]:.2f}ms (baseline {expected["p50"]:.2f}ms)')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_scale_arguments(parser)
+    parser.set_defaults(lists_per_folder=3, blocks_per_list=60)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--save', type=Path, help='Write the results as a baseline file.')
+    parser.add_argument('--compare', type=Path, help='Fail if results regress against this baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed relative p50 slowdown before a case fails (default 0.5 = 50%%).')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    settings.DEBUG = False
+    scale = scale_from_args(args)
+    results = run(scale, args.repeat)
+
+    if args.save:
+        path = args.save if args.save.is_absolute() else BENCH_DIR / args.save
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({'scale': vars(scale), 'results': results}, indent=2) + '\n')
+        print(f'Saved baseline to {path}')
+
+    if args.compare:
+        path = args.compare if args.compare.is_absolute() else BENCH_DIR / args.compare
+        baseline = json.loads(path.read_text())
+        if baseline['scale'] != vars(scale):
+            sys.exit(f'Baseline was recorded at a different scale: {baseline["scale"]}')
+        failures = compare(results, baseline, args.tolerance)
+        for failure in failures:
+            print(f'REGRESSION {failure}')
+        if failures:
+            sys.exit(1)
+        print(f'No regressions against {path}')
+
+
+if __name__ == '__main__':
+    main()
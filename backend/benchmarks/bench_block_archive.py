@@ -0,0 +1,104 @@
+"""
+Hot read latency as finished tasks pile up, with and without the archive.
+
+    python benchmarks/bench_block_archive.py --history 20000 --steps 4
+    python benchmarks/bench_block_archive.py --blocks-per-list 200 --repeat 50
+
+Generates a workspace (see ``generate.py``), then adds ``--history`` done
+tasks (each with a done subtask) aged past ``BLOCK_ARCHIVE_AFTER_DAYS``,
+``--steps`` times, timing the everyday reads after each step. It then runs
+``api.archive.archive_blocks`` and times the reads again: with the history
+in the archive table they should cost what they did before it existed.
+"""
+
+import argparse
+import time
+from datetime import timedelta
+
+from common import format_timing, measure, scratch_database
+from generate import add_scale_arguments, generate_workspace, scale_from_args
+
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.archive import archive_after, archive_blocks
+from api.models import ArchivedBlock, Block, ChangeVersion
+from api.ordering import ORDER_STEP
+from api.tree import fill_paths
+
+
+def add_history(user, lists, count):
+    """``count`` done tasks with one done subtask each, spread over ``lists`` and aged past the archive cutoff."""
+    per_list = max(1, count // len(lists))
+    aged = timezone.now() - archive_after() - timedelta(days=1)
+    created = []
+    for list_obj in lists:
+        start = Block.objects.filter(list=list_obj, parent_block=None).count() + 1
+        tasks = Block.objects.bulk_create(
+            (Block(user=user, list=list_obj, type='task-done', is_done=True, html=f'- [x] old task {i}',
+                   order=(start + i) * ORDER_STEP) for i in range(per_list)),
+            batch_size=2000,
+        )
+        fill_paths(tasks)
+        subtasks = Block.objects.bulk_create(
+            (Block(user=user, list=list_obj, parent_block=task, type='task-done', is_done=True,
+                   html='- [x] old subtask', order=ORDER_STEP) for task in tasks),
+            batch_size=2000,
+        )
+        fill_paths(subtasks)
+        created += tasks + subtasks
+    ids = [block.id for block in created]
+    for start in range(0, len(ids), 500):
+        Block.objects.filter(id__in=ids[start:start + 500]).update(updated_at=aged)
+    return len(created)
+
+
+def cases(client, workspace):
+    list_obj = workspace.lists[0]
+    return {
+        'blocks (list_id, depth=0)': lambda: client.get('/api/blocks/', {'list_id': list_obj.id, 'depth': 0}),
+        'blocks (list_id)': lambda: client.get('/api/blocks/', {'list_id': list_obj.id}),
+        'blocks (due=week)': lambda: client.get('/api/blocks/', {'due': 'week'}),
+        'agenda/stats': lambda: client.get('/api/agenda/stats/'),
+    }
+
+
+def report(label, requests, repeat):
+    print(f'{label}: {Block.objects.count()} blocks in api_block, {ArchivedBlock.objects.count()} archived')
+    for name, request in requests.items():
+        print(f'  {name:<28} {format_timing(measure(request, repeat=repeat))}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_scale_arguments(parser)
+    parser.add_argument('--history', type=int, default=10000, help='Done blocks added per step.')
+    parser.add_argument('--steps', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    args.users = 1
+
+    setup_test_environment()
+    with scratch_database():
+        workspace = generate_workspace(scale_from_args(args))
+        ChangeVersion.objects.get_or_create(user=workspace.user)
+        client = APIClient()
+        client.force_authenticate(workspace.user)
+        requests = cases(client, workspace)
+
+        report('fresh workspace', requests, args.repeat)
+        history = 0
+        for _ in range(args.steps):
+            history += add_history(workspace.user, workspace.lists, args.history)
+            report(f'+{history} done blocks', requests, args.repeat)
+
+        start = time.perf_counter()
+        subtrees, blocks = archive_blocks()
+        seconds = time.perf_counter() - start
+        print(f'archive_blocks: {blocks} blocks in {subtrees} subtrees, {seconds:.2f}s ({blocks / seconds:.0f} blocks/s)')
+        report('after archiving', requests, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Payload size and response time of GET /api/blocks/ with and without ?fields=/?depth=.
+
+    python benchmarks/bench_block_fields.py --blocks 5000
+"""
+
+import argparse
+import random
+
+from common import format_timing, measure, scratch_database
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test.utils import setup_test_environment
+from rest_framework.test import APIClient
+
+from api.models import Block, List, Tag
+
+User = get_user_model()
+
+CASES = {
+    'full tree': {},
+    'list map (id, list, type)': {'fields': 'id,list,type', 'depth': '0'},
+    'calendar (id, html, type, due_date)': {'fields': 'id,html,type,due_date', 'depth': '0'},
+    'one level of children': {'depth': '1'},
+}
+
+
+def seed(total):
+    rng = random.Random(0)
+    user = User.objects.create_user(email='bench@example.com', password='bench')
+    lists = List.objects.bulk_create(List(user=user, title=f'List {i}') for i in range(20))
+    tags = Tag.objects.bulk_create(Tag(user=user, name=f'tag{i}') for i in range(10))
+    blocks = Block.objects.bulk_create(
+        Block(user=user, list=rng.choice(lists), html=f'<p>block {i} ' + 'lorem ipsum ' * 10 + '</p>',
+              type=rng.choice(['text', 'task', 'note']), order=i)
+        for i in range(total)
+    )
+    # Nest half of the blocks under earlier ones, a few levels deep.
+    for i, block in enumerate(blocks[total // 2:], start=total // 2):
+        block.parent_block_id = blocks[rng.randrange(i)].id
+    Block.objects.bulk_update(blocks, ['parent_block'], batch_size=2000)
+    Block.tags.through.objects.bulk_create(
+        Block.tags.through(block_id=block.id, tag_id=rng.choice(tags).id) for block in blocks[::3]
+    )
+    return user
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--blocks', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    settings.DEBUG = False
+    with scratch_database():
+        client = APIClient()
+        client.force_authenticate(seed(args.blocks))
+        for name, params in CASES.items():
+            size = len(client.get('/api/blocks/', params).content)
+            timing = measure(lambda: client.get('/api/blocks/', params), repeat=args.repeat, warmup=1)
+            print(f'{name:38} {size / 1024:9.0f} KiB  {format_timing(timing)}')
+
+
+if __name__ == '__main__':
+    main()
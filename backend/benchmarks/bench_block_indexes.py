@@ -0,0 +1,100 @@
+"""
+Compare Block query plans and timings with and without the composite indexes.
+
+    python benchmarks/bench_block_indexes.py --blocks 100000
+"""
+
+import argparse
+import random
+from datetime import timedelta
+
+from common import format_timing, measure, scratch_database
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from api.models import Block, List
+
+User = get_user_model()
+
+
+def seed(total, lists):
+    user = User.objects.create_user(email='bench@example.com', password='bench')
+    list_objs = List.objects.bulk_create(List(user=user, title=f'List {i}') for i in range(lists))
+    now = timezone.now()
+    rng = random.Random(0)
+
+    roots = []
+    batch = []
+    for i in range(total):
+        block_type = rng.choice(['text', 'text', 'task', 'task-done', 'note', 'heading1'])
+        batch.append(Block(
+            user=user,
+            list=rng.choice(list_objs),
+            html=f'block {i}',
+            type=block_type,
+            order=i,
+            due_date=now + timedelta(hours=rng.randint(-720, 720)) if block_type == 'task' else None,
+            is_pinned=rng.random() < 0.01,
+        ))
+        if len(batch) == 5000:
+            roots += Block.objects.bulk_create(batch)
+            batch = []
+    roots += Block.objects.bulk_create(batch)
+
+    # Nest a quarter of the blocks under earlier blocks of the same list.
+    children = rng.sample(roots[len(roots) // 4:], len(roots) // 4)
+    for child in children:
+        child.parent_block_id = roots[rng.randrange(len(roots) // 4)].id
+    Block.objects.bulk_update(children, ['parent_block'], batch_size=5000)
+    return user, list_objs
+
+
+def queries(user, list_objs):
+    parent = Block.objects.filter(user=user, child_blocks__isnull=False).first()
+    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        'list blocks': lambda: Block.objects.filter(user=user, list=list_objs[0]).order_by('order'),
+        'children': lambda: Block.objects.filter(user=user, parent_block=parent).order_by('order'),
+        'tasks due today': lambda: Block.objects.filter(
+            user=user, type='task', due_date__gte=today, due_date__lt=today + timedelta(days=1)),
+        'pinned': lambda: Block.objects.filter(user=user, is_pinned=True).order_by('order'),
+    }
+
+
+def run(label, connection, cases, repeat):
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    print(f'\n== {label} ==')
+    for name, make_queryset in cases.items():
+        print(f'-- {name}')
+        print('   ' + make_queryset().explain().replace('\n', '\n   '))
+        # Fetch ids only so the timing reflects the query rather than model instantiation.
+        timing = measure(lambda: list(make_queryset().values_list('id', flat=True)), repeat=repeat)
+        print('   ' + format_timing(timing))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--blocks', type=int, default=100_000)
+    parser.add_argument('--lists', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with scratch_database() as connection:
+        user, list_objs = seed(args.blocks, args.lists)
+        cases = queries(user, list_objs)
+
+        with connection.schema_editor() as editor:
+            for index in Block._meta.indexes:
+                editor.remove_index(Block, index)
+        run('without composite indexes', connection, cases, args.repeat)
+
+        with connection.schema_editor() as editor:
+            for index in Block._meta.indexes:
+                editor.add_index(Block, index)
+        run('with composite indexes', connection, cases, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Repeatedly insert blocks at the same position and report latency and rebalances.
+
+    python benchmarks/bench_block_ordering.py --inserts 5000 --siblings 1000
+"""
+
+import argparse
+import time
+
+from common import format_timing, percentile, scratch_database
+
+from django.contrib.auth import get_user_model
+
+from api import ordering
+from api.models import Block, List
+
+User = get_user_model()
+
+
+def naive_midpoint_inserts():
+    """How many midpoint inserts at one position fit between two floats spaced 1 apart."""
+    before, after, count = 1.0, 2.0, 0
+    while before < (before + after) / 2 < after:
+        after = (before + after) / 2
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--inserts', type=int, default=5000)
+    parser.add_argument('--siblings', type=int, default=1000, help='Existing blocks in the sibling group.')
+    args = parser.parse_args()
+
+    print(f'naive midpoint ordering collides after {naive_midpoint_inserts()} inserts at one position')
+
+    rebalances = []
+    original = ordering.rebalance
+
+    def counting_rebalance(siblings):
+        start = time.perf_counter()
+        rows = original(siblings)
+        rebalances.append(((time.perf_counter() - start) * 1000, rows))
+        return rows
+
+    ordering.rebalance = counting_rebalance
+
+    with scratch_database():
+        user = User.objects.create_user(email='bench@example.com', password='bench')
+        list_obj = List.objects.create(user=user, title='List')
+        Block.objects.bulk_create(
+            Block(user=user, list=list_obj, order=(i + 1) * ordering.ORDER_STEP) for i in range(args.siblings)
+        )
+        anchor = Block.objects.filter(list=list_obj).order_by('order')[args.siblings // 2]
+        siblings = ordering.sibling_blocks(user, list_obj.id, None)
+
+        samples = []
+        for _ in range(args.inserts):
+            start = time.perf_counter()
+            order = ordering.order_after(siblings, anchor)
+            Block.objects.create(user=user, list=list_obj, order=order)
+            samples.append((time.perf_counter() - start) * 1000)
+
+        orders = list(siblings.order_by('order', 'id').values_list('order', flat=True))
+        assert not ordering.needs_rebalance(orders), 'sibling orders collided'
+
+    total = sum(samples)
+    print(f'{args.inserts} inserts after one anchor in a group of {args.siblings}: {total:.0f}ms total')
+    print('per insert: ' + format_timing({
+        'p50': percentile(samples, 50), 'p95': percentile(samples, 95), 'max': max(samples),
+    }))
+    if rebalances:
+        times = [ms for ms, _ in rebalances]
+        print(f'{len(rebalances)} rebalances, {sum(rows for _, rows in rebalances)} rows rewritten, '
+              f'p50={percentile(times, 50):.2f}ms max={max(times):.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare block search through the FTS5 index with a naive icontains scan of Block.html.
+
+    python benchmarks/bench_block_search.py --blocks 100000
+"""
+
+import argparse
+import random
+import time
+
+from common import format_timing, measure, scratch_database
+
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from api.models import Block
+from api.search import index_blocks, search_blocks
+
+User = get_user_model()
+
+COMMON = (
+    'budget review meeting draft launch roadmap invoice travel offsite hiring design sprint '
+    'report customer feedback release migration backlog retro planning quarterly analytics'
+).split()
+SYLLABLES = ['ka', 'ro', 'mi', 'sen', 'tal', 'vu', 'per', 'lo', 'dan', 'ex', 'qui', 'zo']
+
+
+def vocabulary(rng, size=20000):
+    rare = {''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(size)}
+    return COMMON + sorted(rare)
+
+
+def seed(total, rng):
+    user = User.objects.create_user(email='bench@example.com', password='bench')
+    words = vocabulary(rng)
+    # Zipf-like: a few words are everywhere, most are rare, as in real notes.
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    batch = []
+    for i in range(total):
+        words_in_block = ' '.join(rng.choices(words, weights, k=rng.randint(4, 20)))
+        batch.append(Block(user=user, html=f'<p>{words_in_block}</p><p>item <b>{i}</b></p>', order=i))
+        if len(batch) == 5000:
+            Block.objects.bulk_create(batch)
+            batch = []
+    Block.objects.bulk_create(batch)
+    return user
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--blocks', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    with scratch_database():
+        user = seed(args.blocks, rng)
+        blocks = list(Block.objects.only('pk', 'user_id', 'html'))
+        start = time.perf_counter()
+        for i in range(0, len(blocks), 5000):
+            index_blocks(blocks[i:i + 5000])
+        print(f'indexed {len(blocks)} blocks in {time.perf_counter() - start:.2f}s')
+
+        for query in ['budget', 'budget travel', 'kasen', 'dantal roex']:
+            terms = query.split()
+            naive = Block.objects.filter(user=user)
+            for term in terms:
+                naive = naive.filter(Q(html__icontains=term))
+            print(f'-- {query!r} ({naive.count()} matching blocks)')
+            print('   icontains  ' + format_timing(measure(
+                lambda: list(naive.order_by('-updated_at')[:20].values_list('id', flat=True)), repeat=args.repeat)))
+            print('   fts5       ' + format_timing(measure(
+                lambda: search_blocks(user, query, 20), repeat=args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
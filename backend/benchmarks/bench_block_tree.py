@@ -0,0 +1,133 @@
+"""
+Subtree reads, moves and deletes on deep and wide block trees.
+
+    python benchmarks/bench_block_tree.py --depth 60 --width 10000
+    python benchmarks/bench_block_tree.py --only deep --repeat 50
+
+Two trees are generated: a chain ``--depth`` levels deep (every level also
+has ``--fanout`` leaf siblings) and a root with ``--width`` direct children.
+For each, the script reports latency and query counts for reading the whole
+subtree through ``GET /api/blocks/{id}/``, moving it under another block and
+back with ``POST /api/blocks/{id}/move/``, and deleting it with
+``DELETE /api/blocks/{id}/``. Reads are also timed with the level-by-level
+walk the paths replaced, and deletes with the ORM's cascade, for comparison.
+"""
+
+import argparse
+import time
+
+from common import format_timing, measure, scratch_database
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import setup_test_environment
+from rest_framework.test import APIClient
+
+from api.instrumentation import QueryRecorder
+from api.models import Block, ChangeVersion, List
+from api.ordering import ORDER_STEP
+from api.serializers import descendants_by_level, descendants_by_path
+from api.tree import fill_paths
+
+User = get_user_model()
+
+
+def build_deep(user, list_obj, depth, fanout):
+    """A chain of ``depth`` blocks, each level with ``fanout`` extra leaves; returns the root."""
+    root = parent = None
+    for level in range(depth):
+        blocks = Block.objects.bulk_create(
+            Block(user=user, list=list_obj if parent is None else None, parent_block=parent,
+                  html=f'<p>level {level} item {i}</p>', order=(i + 1) * ORDER_STEP)
+            for i in range(fanout + 1)
+        )
+        fill_paths(blocks)
+        root = root or blocks[0]
+        parent = blocks[0]
+    return Block.objects.get(id=root.id)
+
+
+def build_wide(user, list_obj, width):
+    """A root with ``width`` children; returns the root."""
+    root = Block.objects.create(user=user, list=list_obj, html='<p>wide root</p>')
+    children = Block.objects.bulk_create(
+        (Block(user=user, parent_block=root, html=f'<p>child {i}</p>', order=(i + 1) * ORDER_STEP)
+         for i in range(width)),
+        batch_size=2000,
+    )
+    fill_paths(children)
+    return root
+
+
+def timed_once(fn):
+    """``(milliseconds, queries)`` of one call."""
+    recorder = QueryRecorder()
+    start = time.perf_counter()
+    with connection.execute_wrapper(recorder):
+        fn()
+    return (time.perf_counter() - start) * 1000, recorder.count
+
+
+def report(name, fn, repeat):
+    _, count = timed_once(fn)
+    print(f'  {name:<34} {format_timing(measure(fn, repeat=repeat, warmup=1))}  queries={count}')
+
+
+def bench_tree(name, build, client, user, list_obj, repeat):
+    root = build()
+    size = Block.objects.filter(user=user).count()
+    target = Block.objects.create(user=user, list=list_obj, html='<p>move target</p>')
+    print(f'{name}: {size} blocks')
+
+    def read():
+        response = client.get(f'/api/blocks/{root.id}/')
+        assert response.status_code == 200, response.status_code
+
+    def move():
+        for parent in (target.id, None):
+            response = client.post(
+                f'/api/blocks/{root.id}/move/', {'after': None, 'parent_block': parent}, format='json')
+            assert response.status_code == 200, response.data
+
+    base = Block.objects.order_by('order', 'id').prefetch_related('tags')
+    report('GET subtree', read, repeat)
+    report('load descendants (path ranges)', lambda: list(descendants_by_path(base, user.id, [root.path])), repeat)
+    report('load descendants (per level)',
+           lambda: list(descendants_by_level(base, Block.objects.filter(id=root.id))), repeat)
+    report('move subtree and back', move, repeat)
+
+    ms, count = timed_once(lambda: client.delete(f'/api/blocks/{root.id}/'))
+    print(f'  {"DELETE subtree":<34} {ms:.2f}ms  queries={count}')
+    root = build()
+    ms, count = timed_once(lambda: Block.objects.filter(id=root.id).delete())
+    print(f'  {"ORM cascade delete (for reference)":<34} {ms:.2f}ms  queries={count}')
+    Block.objects.filter(user=user).delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--depth', type=int, default=60)
+    parser.add_argument('--fanout', type=int, default=3, help='Leaf siblings per level of the deep tree.')
+    parser.add_argument('--width', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--only', choices=['deep', 'wide'])
+    args = parser.parse_args()
+
+    setup_test_environment()
+    with scratch_database():
+        user = User.objects.create_user(email='bench@example.com', password='bench')
+        ChangeVersion.objects.create(user=user)
+        list_obj = List.objects.create(user=user, title='List')
+        client = APIClient()
+        client.force_authenticate(user)
+        trees = {
+            'deep': (f'deep ({args.depth} levels)', lambda: build_deep(user, list_obj, args.depth, args.fanout)),
+            'wide': (f'wide ({args.width} children)', lambda: build_wide(user, list_obj, args.width)),
+        }
+        for key in [args.only] if args.only else trees:
+            name, build = trees[key]
+            bench_tree(name, build, client, user, list_obj, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Compare the WSGI and ASGI deployments under many concurrent, slow clients.
+
+    python benchmarks/bench_concurrency.py --connections 500 --seconds 20
+    python benchmarks/bench_concurrency.py --only asgi --trickle 0
+
+Both servers run one worker process against the same generated SQLite
+database (a temporary file): gunicorn with ``--threads`` threads for
+``config.wsgi``, and uvicorn for ``config.asgi``, which routes the hot reads
+to the async views. Each of ``--connections`` clients keeps one HTTP/1.1
+connection open and loops over the sidebar and block reads the frontend
+makes. Clients are slow: every request is sent in two parts ``--trickle``
+seconds apart, as from a slow mobile link. A thread-per-request server
+holds a thread for that time; an event loop does not.
+
+The ASGI run needs uvicorn (``pip install uvicorn``).
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import BACKEND_DIR, percentile
+
+PATHS = ['/api/lists/', '/api/folders/', '/api/tags/', '/api/agenda/stats/', '/api/blocks/?depth=0&list_id={list_id}']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(path, blocks_per_list):
+    """Migrate a fresh database at ``path`` and fill it; returns ``(token, list_ids)``."""
+    env = {**os.environ, 'DB_PROFILE': 'sqlite', 'DB_NAME': str(path)}
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=BACKEND_DIR, env=env, check=True)
+    token = subprocess.run(
+        [sys.executable, 'benchmarks/generate.py', '--blocks-per-list', str(blocks_per_list)],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout.split()[0]
+    list_ids = subprocess.run(
+        [sys.executable, 'manage.py', 'shell', '-c',
+         'from api.models import List; print(*List.objects.values_list("id", flat=True))'],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout.split()
+    return token, list_ids
+
+
+def server_command(kind, port, threads):
+    if kind == 'wsgi':
+        return ['gunicorn', 'config.wsgi', '--workers', '1', '--threads', str(threads),
+                '--bind', f'127.0.0.1:{port}', '--backlog', '4096', '--log-level', 'warning']
+    return ['uvicorn', 'config.asgi:application', '--workers', '1', '--port', str(port),
+            '--backlog', '4096', '--log-level', 'warning', '--no-access-log']
+
+
+def start_server(kind, port, threads, database):
+    command = server_command(kind, port, threads)
+    if not shutil.which(command[0]):
+        sys.exit(f'{command[0]} is not installed.')
+    env = {**os.environ, 'DB_PROFILE': 'sqlite', 'DB_NAME': str(database), 'REQUEST_LOG_LEVEL': 'ERROR'}
+    env.pop('API_ASYNC_READS', None)  # config/asgi.py turns it on for the ASGI server
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    sys.exit(f'{kind} server did not start.')
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n'):
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':', 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def client(port, token, list_ids, deadline, trickle, timeout, stats, seed):
+    rng = random.Random(seed)
+    reader = writer = None
+    while time.monotonic() < deadline:
+        path = rng.choice(PATHS).format(list_id=rng.choice(list_ids))
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'.encode())
+            await writer.drain()
+            await asyncio.sleep(trickle)
+            writer.write(f'Authorization: Token {token}\r\nAccept: application/json\r\n\r\n'.encode())
+            await writer.drain()
+            status = await asyncio.wait_for(read_response(reader), timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as error:
+            stats['errors'][type(error).__name__] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        stats['latencies'].append((time.perf_counter() - start) * 1000)
+        stats['statuses'][status] += 1
+    if writer is not None:
+        writer.close()
+
+
+async def drive(port, token, list_ids, connections, seconds, trickle, timeout):
+    stats = {'latencies': [], 'statuses': Counter(), 'errors': Counter()}
+    deadline = time.monotonic() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(port, token, list_ids, deadline, trickle, timeout, stats, seed) for seed in range(connections)
+    ))
+    stats['elapsed'] = time.perf_counter() - started
+    return stats
+
+
+def report(kind, stats):
+    latencies = stats['latencies']
+    ok = sum(count for status, count in stats['statuses'].items() if status < 400)
+    line = f'{kind:5} {ok / stats["elapsed"]:8.1f} req/s  ok={ok}'
+    if latencies:
+        line += ''.join(f'  p{pct}={percentile(latencies, pct):.0f}ms' for pct in (50, 95, 99))
+    errors = dict(stats['errors']) | {f'HTTP {s}': n for s, n in stats['statuses'].items() if s >= 400}
+    print(line + (f'  errors={errors}' if errors else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--trickle', type=float, default=0.2, help='Seconds between the two halves of a request.')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout, seconds.')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads for the WSGI worker.')
+    parser.add_argument('--blocks-per-list', type=int, default=50)
+    parser.add_argument('--only', choices=['wsgi', 'asgi'])
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='flist-concurrency-'))
+    try:
+        database = workdir / 'bench.sqlite3'
+        token, list_ids = prepare_database(database, args.blocks_per_list)
+        for kind in [args.only] if args.only else ['wsgi', 'asgi']:
+            port = free_port()
+            server = start_server(kind, port, args.threads, database)
+            try:
+                stats = asyncio.run(drive(
+                    port, token, list_ids, args.connections, args.seconds, args.trickle, args.timeout))
+            finally:
+                server.terminate()
+                server.wait(10)
+            report(kind, stats)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Render time and bytes on the wire for large block trees.
+
+    python benchmarks/bench_json_render.py --blocks-per-list 2000
+    python benchmarks/bench_json_render.py --max-depth 6 --repeat 20
+
+Takes the data of ``GET /api/blocks/`` (every block with its subtree) for a
+generated workspace (see ``generate.py``) once, then reports:
+
+* render time with DRF's ``JSONRenderer`` and with ``FastJSONRenderer``
+  (orjson, if installed), and parse time of the result with ``JSONParser``
+  and ``FastJSONParser``;
+* the size of that body as sent, gzip-compressed and brotli-compressed (if
+  the ``brotli`` package is installed) at the levels ``CompressionMiddleware``
+  uses, with the time each compression takes;
+* ``GET /api/blocks/`` end to end, without and with ``Accept-Encoding``.
+"""
+
+import argparse
+import io
+import logging
+
+from common import format_timing, measure, scratch_database
+from generate import add_scale_arguments, generate_workspace, scale_from_args
+
+from django.test.utils import setup_test_environment
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api import compression, parsers, renderers
+from api.models import ChangeVersion
+
+
+def report(name, fn, repeat):
+    print(f'  {name:<30} {format_timing(measure(fn, repeat=repeat, warmup=1))}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_scale_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    args.users = 1
+
+    setup_test_environment()
+    with scratch_database():
+        workspace = generate_workspace(scale_from_args(args))
+        ChangeVersion.objects.get_or_create(user=workspace.user)
+        client = APIClient()
+        client.force_authenticate(workspace.user)
+        # Every request here is slow enough to be logged; keep the report readable.
+        logging.getLogger('api.requests').setLevel(logging.ERROR)
+        data = client.get('/api/blocks/').data
+        body = JSONRenderer().render(data)
+        print(f'workspace: {len(workspace.blocks)} blocks, {len(body) / 2 ** 20:.2f} MiB of JSON')
+        if renderers.orjson is None:
+            print('  (orjson is not installed; the fast renderer and parser fall back to the stdlib)')
+        assert renderers.FastJSONRenderer().render(data) == body
+
+        print('render / parse')
+        report('JSONRenderer', lambda: JSONRenderer().render(data), args.repeat)
+        report('FastJSONRenderer', lambda: renderers.FastJSONRenderer().render(data), args.repeat)
+        report('JSONParser', lambda: JSONParser().parse(io.BytesIO(body)), args.repeat)
+        report('FastJSONParser', lambda: parsers.FastJSONParser().parse(io.BytesIO(body)), args.repeat)
+
+        print('bytes on the wire')
+        print(f'  {"identity":<30} {len(body):>10} bytes')
+        codings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+        for coding in codings:
+            compress = lambda: compression.STREAMS[coding]().finish(body)  # noqa: E731
+            size = len(compress())
+            print(f'  {coding:<30} {size:>10} bytes ({size / len(body):.1%})  '
+                  f'{format_timing(measure(compress, repeat=args.repeat, warmup=1))}')
+        if compression.brotli is None:
+            print('  (brotli is not installed)')
+
+        print('GET /api/blocks/')
+        for accept in [''] + codings:
+            response = client.get('/api/blocks/', HTTP_ACCEPT_ENCODING=accept)
+            name = f'Accept-Encoding: {accept or "(none)"}'
+            timing = measure(
+                lambda: client.get('/api/blocks/', HTTP_ACCEPT_ENCODING=accept), repeat=args.repeat, warmup=1)
+            print(f'  {name:<30} {format_timing(timing)}  {len(response.content)} bytes')
+
+
+if __name__ == '__main__':
+    main()
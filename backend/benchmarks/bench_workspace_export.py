@@ -0,0 +1,89 @@
+"""
+Export a generated workspace as NDJSON and import it into another account.
+
+    python benchmarks/bench_workspace_export.py --blocks-per-list 10000
+    python benchmarks/bench_workspace_export.py --blocks-per-list 2000 --compare-api --memory
+
+Reports time and throughput for ``api.workspace.export_chunks`` writing to
+a file and for ``import_workspace`` reading it back. With ``--memory`` it
+reports the peak of memory allocated by Python (``tracemalloc``) instead,
+which should stay flat as ``--blocks-per-list`` grows, apart from the
+import's id mapping; tracing makes everything several times slower, so
+timings from that run are not comparable. With ``--compare-api`` the same
+is measured for ``GET /api/blocks/``, which builds the whole tree in memory.
+"""
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from common import scratch_database
+from generate import add_scale_arguments, generate_workspace, scale_from_args
+
+from django.contrib.auth import get_user_model
+from django.test.utils import setup_test_environment
+from rest_framework.test import APIClient
+
+from api.models import Block, ChangeVersion
+from api.workspace import export_chunks, import_workspace
+
+User = get_user_model()
+
+
+def run(fn, memory):
+    """``(result, seconds, summary)`` of one call; the summary is its time, or its peak traced memory with ``memory``."""
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if memory else None
+    finally:
+        tracemalloc.stop()
+    return result, seconds, f'peak={peak:.1f} MiB' if memory else f'{seconds:.2f}s'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_scale_arguments(parser)
+    parser.add_argument('--compare-api', action='store_true', help='Also measure GET /api/blocks/.')
+    parser.add_argument('--memory', action='store_true', help='Report peak traced memory instead of time.')
+    args = parser.parse_args()
+    args.users = 1
+
+    setup_test_environment()
+    with scratch_database(), tempfile.TemporaryFile() as dump:
+        workspace = generate_workspace(scale_from_args(args))
+        blocks = len(workspace.blocks)
+        del workspace.blocks
+        print(f'workspace: {blocks} blocks in {len(workspace.lists)} lists')
+
+        def export():
+            size = 0
+            for chunk in export_chunks(workspace.user):
+                dump.write(chunk)
+                size += len(chunk)
+            return size
+
+        size, seconds, summary = run(export, args.memory)
+        print(f'export  {summary}  {blocks / seconds:.0f} blocks/s  {size / 2 ** 20:.1f} MiB')
+
+        target = User.objects.create_user(email='import@example.com', password='bench')
+        dump.seek(0)
+        counts, seconds, summary = run(lambda: import_workspace(target, dump), args.memory)
+        assert counts['block'] == blocks, counts
+        print(f'import  {summary}  {blocks / seconds:.0f} blocks/s')
+        assert Block.objects.filter(user=target).count() == blocks
+
+        if args.compare_api:
+            ChangeVersion.objects.get_or_create(user=workspace.user)
+            client = APIClient()
+            client.force_authenticate(workspace.user)
+            response, _, summary = run(lambda: client.get('/api/blocks/'), args.memory)
+            print(f'GET /api/blocks/  {summary}  {len(response.content) / 2 ** 20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Shared helpers for the scripts in this directory.
+
+Benchmarks never touch the configured database: ``scratch_database`` creates a
+throwaway test database (a temporary SQLite file by default) and removes it
+afterwards.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+
+@contextmanager
+def scratch_database():
+    old_name = connection.settings_dict['NAME']
+    if connection.vendor == 'sqlite':
+        tmpdir = tempfile.mkdtemp(prefix='flist-bench-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(fn, repeat=20, warmup=2):
+    """Run ``fn`` and return latency percentiles in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'max': max(samples),
+    }
+
+
+def format_timing(timing):
+    return '  '.join(f'{key}={value:.2f}ms' for key, value in timing.items())
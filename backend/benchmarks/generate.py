@@ -0,0 +1,172 @@
+"""
+Generate users with realistic folder/list/block/tag trees.
+
+Used by the other benchmarks through ``generate_workspace``; run directly it
+fills the *configured* database (e.g. to load-test a local server) and prints
+one auth token per user:
+
+    python benchmarks/generate.py --users 5 --blocks-per-list 200 > tokens.txt
+
+Shapes follow what the app produces: most blocks are text, a fair share are
+tasks with due dates around today, some are notes and headings, a few are
+pinned. Blocks nest a couple of levels deep, and about a third carry tags.
+"""
+
+import argparse
+import random
+import sys
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+if __name__ == '__main__':
+    import common  # noqa: F401  (configures Django)
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api.models import Block, Folder, List, Tag
+from api.ordering import ORDER_STEP
+from api.search import index_blocks
+from api.tree import fill_paths
+
+User = get_user_model()
+
+WORDS = (
+    'plan review draft call email budget design meeting notes idea follow up launch fix write read '
+    'invoice travel book order research sync deploy test update share check prepare schedule'
+).split()
+BLOCK_TYPES = ['text'] * 10 + ['task'] * 5 + ['task-done'] * 2 + ['note'] * 2 + ['heading1']
+
+
+@dataclass
+class Scale:
+    users: int = 1
+    folders: int = 4
+    lists_per_folder: int = 5
+    loose_lists: int = 3
+    blocks_per_list: int = 100
+    max_depth: int = 3
+    tags: int = 12
+    seed: int = 0
+
+
+@dataclass
+class Workspace:
+    user: object
+    token: str
+    lists: list = field(default_factory=list)
+    blocks: list = field(default_factory=list)
+    tags: list = field(default_factory=list)
+
+
+def sentence(rng, low=3, high=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize()
+
+
+def block_html(rng, block_type):
+    text = sentence(rng)
+    if block_type == 'task':
+        return f'- [ ] {text}'
+    if block_type == 'task-done':
+        return f'- [x] {text}'
+    if block_type == 'heading1':
+        return f'<h1>{text}</h1>'
+    return f'<p>{text}</p>' + (f'<p>{sentence(rng, 10, 30)}</p>' if rng.random() < 0.3 else '')
+
+
+def generate_blocks(rng, user, list_obj, count, max_depth, now):
+    """Create ``count`` blocks in ``list_obj``, nesting one level per pass, each level in one bulk insert."""
+    created = []
+    parents = [None]
+    depth = 0
+    while len(created) < count and depth < max_depth:
+        # Roots take about half of the blocks, each deeper level half of what remains.
+        size = count - len(created) if depth == max_depth - 1 else max(1, (count - len(created)) // 2)
+        level = []
+        per_parent = {}
+        for _ in range(size):
+            parent = rng.choice(parents)
+            position = per_parent[parent] = per_parent.get(parent, 0) + 1
+            block_type = rng.choice(BLOCK_TYPES)
+            level.append(Block(
+                user=user, list=list_obj, parent_block=parent, type=block_type,
+                html=block_html(rng, block_type), order=position * ORDER_STEP,
+                due_date=now + timedelta(hours=rng.randint(-240, 720)) if block_type.startswith('task') and rng.random() < 0.7 else None,
+                is_done=block_type == 'task-done',
+                is_pinned=rng.random() < 0.01,
+            ))
+        level = Block.objects.bulk_create(level)
+        fill_paths(level)
+        created += level
+        parents = level
+        depth += 1
+    return created
+
+
+def generate_workspace(scale, index=0, rng=None):
+    """Create one user and their workspace at ``scale``; returns a ``Workspace``."""
+    rng = rng or random.Random(scale.seed + index)
+    now = timezone.now()
+    with transaction.atomic():
+        user = User.objects.create_user(email=f'bench{index}@example.com', password='bench')
+        workspace = Workspace(user=user, token=Token.objects.create(user=user).key)
+        workspace.tags = Tag.objects.bulk_create(Tag(user=user, name=f'tag-{i}') for i in range(scale.tags))
+        folders = Folder.objects.bulk_create(Folder(user=user, title=f'Folder {i}') for i in range(scale.folders))
+        workspace.lists = List.objects.bulk_create(
+            [List(user=user, folder=folder, title=sentence(rng, 1, 3), sort_order=i)
+             for folder in folders for i in range(scale.lists_per_folder)]
+            + [List(user=user, title=sentence(rng, 1, 3), sort_order=i) for i in range(scale.loose_lists)]
+        )
+        for list_obj in workspace.lists:
+            workspace.blocks += generate_blocks(rng, user, list_obj, scale.blocks_per_list, scale.max_depth, now)
+
+        through = Block.tags.through
+        if workspace.tags:
+            through.objects.bulk_create(
+                (through(block_id=block.id, tag_id=tag.id)
+                 for block in workspace.blocks if rng.random() < 0.33
+                 for tag in rng.sample(workspace.tags, rng.randint(1, min(3, len(workspace.tags))))),
+                batch_size=2000,
+            )
+        # bulk_create bypasses post_save, so index the new blocks for search explicitly.
+        for start in range(0, len(workspace.blocks), 2000):
+            index_blocks(workspace.blocks[start:start + 2000])
+    return workspace
+
+
+def generate(scale):
+    rng = random.Random(scale.seed)
+    return [generate_workspace(scale, index, rng) for index in range(scale.users)]
+
+
+def add_scale_arguments(parser):
+    defaults = Scale()
+    parser.add_argument('--users', type=int, default=defaults.users)
+    parser.add_argument('--folders', type=int, default=defaults.folders)
+    parser.add_argument('--lists-per-folder', type=int, default=defaults.lists_per_folder)
+    parser.add_argument('--loose-lists', type=int, default=defaults.loose_lists)
+    parser.add_argument('--blocks-per-list', type=int, default=defaults.blocks_per_list)
+    parser.add_argument('--max-depth', type=int, default=defaults.max_depth)
+    parser.add_argument('--tags', type=int, default=defaults.tags)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+
+
+def scale_from_args(args):
+    return Scale(**{name: getattr(args, name) for name in Scale.__dataclass_fields__})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    if User.objects.filter(email='bench0@example.com').exists():
+        sys.exit('Benchmark users already exist in this database.')
+    for workspace in generate(scale_from_args(args)):
+        print(workspace.token)
+    print(f'Created {args.users} users.', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Concurrent load driver for a running server, in the spirit of locust.
+
+    python benchmarks/generate.py --users 10 > /tmp/tokens.txt
+    gunicorn config.wsgi --workers 4 &
+    python benchmarks/load_driver.py --tokens /tmp/tokens.txt --users 40 --seconds 60
+
+Each simulated user picks one of the tokens and loops over weighted tasks
+(``TASKS``), waiting a random think time in between, the way a client
+session would. Results are per-task request counts, failures, and latency
+percentiles, plus overall requests/sec. Uses only the standard library, so
+it runs from any machine that can reach the server.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+TASKS = [
+    # (name, weight, callable(session) -> (method, path, body))
+    ('lists', 10, lambda s: ('GET', '/api/lists/', None)),
+    ('folders', 5, lambda s: ('GET', '/api/folders/', None)),
+    ('list blocks', 20, lambda s: ('GET', f'/api/blocks/?list_id={s.list_id()}&depth=0', None)),
+    ('agenda', 5, lambda s: ('GET', '/api/agenda/', None)),
+    ('stats', 3, lambda s: ('GET', '/api/agenda/stats/', None)),
+    ('search', 3, lambda s: ('GET', f'/api/blocks/search/?q={s.rng.choice(["plan", "budget", "review"])}', None)),
+    ('sync', 5, lambda s: ('GET', f'/api/sync/?since={s.cursor}' if s.cursor else '/api/sync/', None)),
+    ('create block', 8, lambda s: ('POST', '/api/blocks/', {'list': s.list_id(), 'html': 'load test'})),
+    ('edit block', 8, lambda s: ('PATCH', f'/api/blocks/{s.block_id()}/', {'html': 'edited under load'})),
+    ('reorder', 3, lambda s: ('POST', '/api/blocks/bulk/', [
+        {'id': pk, 'order': float(i)} for i, pk in enumerate(s.rng.sample(s.block_ids, min(10, len(s.block_ids))))
+    ])),
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Session:
+    def __init__(self, base_url, token, rng):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.rng = rng
+        self.list_ids = []
+        self.block_ids = []
+        self.cursor = None
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers={
+            'Authorization': f'Token {self.token}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+        })
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.read()
+
+    def start(self):
+        _, body = self.request('GET', '/api/sync/')
+        snapshot = json.loads(body)
+        self.cursor = snapshot['cursor']
+        self.list_ids = [row['id'] for row in snapshot['lists']]
+        self.block_ids = [row['id'] for row in snapshot['blocks']]
+
+    def list_id(self):
+        return self.rng.choice(self.list_ids)
+
+    def block_id(self):
+        return self.rng.choice(self.block_ids)
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+
+    def record(self, name, elapsed_ms, ok):
+        with self.lock:
+            self.latencies[name].append(elapsed_ms)
+            if not ok:
+                self.failures[name] += 1
+
+
+def simulate_user(base_url, token, seed, deadline, think, stats):
+    rng = random.Random(seed)
+    session = Session(base_url, token, rng)
+    session.start()
+    names, weights = zip(*[(task[0], task[1]) for task in TASKS])
+    actions = {name: action for name, _, action in TASKS}
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, body = actions[name](session)
+        start = time.perf_counter()
+        ok = True
+        try:
+            status, payload = session.request(method, path, body)
+            if name == 'sync':
+                session.cursor = json.loads(payload)['cursor']
+        except (urllib.error.URLError, TimeoutError, ConnectionError):
+            ok = False
+        stats.record(name, (time.perf_counter() - start) * 1000, ok)
+        time.sleep(rng.uniform(0, think))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--tokens', required=True, help='File with one auth token per line (see generate.py).')
+    parser.add_argument('--users', type=int, default=20, help='Concurrent simulated users.')
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--think', type=float, default=0.5, help='Max think time between requests, seconds.')
+    args = parser.parse_args()
+
+    with open(args.tokens) as handle:
+        tokens = [line.strip() for line in handle if line.strip()]
+    stats = Stats()
+    deadline = time.monotonic() + args.seconds
+    threads = [
+        threading.Thread(target=simulate_user, args=(args.url, tokens[i % len(tokens)], i, deadline, args.think, stats))
+        for i in range(args.users)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(samples) for samples in stats.latencies.values())
+    print(f'{"task":14} {"reqs":>7} {"fails":>6} {"p50":>9} {"p95":>9} {"p99":>9}')
+    for name, samples in sorted(stats.latencies.items()):
+        print(f'{name:14} {len(samples):7} {stats.failures[name]:6} '
+              + ' '.join(f'{percentile(samples, pct):7.1f}ms' for pct in (50, 95, 99)))
+    print(f'{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s, '
+          f'{sum(stats.failures.values())} failures')
+
+
+if __name__ == '__main__':
+    main()
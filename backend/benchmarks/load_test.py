@@ -0,0 +1,131 @@
+"""
+Hammer the API from concurrent threads and report requests/sec and lock errors.
+
+    python benchmarks/load_test.py --threads 16 --seconds 10
+    python benchmarks/load_test.py --untuned        # SQLite without the profile's PRAGMAs
+    DB_PROFILE=postgres python benchmarks/load_test.py
+
+Requests go through Django's WSGI handler in-process (no HTTP server), so the
+numbers isolate the application and database layers. Each thread uses its own
+database connection, as it would under a threaded server. The mix is 70%
+reads (block tree, lists) and 30% writes (block create, bulk reorder).
+"""
+
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+
+from common import percentile, scratch_database
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, close_old_connections, connection
+from django.test.utils import setup_test_environment
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.models import Block, List
+
+User = get_user_model()
+
+
+def seed(users, blocks_per_user):
+    tokens = []
+    for i in range(users):
+        user = User.objects.create_user(email=f'load{i}@example.com', password='load')
+        list_obj = List.objects.create(user=user, title='Load')
+        Block.objects.bulk_create(
+            Block(user=user, list=list_obj, html=f'block {j}', order=j) for j in range(blocks_per_user)
+        )
+        tokens.append((Token.objects.create(user=user).key, list_obj.id))
+    return tokens
+
+
+def worker(token, list_id, deadline, write_ratio, seed_value, stats, latencies):
+    rng = random.Random(seed_value)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+    counts = Counter()
+    samples = []
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if rng.random() >= write_ratio:
+                    path = rng.choice(['/api/blocks/', '/api/lists/'])
+                    response = client.get(path, {'list_id': list_id} if path == '/api/blocks/' else {})
+                elif rng.random() < 0.7:
+                    response = client.post('/api/blocks/', {'list': list_id, 'html': 'new'}, format='json')
+                else:
+                    ids = list(Block.objects.filter(list_id=list_id).values_list('id', flat=True)[:20])
+                    rng.shuffle(ids)
+                    response = client.post('/api/blocks/bulk/', [
+                        {'id': pk, 'order': float(i)} for i, pk in enumerate(ids)
+                    ], format='json')
+                counts['ok' if response.status_code < 500 else 'error'] += 1
+            except OperationalError as exc:
+                counts['locked' if 'locked' in str(exc) else 'error'] += 1
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        connection.close()
+    with stats['lock']:
+        stats['counts'].update(counts)
+        latencies.extend(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=4, help='Threads are spread over this many users.')
+    parser.add_argument('--blocks', type=int, default=200, help='Blocks seeded per user.')
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--untuned', action='store_true',
+                        help='SQLite only: drop the profile OPTIONS (rollback journal, no IMMEDIATE, 5s timeout).')
+    args = parser.parse_args()
+
+    setup_test_environment()  # allows the test client's host
+    settings.DEBUG = False  # don't accumulate connection.queries
+    if args.untuned:
+        connection.settings_dict['OPTIONS'] = {}
+    connection.settings_dict['CONN_MAX_AGE'] = None  # threads keep their connection for the whole run
+
+    with scratch_database():
+        tokens = seed(args.users, args.blocks)
+        close_old_connections()
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+            print(f'sqlite journal_mode={mode} options={connection.settings_dict["OPTIONS"]}')
+        else:
+            print(f'{connection.vendor} CONN_MAX_AGE={connection.settings_dict["CONN_MAX_AGE"]} '
+                  f'options={connection.settings_dict["OPTIONS"]}')
+
+        stats = {'lock': threading.Lock(), 'counts': Counter()}
+        latencies = []
+        deadline = time.perf_counter() + args.seconds
+        threads = [
+            threading.Thread(target=worker, args=(
+                *tokens[i % len(tokens)], deadline, args.write_ratio, i, stats, latencies))
+            for i in range(args.threads)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    counts = stats['counts']
+    total = sum(counts.values())
+    print(f'{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s, '
+          f'{counts["locked"]} lock errors, {counts["error"]} other errors')
+    if latencies:
+        print(f'latency p50={percentile(latencies, 50):.1f}ms p95={percentile(latencies, 95):.1f}ms '
+              f'p99={percentile(latencies, 99):.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
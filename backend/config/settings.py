@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +50,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
 MIDDLEWARE = [
+    'api.instrumentation.RequestMetricsMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,15 +64,83 @@ MIDDLEWARE = [
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Cached sidebar payloads (GET /api/lists/ and /api/folders/); see api/payload_cache.py.
+PAYLOAD_CACHE_ALIAS = 'default'
+PAYLOAD_CACHE_TIMEOUT = 300
+
+# Token lookups cached by CachedTokenAuthentication, in ALIAS or else in the
+# 'default' cache when it is shared between processes (not locmem). Without a
+# shared cache each process keeps its own LRU, and a revoked token stays valid
+# in other workers for up to LOCAL_TIMEOUT seconds.
+AUTH_TOKEN_CACHE = {
+    'SIZE': 1024,
+    'TIMEOUT': 60,
+    'LOCAL_TIMEOUT': 5,
+    'ALIAS': os.environ.get('AUTH_TOKEN_CACHE_ALIAS') or None,
+}
+
+# Tokens unused for AUTH_TOKEN_TTL are rejected and later removed by prune_tokens.
+# Use is recorded at most once per AUTH_TOKEN_TOUCH_INTERVAL per token.
+AUTH_TOKEN_TTL = timedelta(days=30)
+AUTH_TOKEN_TOUCH_INTERVAL = timedelta(hours=1)
+
+# Per-request timing and query counts (api/instrumentation.py). Responses get a
+# Server-Timing header with DEBUG or SERVER_TIMING; /api/metrics/ serves
+# Prometheus text when ENDPOINT is on and a TOKEN is set.
+REQUEST_METRICS = {
+    'SERVER_TIMING': os.environ.get('SERVER_TIMING') == '1',
+    'DUPLICATE_THRESHOLD': 5,
+    'SLOW_MS': 500,
+    'ENDPOINT': os.environ.get('METRICS_ENDPOINT') == '1',
+    'TOKEN': os.environ.get('METRICS_TOKEN') or None,
+}
+
+# api.requests logs one JSON line per request at INFO, and slow requests or
+# repeated queries at WARNING. Set REQUEST_LOG_LEVEL=INFO to log them all.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# Serve the hottest reads from async views (api/async_views.py). config/asgi.py
+# turns this on; under WSGI every async view would need an event loop per request.
+API_ASYNC_READS = os.environ.get('API_ASYNC_READS') == '1'
+
 ROOT_URLCONF = 'config.urls'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    # orjson when installed, DRF's stdlib encoder otherwise (see api.renderers).
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 TEMPLATES = [
@@ -93,12 +165,60 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_PROFILE selects the backend: 'sqlite' (default) or 'postgres'.
+
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'flist'),
+            'USER': os.environ.get('DB_USER', 'flist'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # Keep connections open across requests instead of reconnecting each time.
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('DB_POOL_MAX_SIZE'):
+        # psycopg's pool (needs psycopg[pool]) replaces persistent connections.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ['DB_POOL_MAX_SIZE']),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+            'OPTIONS': {
+                # Seconds a writer waits for the lock before "database is locked".
+                'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', '20')),
+                # Take the write lock at BEGIN, so a transaction that reads first
+                # cannot fail on lock upgrade.
+                'transaction_mode': 'IMMEDIATE',
+                # Run on every new connection. WAL lets readers proceed during a write.
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))};"
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+            # A file (rather than shared-cache memory) database lets concurrency
+            # tests wait on SQLite's busy timeout instead of failing immediately.
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -137,6 +257,24 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# How long deletions stay visible to /api/sync/; older cursors must resync.
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+# JSON/NDJSON responses at least this large are gzip- or brotli-compressed when
+# the client accepts it (brotli needs the optional "brotli" package).
+API_COMPRESSION_MIN_SIZE = 1024
+
+# Done blocks untouched for this long are moved to the archive table by
+# `manage.py archive_blocks` (see api.archive); run it daily.
+BLOCK_ARCHIVE_AFTER_DAYS = 90
+
+# Fan-out for /ws/changes/ events. The in-memory broker only reaches sockets
+# in the same process; use api.realtime.RedisBroker when running several workers.
+REALTIME_BROKER = 'api.realtime.InMemoryBroker'
+REALTIME_REDIS_URL = 'redis://localhost:6379/0'
+# Open sockets re-check their token before each event and at least this often.
+REALTIME_TOKEN_CHECK_SECONDS = 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
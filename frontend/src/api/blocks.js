@@ -3,11 +3,14 @@ import apiClient from './axios';
 
 const BASE_URL = "http://127.0.0.1:8000/api/blocks/";
 
-export const fetchAllBlocks = async () => {
-  const response = await apiClient.get('/blocks/');
+// Views here render flat rows, so nested child_blocks are skipped (depth=0) unless asked for.
+export const fetchAllBlocks = async (params = {}) => {
+  const response = await apiClient.get('/blocks/', { params: { depth: 0, ...params } });
   return response.data;
 };
 
+export const userTimezone = () => Intl.DateTimeFormat().resolvedOptions().timeZone;
+
 export const createBlock = async (block) => {
   const response = await apiClient.post('/blocks/', {
     ...block,
@@ -24,6 +27,11 @@ export const updateBlock = async (block) => {
   return response.data;
 };
 
+export const bulkUpdateBlocks = async (updates) => {
+  const response = await apiClient.post('/blocks/bulk/', updates);
+  return response.data;
+};
+
 export const deleteBlock = async (id) => {
   await apiClient.delete(`/blocks/${id}/`);
 };
@@ -33,10 +41,23 @@ export async function updateBlockDueDate(id, due_date) {
   return response.data;
 }
 
-export const fetchTasks = async () => {
-  const response = await apiClient.get('/blocks/');
-  const data = response.data;
-  return data.filter((b) => b.type === "task" || b.type === "task-done");
+export const fetchAgenda = async (from, to, params = {}) => {
+  const response = await apiClient.get('/agenda/', {
+    params: { from, to, tz: userTimezone(), ...params },
+  });
+  return response.data;
+};
+
+export const fetchTaskStats = async () => {
+  const response = await apiClient.get('/agenda/stats/', { params: { tz: userTimezone() } });
+  return response.data;
+};
+
+export const fetchTasks = async (params = {}) => {
+  const response = await apiClient.get('/blocks/', {
+    params: { type__in: 'task,task-done', depth: 0, ...params },
+  });
+  return response.data;
 };
 
 export const createTask = async (text) => {
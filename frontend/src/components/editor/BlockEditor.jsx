@@ -37,7 +37,7 @@ export default function BlockEditor({
   hideTitle = false,
   compact = false,
 }) {
-  const { blocks, setBlocks, loadBlocks, saveBlock, updateBlock, deleteBlock } =
+  const { blocks, setBlocks, loadBlocks, saveBlock, updateBlock, reorderBlocks, deleteBlock } =
     useBlocks(listId, parentBlockId);
 
   const [editingBlockId, setEditingBlockId] = useState(null);
@@ -224,7 +224,7 @@ export default function BlockEditor({
       const newBlocks = arrayMove(blocks, oldIndex, newIndex);
       const updated = newBlocks.map((b, i) => ({ ...b, order: i * 100 }));
       setBlocks(updated);
-      updated.forEach((b) => updateBlock?.(b));
+      reorderBlocks(updated);
     }
   };
 
@@ -1,7 +1,7 @@
 import { useEffect, useState } from "react";
-import { fetchTasks } from "../../api/blocks";
+import { fetchAgenda, fetchTasks } from "../../api/blocks";
 import { fetchListMap } from "../../api/lists";
-import { format, isSameDay, isSameMonth, parseISO, startOfMonth, endOfMonth, startOfWeek, endOfWeek, addDays, addMonths, subMonths } from "date-fns";
+import { format, isSameDay, isSameMonth, startOfMonth, endOfMonth, startOfWeek, endOfWeek, addDays, addMonths, subMonths } from "date-fns";
 import { ChevronLeft, ChevronRight } from "lucide-react";
 import { useDraggable, useDroppable } from "@dnd-kit/core";
 
@@ -23,9 +23,10 @@ function getMonthMatrix(currentMonth) {
   return weeks;
 }
 
-function MiniCalendar({ currentMonth, onDateSelect, selectedDate, tasksByDate }) {
-  const [miniMonth, setMiniMonth] = useState(currentMonth);
-  useEffect(() => { setMiniMonth(currentMonth); }, [currentMonth]);
+// The parent owns the month shown, so it can load that month's agenda.
+function MiniCalendar({ currentMonth, onMonthChange, onDateSelect, selectedDate, tasksByDate }) {
+  const miniMonth = currentMonth;
+  const setMiniMonth = (update) => onMonthChange(update(miniMonth));
   const miniWeeks = getMonthMatrix(miniMonth);
   const today = new Date();
   return (
@@ -102,29 +103,32 @@ function DraggableTask({ task, children }) {
 
 export default function CalendarSidebar({ setSelectedTask, refreshKey, onDragEnd }) {
   const [tasks, setTasks] = useState([]);
+  const [tasksByDate, setTasksByDate] = useState({});
   const [selectedDate, setSelectedDate] = useState(new Date());
   const [currentMonth, setCurrentMonth] = useState(new Date());
   const [lists, setLists] = useState({});
+  const [updateKey, setUpdateKey] = useState(0);
+  const weeks = getMonthMatrix(currentMonth);
+  const from = format(weeks[0][0], "yyyy-MM-dd");
+  const to = format(weeks[weeks.length - 1][6], "yyyy-MM-dd");
   useEffect(() => {
-    fetchTasks().then(setTasks);
-    fetchListMap().then(setLists);
-  }, [refreshKey]);
-  useEffect(() => {
-    const handler = () => {
-      fetchTasks().then(setTasks);
-      fetchListMap().then(setLists);
-    };
+    const handler = () => setUpdateKey(k => k + 1);
     window.addEventListener('taskUpdated', handler);
     return () => window.removeEventListener('taskUpdated', handler);
   }, []);
-  // Group tasks by date
-  const tasksByDate = {};
-  tasks.forEach(task => {
-    if (!task.due_date) return;
-    const dateKey = format(parseISO(task.due_date), "yyyy-MM-dd");
-    if (!tasksByDate[dateKey]) tasksByDate[dateKey] = [];
-    tasksByDate[dateKey].push(task);
-  });
+  // Open tasks without a date, filtered by the server
+  useEffect(() => {
+    fetchTasks({ type__in: 'task', due: 'none' }).then(setTasks);
+    fetchListMap().then(setLists);
+  }, [refreshKey, updateKey]);
+  // Dots of the mini calendar: the agenda of the days it shows, grouped by date on the server
+  useEffect(() => {
+    let cancelled = false;
+    fetchAgenda(from, to).then(agenda => {
+      if (!cancelled) setTasksByDate(Object.fromEntries(agenda.days.map(day => [day.date, day.tasks])));
+    });
+    return () => { cancelled = true; };
+  }, [refreshKey, updateKey, from, to]);
   // Handler for checkbox toggle
   const handleTaskCheckbox = async (task) => {
     const newType = task.type === "task-done" ? "task" : "task-done";
@@ -142,7 +146,7 @@ export default function CalendarSidebar({ setSelectedTask, refreshKey, onDragEnd
 
   return (
     <div className="w-64 h-full bg-[var(--color-flist-surface)] border-r border-[var(--color-flist-border)] p-4 space-y-4 overflow-y-auto">
-      <MiniCalendar currentMonth={currentMonth} onDateSelect={date => { setSelectedDate(date); setCurrentMonth(date); }} selectedDate={selectedDate} tasksByDate={tasksByDate} />
+      <MiniCalendar currentMonth={currentMonth} onMonthChange={setCurrentMonth} onDateSelect={date => { setSelectedDate(date); setCurrentMonth(date); }} selectedDate={selectedDate} tasksByDate={tasksByDate} />
       <div className="mt-6">
         <h3 className="text-xs font-semibold text-[var(--color-flist-muted)] mb-2 pl-1">Tasks without a date</h3>
         <div
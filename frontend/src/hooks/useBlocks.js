@@ -3,6 +3,7 @@ import {
   fetchAllBlocks,
   createBlock,
   updateBlock as apiUpdateBlock,
+  bulkUpdateBlocks,
   deleteBlock as apiDeleteBlock,
 } from "../api/blocks";
 
@@ -10,20 +11,15 @@ export default function useBlocks(listId, parentBlockId) {
   const [blocks, setBlocks] = useState([]);
 
   const loadBlocks = async () => {
-    const data = await fetchAllBlocks();
-    const filtered = data.filter((b) => {
-      const isTopLevel = parentBlockId == null;
-      const matchesList = String(b.list) === String(listId);
-      const matchesParent = String(b.parent_block) === String(parentBlockId);
+    // The server filters: top-level blocks of the list, or the children of the parent block.
+    const params =
+      parentBlockId == null
+        ? { list_id: listId ?? "none", parent_block: "none" }
+        : { parent_block: parentBlockId };
+    const data = await fetchAllBlocks(params);
 
-      return isTopLevel
-        ? matchesList &&
-            (b.parent_block === null || b.parent_block === undefined)
-        : matchesParent;
-    });
-
-    if (filtered.length > 0) {
-      setBlocks(filtered);
+    if (data.length > 0) {
+      setBlocks(data);
     } else {
       setBlocks([
         {
@@ -59,6 +55,15 @@ export default function useBlocks(listId, parentBlockId) {
     await apiUpdateBlock(payload);
   };
 
+  const reorderBlocks = async (ordered) => {
+    const updates = ordered
+      .filter((b) => typeof b.id === "number")
+      .map((b) => ({ id: b.id, order: b.order }));
+    if (updates.length > 0) {
+      await bulkUpdateBlocks(updates);
+    }
+  };
+
   const deleteBlock = async (id) => {
     await apiDeleteBlock(id);
   };
@@ -69,6 +74,7 @@ export default function useBlocks(listId, parentBlockId) {
     loadBlocks,
     saveBlock,
     updateBlock,
+    reorderBlocks,
     deleteBlock,
   };
 }
@@ -1,5 +1,5 @@
 import React, { useEffect, useState, useRef } from "react";
-import { fetchTasks, deleteBlock, updateBlock } from "../api/blocks";
+import { fetchAgenda, deleteBlock, updateBlock } from "../api/blocks";
 import { startOfMonth, endOfMonth, startOfWeek, endOfWeek, addDays, format, isSameDay, parseISO, addWeeks, subWeeks, getHours, addMonths, subMonths, isSameMonth } from "date-fns";
 import { DragOverlay, useDraggable, useDroppable } from "@dnd-kit/core";
 import { ChevronLeft, ChevronRight } from "lucide-react";
@@ -23,6 +23,10 @@ const getMonthMatrix = (currentMonth) => {
   return weeks;
 };
 
+// tasksByDate の各日のタスク配列に fn を適用する
+const mapDays = (tasksByDate, fn) =>
+  Object.fromEntries(Object.entries(tasksByDate).map(([date, tasks]) => [date, fn(tasks)]));
+
 // ミニカレンダーコンポーネント
 function MiniCalendar({ currentMonth, onDateSelect, selectedDate, tasksByDate }) {
   const [miniMonth, setMiniMonth] = useState(currentMonth);
@@ -138,7 +142,7 @@ export default function CalendarPage({ onSelectTask, selectedBlockId, refreshKey
   const [currentMonth, setCurrentMonth] = useState(new Date());
   const [currentWeek, setCurrentWeek] = useState(startOfWeek(new Date(), { weekStartsOn: 0 }));
   const [view, setView] = useState("month"); // "month" or "week"
-  const [tasks, setTasks] = useState([]);
+  const [tasksByDate, setTasksByDate] = useState({});
   const [loading, setLoading] = useState(true);
   const [showMoreModal, setShowMoreModal] = useState(false);
   const [modalTasks, setModalTasks] = useState([]);
@@ -159,7 +163,7 @@ export default function CalendarPage({ onSelectTask, selectedBlockId, refreshKey
     const newHtml = (newType === "task-done" ? "- [x] " : "- [ ] ") + (task.html || "").replace(/^- \[[ xX]\] /, "");
     const updatedTask = { ...task, type: newType, html: newHtml };
     // Optimistically update UI
-    setTasks(prev => prev.map(t => t.id === task.id ? updatedTask : t));
+    setTasksByDate(prev => mapDays(prev, tasks => tasks.map(t => t.id === task.id ? updatedTask : t)));
     // Update backend
     await updateBlock(updatedTask);
     // Dispatch event for real-time updates
@@ -176,27 +180,31 @@ export default function CalendarPage({ onSelectTask, selectedBlockId, refreshKey
     return () => window.removeEventListener('taskUpdated', handler);
   }, []);
 
+  // 表示中の日付範囲（月表示は前後の週を含むグリッド全体）
+  const rangeStart = view === "month" ? startOfWeek(startOfMonth(currentMonth), { weekStartsOn: 0 }) : currentWeek;
+  const rangeEnd = view === "month" ? endOfWeek(endOfMonth(currentMonth), { weekStartsOn: 0 }) : addDays(currentWeek, 6);
+  const from = format(rangeStart, "yyyy-MM-dd");
+  const to = format(rangeEnd, "yyyy-MM-dd");
+
+  // 表示範囲のタスクだけを、サーバーが日付ごと（ブラウザのタイムゾーン）にまとめて返す
   useEffect(() => {
+    let cancelled = false;
     const load = async () => {
       setLoading(true);
       try {
-        const allTasks = await fetchTasks();
-        setTasks(allTasks);
+        const agenda = await fetchAgenda(from, to, { include: "html" });
+        if (!cancelled) {
+          setTasksByDate(Object.fromEntries(agenda.days.map((day) => [day.date, day.tasks])));
+        }
       } finally {
-        setLoading(false);
+        if (!cancelled) setLoading(false);
       }
     };
     load();
-  }, [localRefreshKey]);
-
-  // 日付ごとにタスクをグループ化（ローカル日付で）
-  const tasksByDate = {};
-  tasks.forEach(task => {
-    if (!task.due_date) return;
-    const dateKey = format(parseISO(task.due_date), "yyyy-MM-dd");
-    if (!tasksByDate[dateKey]) tasksByDate[dateKey] = [];
-    tasksByDate[dateKey].push(task);
-  });
+    return () => {
+      cancelled = true;
+    };
+  }, [localRefreshKey, from, to]);
 
   // 週表示用: 1週間分の日付
   const weekDays = Array.from({ length: 7 }, (_, i) => addDays(currentWeek, i));
@@ -319,7 +327,7 @@ export default function CalendarPage({ onSelectTask, selectedBlockId, refreshKey
       const newTask = await createTask("New Task");
       await updateBlockDueDate(newTask.id, date);
       const taskWithDueDate = { ...newTask, due_date: date };
-      setTasks((prev) => [...prev, taskWithDueDate]);
+      setTasksByDate((prev) => ({ ...prev, [date]: [...(prev[date] || []), taskWithDueDate] }));
       if (onSelectTask) onSelectTask(taskWithDueDate);
     } catch {
       alert("タスク作成に失敗しました");
@@ -330,7 +338,7 @@ export default function CalendarPage({ onSelectTask, selectedBlockId, refreshKey
   const handleDeleteTask = async (taskId) => {
     if (!window.confirm("このタスクを削除しますか？")) return;
     await deleteBlock(taskId);
-    setTasks((prev) => prev.filter(t => t.id !== taskId));
+    setTasksByDate((prev) => mapDays(prev, tasks => tasks.filter(t => t.id !== taskId)));
     setContextMenu({ visible: false, x: 0, y: 0, task: null });
   };
 
@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from "react";
-import { fetchAllBlocks } from "../api/blocks";
+import { fetchAllBlocks, fetchTasks, fetchTaskStats, userTimezone } from "../api/blocks";
 import { fetchListMap } from "../api/lists";
-import { format, isFuture, parseISO, isToday, isTomorrow, isThisWeek } from "date-fns";
+import { format, parseISO, isToday, isTomorrow } from "date-fns";
 import {
   Calendar,
   Star,
@@ -17,8 +17,10 @@ import {
 
 export default function Dashboard({ setSelectedTask, setSelectedListId }) {
   const [notes, setNotes] = useState([]);
-  const [tasks, setTasks] = useState([]);
+  const [upcomingTasks, setUpcomingTasks] = useState([]);
+  const [recentTasks, setRecentTasks] = useState([]);
   const [pinnedItems, setPinnedItems] = useState([]);
+  const [stats, setStats] = useState({});
   const [lists, setLists] = useState({});
   const [loading, setLoading] = useState(true);
 
@@ -26,13 +28,27 @@ export default function Dashboard({ setSelectedTask, setSelectedListId }) {
     const load = async () => {
       try {
         setLoading(true);
-        const [all, listMap] = await Promise.all([
-          fetchAllBlocks(),
+        // Counters come from one aggregate query; task rows are fetched only for the lists shown.
+        const [noteBlocks, upcoming, recent, pinned, taskStats, listMap] = await Promise.all([
+          fetchAllBlocks({ type: "note" }),
+          fetchTasks({
+            type__in: "task",
+            is_done: false,
+            due_from: format(new Date(), "yyyy-MM-dd"),
+            tz: userTimezone(),
+            ordering: "due_date",
+            limit: 7,
+          }),
+          fetchTasks({ ordering: "-created_at", limit: 3 }),
+          fetchAllBlocks({ is_pinned: true }),
+          fetchTaskStats(),
           fetchListMap(),
         ]);
-        setNotes(all.filter((b) => b.type === "note"));
-        setTasks(all.filter((b) => b.type === "task" || b.type === "task-done"));
-        setPinnedItems(all.filter((b) => b.is_pinned));
+        setNotes(noteBlocks);
+        setUpcomingTasks(upcoming);
+        setRecentTasks(recent);
+        setPinnedItems(pinned);
+        setStats(taskStats);
         setLists(listMap);
       } catch (error) {
         console.error("Failed to load dashboard data:", error);
@@ -43,23 +59,7 @@ export default function Dashboard({ setSelectedTask, setSelectedListId }) {
     load();
   }, []);
 
-  const completedTasks = tasks.filter((t) => t.type === "task-done");
-  const pendingTasks = tasks.filter((t) => t.type === "task");
-  const upcomingTasks = tasks.filter(
-    (t) => t.due_date && isFuture(parseISO(t.due_date)) && t.type === "task"
-  ).sort((a, b) => parseISO(a.due_date) - parseISO(b.due_date));
-
-  const todayTasks = tasks.filter(
-    (t) => t.due_date && isToday(parseISO(t.due_date))
-  );
-  const tomorrowTasks = tasks.filter(
-    (t) => t.due_date && isTomorrow(parseISO(t.due_date))
-  );
-  const thisWeekTasks = tasks.filter(
-    (t) => t.due_date && isThisWeek(parseISO(t.due_date))
-  );
-
-  const recentActivity = [...notes, ...tasks]
+  const recentActivity = [...notes, ...recentTasks]
     .sort((a, b) => new Date(b.created_at) - new Date(a.created_at))
     .slice(0, 3);
 
@@ -128,7 +128,7 @@ export default function Dashboard({ setSelectedTask, setSelectedListId }) {
             <div>
               <p className="text-sm text-gray-500">Tasks Progress</p>
               <p className="text-2xl font-semibold">
-                {completedTasks.length}/{tasks.length}
+                {stats.completed ?? 0}/{stats.tasks ?? 0}
               </p>
             </div>
             <div className="p-2 bg-green-100 rounded-full text-green-600">
@@ -136,8 +136,8 @@ export default function Dashboard({ setSelectedTask, setSelectedListId }) {
             </div>
           </div>
           <div className="mt-2 text-sm text-gray-500">
-            {tasks.length > 0
-              ? `${Math.round((completedTasks.length / tasks.length) * 100)}% completed`
+            {stats.tasks > 0
+              ? `${Math.round((stats.completed / stats.tasks) * 100)}% completed`
               : "No tasks yet"}
           </div>
         </div>
@@ -146,15 +146,15 @@ export default function Dashboard({ setSelectedTask, setSelectedListId }) {
           <div className="flex items-center justify-between">
             <div>
               <p className="text-sm text-gray-500">Today's Tasks</p>
-              <p className="text-2xl font-semibold">{todayTasks.length}</p>
+              <p className="text-2xl font-semibold">{stats.due_today ?? 0}</p>
             </div>
             <div className="p-2 bg-yellow-100 rounded-full text-yellow-600">
               <Calendar className="w-6 h-6" />
             </div>
           </div>
           <div className="mt-2 text-sm text-gray-500">
-            {todayTasks.length > 0
-              ? `${todayTasks.length} tasks due today`
+            {stats.due_today > 0
+              ? `${stats.due_today} tasks due today`
               : "No tasks due today"}
           </div>
         </div>
@@ -188,7 +188,7 @@ export default function Dashboard({ setSelectedTask, setSelectedListId }) {
               Upcoming Tasks
             </h2>
             <ul className="divide-y divide-gray-200 flex-1">
-              {upcomingTasks.slice(0, 7).map((task) => (
+              {upcomingTasks.map((task) => (
                 <li key={task.id} className="py-3 cursor-pointer hover:bg-gray-50 transition-colors" onClick={() => handleItemClick(task)}>
                   <div className="flex items-center justify-between">
                     <span className="flex items-center gap-2 flex-1 min-w-0">
@@ -375,15 +375,15 @@ export default function Dashboard({ setSelectedTask, setSelectedListId }) {
             <div className="space-y-3 flex-1">
               <div className="flex justify-between items-center">
                 <span className="text-sm text-gray-600">This Week's Tasks</span>
-                <span className="text-sm font-medium">{thisWeekTasks.length}</span>
+                <span className="text-sm font-medium">{stats.due_this_week ?? 0}</span>
               </div>
               <div className="flex justify-between items-center">
                 <span className="text-sm text-gray-600">Pending Tasks</span>
-                <span className="text-sm font-medium">{pendingTasks.length}</span>
+                <span className="text-sm font-medium">{stats.pending ?? 0}</span>
               </div>
               <div className="flex justify-between items-center">
                 <span className="text-sm text-gray-600">Completed Tasks</span>
-                <span className="text-sm font-medium">{completedTasks.length}</span>
+                <span className="text-sm font-medium">{stats.completed ?? 0}</span>
               </div>
             </div>
           </div>
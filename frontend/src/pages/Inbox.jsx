@@ -16,7 +16,7 @@ export default function Inbox() {
       setLoading(true);
       try {
         const [blocks, listMap] = await Promise.all([
-          fetchAllBlocks(),
+          fetchAllBlocks({ type: "task", due: "none" }),
           fetchListMap(),
         ]);
         // Inbox: tasks with no due_date and not completed
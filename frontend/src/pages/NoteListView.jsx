@@ -27,7 +27,7 @@ export default function NoteListView({ onSelectNote, selectedNote }) {
   useEffect(() => {
     const loadNotes = async () => {
       try {
-        const allBlocks = await fetchAllBlocks();
+        const allBlocks = await fetchAllBlocks({ type: "note" });
         const noteBlocks = allBlocks.filter((b) => b.type === "note");
         setNotes(noteBlocks);
       } catch (err) {
@@ -41,7 +41,7 @@ export default function NoteListView({ onSelectNote, selectedNote }) {
     const loadData = async () => {
       try {
         const [allBlocks, listMap] = await Promise.all([
-          fetchAllBlocks(),
+          fetchAllBlocks({ type: "note" }),
           fetchListMap(),
         ]);
         const noteBlocks = allBlocks.filter((b) => b.type === "note");
@@ -1,5 +1,5 @@
 import { useEffect, useState, useRef } from "react";
-import { fetchAllBlocks } from "../api/blocks";
+import { fetchAllBlocks, userTimezone } from "../api/blocks";
 import { fetchListMap } from "../api/lists";
 import TaskBlock from "../components/blocks/TaskBlock";
 import BlockDetails from "../components/BlockDetails";
@@ -17,7 +17,7 @@ export default function Today({ setSelectedListId }) {
       setLoading(true);
       try {
         const [blocks, listMap] = await Promise.all([
-          fetchAllBlocks(),
+          fetchAllBlocks({ type: "task", due: "today", tz: userTimezone() }),
           fetchListMap(),
         ]);
         // Today: tasks with due_date === today and not completed